@@ -0,0 +1,56 @@
+"""Per-call latency of database functions: connect-per-call vs pooled connection
+
+Run from the project root: python -m benchmarks.bench_db_connections
+"""
+import os
+import sqlite3
+import tempfile
+import timeit
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+os.environ['DB_WRITE_QUEUE'] = 'false'
+
+import database
+
+CALLS = 5000
+
+def legacy_get_leaderboard(limit: int = 10) -> list:
+    """The original pattern: open, query and close on every call"""
+    conn = sqlite3.connect(database.DB_PATH)
+    try:
+        return conn.execute('''
+            SELECT player_name, score, xp, victory_type, health, date
+            FROM leaderboard ORDER BY xp DESC, score DESC LIMIT ?
+        ''', (limit,)).fetchall()
+    finally:
+        conn.close()
+
+def legacy_add_to_leaderboard(player_name: str, score: int, xp: int, victory_type: str, health: int) -> None:
+    conn = sqlite3.connect(database.DB_PATH)
+    try:
+        conn.execute('''
+            INSERT INTO leaderboard (player_name, score, xp, victory_type, health)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (player_name, score, xp, victory_type, health))
+        conn.commit()
+    finally:
+        conn.close()
+
+def time_call(function, *args) -> float:
+    """Microseconds per call"""
+    return timeit.timeit(lambda: function(*args), number=CALLS) / CALLS * 1e6
+
+def run_benchmark() -> None:
+    database.init_db()
+    for i in range(1000):
+        database.add_to_leaderboard(f"player{i}", i % 150, i % 250, 'Standard Victory', 50)
+    row = ('bench', 10, 200, 'Standard Victory', 60)
+    print(f"{'call':<22} {'connect/call us':>16} {'pooled us':>10}")
+    print(f"{'get_leaderboard(10)':<22} {time_call(legacy_get_leaderboard, 10):>16.1f} "
+          f"{time_call(database.get_leaderboard, 10):>10.1f}")
+    print(f"{'add_to_leaderboard':<22} {time_call(legacy_add_to_leaderboard, *row):>16.1f} "
+          f"{time_call(database.add_to_leaderboard, *row):>10.1f}")
+    print(f"{'get_regional_stats':<22} {'':>16} {time_call(database.get_regional_stats, 'us-ca'):>10.1f}")
+
+if __name__ == "__main__":
+    run_benchmark()
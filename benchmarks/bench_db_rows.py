@@ -0,0 +1,75 @@
+"""Rows decoded per second at 10k-row pages: legacy decoding vs db_rows
+
+Rows are fetched once and then decoded repeatedly, so the numbers compare
+decoding alone; the end-to-end line times get_leaderboard(PAGE) as well.
+
+Run from the project root: python -m benchmarks.bench_db_rows
+"""
+import os
+import tempfile
+import timeit
+from dataclasses import dataclass
+from datetime import datetime
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import database
+from db_rows import column_map, decode_leaderboard
+
+PAGE = 10000
+REPEAT = 20
+
+@dataclass
+class LegacyLeaderboardEntry:
+    player_name: str
+    score: int
+    xp: int
+    victory_type: str
+    health: int
+    date: datetime
+
+def legacy_leaderboard(rows: list) -> list:
+    return [LegacyLeaderboardEntry(name, score, xp, victory_type, health, datetime.fromisoformat(date))
+            for name, score, xp, victory_type, health, date in rows]
+
+def legacy_dicts(cursor, rows: list) -> list:
+    """The original pattern: rebuild the column list for every row fetched"""
+    decoded = []
+    for row in rows:
+        columns = [description[0] for description in cursor.description]
+        decoded.append(dict(zip(columns, row)))
+    return decoded
+
+def cached_dicts(cursor, sql: str, rows: list) -> list:
+    decoded = []
+    for row in rows:
+        decoded.append(dict(zip(column_map(cursor, sql), row)))
+    return decoded
+
+def rows_per_second(function) -> float:
+    return PAGE * REPEAT / timeit.timeit(function, number=REPEAT)
+
+def run_benchmark() -> None:
+    database.init_db()
+    database.add_to_leaderboard_many((f"player{i}", i % 150, i % 250, 'Standard Victory', 50)
+                                     for i in range(PAGE))
+    database.add_player_session_stats_many((f"player{i}", f"session{i}") + (1,) * 8 + ('brave',)
+                                           for i in range(PAGE))
+    conn = database.get_connection()
+    leaderboard_rows = conn.execute(database.STATEMENTS['get_leaderboard'], (PAGE,)).fetchall()
+    stats_sql = 'SELECT * FROM player_session_stats'
+    stats_cursor = conn.execute(stats_sql)
+    stats_rows = stats_cursor.fetchall()
+
+    print(f"{'decode':<34} {'rows/s':>12}")
+    print(f"{'leaderboard, legacy dataclass':<34} {rows_per_second(lambda: legacy_leaderboard(leaderboard_rows)):>12,.0f}")
+    print(f"{'leaderboard, slots + lazy date':<34} {rows_per_second(lambda: decode_leaderboard(leaderboard_rows)):>12,.0f}")
+    print(f"{'leaderboard, slots, dates read':<34} "
+          f"{rows_per_second(lambda: [entry.date for entry in decode_leaderboard(leaderboard_rows)]):>12,.0f}")
+    print(f"{'session stats, legacy columns':<34} {rows_per_second(lambda: legacy_dicts(stats_cursor, stats_rows)):>12,.0f}")
+    print(f"{'session stats, cached columns':<34} "
+          f"{rows_per_second(lambda: cached_dicts(stats_cursor, stats_sql, stats_rows)):>12,.0f}")
+    print(f"{'get_leaderboard(PAGE) end to end':<34} {rows_per_second(lambda: database.get_leaderboard(PAGE)):>12,.0f}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,66 @@
+"""Read latency under write load: live database vs the read-only snapshot
+
+A writer process commits batches of leaderboard rows and regional stats
+updates while the main thread times get_leaderboard(10) and
+get_regional_stats, reading either the live file or the snapshot. The
+writer pauses between batches so that on small machines the numbers show
+lock and WAL effects rather than CPU contention.
+
+Run from the project root: python -m benchmarks.bench_db_snapshot
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+os.environ['DB_SNAPSHOT_PATH'] = os.path.join(os.path.dirname(os.environ['DB_PATH']), 'game.snapshot.db')
+os.environ['DB_WRITE_QUEUE'] = 'false'
+
+import database
+
+ROWS = 100000
+READS = 5000
+WRITE_BATCH = 500
+WRITE_PAUSE = 0.01
+SNAPSHOT_INTERVAL = 1.0
+
+def write_forever(stop) -> None:
+    i = 0
+    while not stop.is_set():
+        database.add_to_leaderboard_many((f"writer{j % 500}", j % 150, j % 250, 'Standard Victory', 50)
+                                         for j in range(i, i + WRITE_BATCH))
+        database.update_regional_stats(f"region-{i % 20}", 'US', 'CA', f"writer{i % 500}", 'brave', 'fight')
+        i += WRITE_BATCH
+        time.sleep(WRITE_PAUSE)
+
+def time_reads() -> list:
+    timings = []
+    for i in range(READS):
+        start = time.perf_counter()
+        database.get_leaderboard(10)
+        database.get_regional_stats(f"region-{i % 20}")
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+def run_benchmark() -> None:
+    database.init_db()
+    database.add_to_leaderboard_many((f"player{i}", i % 150, i % 250, 'Standard Victory', 50)
+                                     for i in range(ROWS))
+    database.refresh_snapshot()
+    stop = multiprocessing.Event()
+    writer = multiprocessing.Process(target=write_forever, args=(stop,))
+    writer.start()
+    database.start_snapshot_refresher(SNAPSHOT_INTERVAL)
+    print(f"{READS} reads against {ROWS} rows with a concurrent writer")
+    print(f"{'reads from':<10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label, snapshot in (('live', False), ('snapshot', True), ('live', False), ('snapshot', True)):
+        database.DB_READ_SNAPSHOT = snapshot
+        timings = time_reads()
+        print(f"{label:<10} {timings[len(timings) // 2] * 1e3:>8.3f} "
+              f"{timings[int(len(timings) * 0.99)] * 1e3:>8.3f} {timings[-1] * 1e3:>8.3f}")
+    stop.set()
+    writer.join()
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,45 @@
+"""Worker startup cost of schema migrations
+
+Times a full migration of an empty database and the fast path taken by
+every worker once the schema is current, and checks that the fast path
+writes nothing.
+
+Run from the project root: python -m benchmarks.bench_db_startup
+"""
+import os
+import tempfile
+import time
+
+from db_migrations import LATEST_VERSION, run_migrations
+
+WORKER_BOOTS = 1000
+
+def file_signature(path: str) -> tuple:
+    """Size and modification time of the database and its WAL"""
+    signature = []
+    for suffix in ('', '-wal'):
+        if os.path.exists(path + suffix):
+            stat = os.stat(path + suffix)
+            signature.append((suffix, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+def run_benchmark() -> None:
+    path = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+    started = time.perf_counter()
+    applied = run_migrations(path)
+    migrate_seconds = time.perf_counter() - started
+
+    before = file_signature(path)
+    started = time.perf_counter()
+    for _ in range(WORKER_BOOTS):
+        assert run_migrations(path) == 0
+    fast_path_seconds = (time.perf_counter() - started) / WORKER_BOOTS
+    assert file_signature(path) == before, "fast path wrote to the database"
+
+    print(f"schema version:       {LATEST_VERSION} ({applied} migrations applied)")
+    print(f"initial migration:    {migrate_seconds * 1e3:.2f} ms")
+    print(f"worker boot (current): {fast_path_seconds * 1e6:.1f} us, no writes")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,143 @@
+"""Stats updates: per-call SQL building vs the fixed statement registry
+
+Both paths run directly on one connection with a commit per call, so only
+statement preparation and the number of statements executed differ, apart
+from the legacy LIKE player count that regional_players has since replaced
+(see bench_regional_players). The legacy path writes a copy of the wide
+regional_stats table it was written for; counters now live in
+regional_counters (see bench_regional_metrics).
+
+Run from the project root: python -m benchmarks.bench_db_statements
+"""
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+import timeit
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import database
+
+CALLS = 20000
+REGIONS = 50
+PLAYERS = 200
+
+LEGACY_REGIONAL_TABLE = '''
+    CREATE TABLE legacy_regional_stats
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     region_key TEXT UNIQUE,
+     country TEXT,
+     region TEXT,
+     total_games INTEGER DEFAULT 0,
+     total_players INTEGER DEFAULT 0,
+     combat_style_brave INTEGER DEFAULT 0,
+     combat_style_cautious INTEGER DEFAULT 0,
+     combat_style_balanced INTEGER DEFAULT 0,
+     action_fight INTEGER DEFAULT 0,
+     action_run INTEGER DEFAULT 0,
+     action_rest INTEGER DEFAULT 0,
+     action_search_alone INTEGER DEFAULT 0,
+     action_get_help INTEGER DEFAULT 0,
+     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+'''
+
+def legacy_regional_stats(conn: sqlite3.Connection, region_key: str, country: str, region: str,
+                          player_name: str, combat_style, action) -> None:
+    """The original path: INSERT OR IGNORE, then up to three f-string UPDATEs"""
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR IGNORE INTO legacy_regional_stats (region_key, country, region)
+        VALUES (?, ?, ?)
+    ''', (region_key, country, region))
+    if combat_style:
+        c.execute(f'''
+            UPDATE legacy_regional_stats
+            SET combat_style_{combat_style} = combat_style_{combat_style} + 1,
+                last_updated = CURRENT_TIMESTAMP
+            WHERE region_key = ?
+        ''', (region_key,))
+    if action:
+        c.execute(f'''
+            UPDATE legacy_regional_stats
+            SET action_{action} = action_{action} + 1,
+                last_updated = CURRENT_TIMESTAMP
+            WHERE region_key = ?
+        ''', (region_key,))
+    c.execute('''
+        UPDATE legacy_regional_stats
+        SET total_games = total_games + 1,
+            total_players = (
+                SELECT COUNT(DISTINCT player_name)
+                FROM leaderboard
+                WHERE player_name LIKE ?
+            ),
+            last_updated = CURRENT_TIMESTAMP
+        WHERE region_key = ?
+    ''', (f"%{player_name}%", region_key))
+
+def legacy_session_stats(conn: sqlite3.Connection, player_name: str, session_id: str,
+                         stats_update: dict) -> None:
+    """The original path: INSERT OR IGNORE, then an UPDATE joined together per call"""
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR IGNORE INTO player_session_stats (player_name, session_id)
+        VALUES (?, ?)
+    ''', (player_name, session_id))
+    update_fields = []
+    update_values = []
+    for key, value in stats_update.items():
+        if key in database.SESSION_STAT_COUNTERS:
+            update_fields.append(f"{key} = {key} + ?")
+            update_values.append(value)
+        elif key == 'combat_style':
+            update_fields.append(f"{key} = ?")
+            update_values.append(value)
+    if update_fields:
+        update_fields.append("last_updated = CURRENT_TIMESTAMP")
+        c.execute(f'''
+            UPDATE player_session_stats
+            SET {', '.join(update_fields)}
+            WHERE player_name = ? AND session_id = ?
+        ''', update_values + [player_name, session_id])
+
+def regional_calls():
+    styles = (None,) + database.REGIONAL_COMBAT_STYLES
+    actions = (None,) + database.REGIONAL_ACTIONS
+    for i, (style, action) in enumerate(itertools.cycle(itertools.product(styles, actions))):
+        yield (f"region-{i % REGIONS}", 'US', 'CA', f"player{i % PLAYERS}", style, action)
+
+def session_calls():
+    """Clients post whichever counters changed, so key sets and their order vary"""
+    rng = random.Random(1)
+    keys = list(database.SESSION_STAT_COUNTERS) + ['combat_style']
+    for i in itertools.count():
+        update = {key: 'brave' if key == 'combat_style' else 1
+                  for key in rng.sample(keys, rng.randint(1, 4))}
+        yield (f"player{i % PLAYERS}", f"session{i % PLAYERS}", update)
+
+def time_calls(conn: sqlite3.Connection, function, calls) -> float:
+    """Microseconds per call, committing after each one"""
+    def run():
+        with conn:
+            function(conn, *next(calls))
+    return timeit.timeit(run, number=CALLS) / CALLS * 1e6
+
+def run_benchmark() -> None:
+    database.init_db()
+    database.add_to_leaderboard_many((f"player{i}", i % 150, i % 250, 'Standard Victory', 50)
+                                     for i in range(1000))
+    conn = database.get_connection()
+    conn.execute(LEGACY_REGIONAL_TABLE)
+    print(f"{CALLS} calls per path, commit per call")
+    print(f"{'call':<28} {'legacy us':>10} {'registry us':>12}")
+    for label, legacy, registry, calls in (
+            ('update_regional_stats', legacy_regional_stats, database._apply_regional_stats, regional_calls),
+            ('update_player_session_stats', legacy_session_stats, database._apply_player_session_stats,
+             session_calls)):
+        print(f"{label:<28} {time_calls(conn, legacy, calls()):>10.1f} "
+              f"{time_calls(conn, registry, calls()):>12.1f}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,95 @@
+"""Write-heavy load: inline commits vs the background group-commit writer
+
+Each worker process runs request threads that each record a leaderboard
+entry, a regional stats update and an achievement, like the game routes do.
+Reports p50/p99 request latency and requests per second for inline commits,
+queued fire-and-forget writes and queued writes that wait for their commit.
+
+Run from the project root: python -m benchmarks.bench_db_writer
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+# Every regional update goes to the writer rather than the per-worker counters
+os.environ['REGIONAL_STATS_FLUSH_INTERVAL'] = '0'
+
+import database
+
+WORKERS = 4
+THREADS_PER_WORKER = 4
+REQUESTS_PER_THREAD = 250
+
+def handle_request(worker: int, thread: int, i: int, wait: bool) -> None:
+    player = f"player{worker}-{thread}"
+    futures = [
+        database.add_to_leaderboard(player, i % 150, i % 250, 'Standard Victory', 50),
+        database.update_regional_stats(f"region-{i % 20}", 'US', 'CA', player,
+                                       combat_style='brave', action='fight'),
+        database.update_player_achievement(player, f"achievement-{i % 10}")
+    ]
+    if wait:
+        for future in futures:
+            future.result()
+
+def run_worker(worker: int, queued: bool, wait: bool, results) -> None:
+    database.DB_WRITE_QUEUE = queued
+    latencies = []
+    lock = threading.Lock()
+
+    def run_thread(thread: int) -> None:
+        timings = []
+        for i in range(REQUESTS_PER_THREAD):
+            start = time.perf_counter()
+            handle_request(worker, thread, i, wait)
+            timings.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=run_thread, args=(t,)) for t in range(THREADS_PER_WORKER)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer = database.get_writer()
+    database.close_writer()
+    results.put((latencies, writer.commits if writer else 0))
+
+def run_mode(queued: bool, wait: bool) -> tuple:
+    """Run every worker against a fresh database so earlier modes do not slow later ones"""
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), 'game.db')
+    database.init_db()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_worker, args=(w, queued, wait, results))
+                 for w in range(WORKERS)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for timings, _ in collected for latency in timings)
+    commits = sum(commits for _, commits in collected)
+    return latencies, commits, elapsed
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def run_benchmark() -> None:
+    total = WORKERS * THREADS_PER_WORKER * REQUESTS_PER_THREAD
+    print(f"{WORKERS} workers x {THREADS_PER_WORKER} threads x {REQUESTS_PER_THREAD} requests, "
+          f"3 writes per request")
+    print(f"{'mode':<18} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>9} {'commits':>8}")
+    for label, queued, wait in (('inline commits', False, False),
+                                ('queued, confirmed', True, True),
+                                ('queued, no wait', True, False)):
+        latencies, commits, elapsed = run_mode(queued, wait)
+        commits = commits if queued else total * 3
+        print(f"{label:<18} {percentile(latencies, 0.5) * 1e3:>8.2f} "
+              f"{percentile(latencies, 0.99) * 1e3:>8.2f} {total / elapsed:>9.0f} {commits:>8}")
+
+if __name__ == "__main__":
+    run_benchmark()
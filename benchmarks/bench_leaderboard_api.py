@@ -0,0 +1,61 @@
+"""Leaderboard page latency: keyset cursors vs OFFSET, first page vs deep pages
+
+Times a 50-row page at increasing depths both ways, then a streamed
+10,000-row page through leaderboard_api.
+
+Run from the project root: python -m benchmarks.bench_leaderboard_api
+"""
+import os
+import random
+import tempfile
+import timeit
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import database
+import leaderboard_api
+
+ROW_COUNT = int(os.environ.get('BENCH_ROWS', 1_000_000))
+PAGE_SIZE = 50
+PAGES = (1, 100, 10_000)
+CALLS = 50
+VICTORY_TYPES = ('Perfect Victory', 'Glorious Victory', 'Pyrrhic Victory', 'Standard Victory', 'DIED')
+
+def offset_page(conn, page: int) -> list:
+    return conn.execute('''
+        SELECT entry_id, player_name, score, xp, victory_type, health, date
+        FROM player_best
+        ORDER BY xp DESC, score DESC, entry_id
+        LIMIT ? OFFSET ?
+    ''', (PAGE_SIZE, (page - 1) * PAGE_SIZE)).fetchall()
+
+def key_before(conn, page: int):
+    """The (xp, score, id) key of the last row on the previous page"""
+    if page == 1:
+        return None
+    row = offset_page(conn, page - 1)[-1]
+    return row[3], row[2], row[0]
+
+def time_ms(function, calls: int = CALLS) -> float:
+    return timeit.timeit(function, number=calls) / calls * 1e3
+
+def run_benchmark() -> None:
+    database.init_db()
+    database.add_to_leaderboard_many((f"player{i}", random.randrange(200), random.randrange(300),
+                                      random.choice(VICTORY_TYPES), random.randrange(1, 101))
+                                     for i in range(ROW_COUNT))
+    conn = database.get_connection()
+    conn.execute('ANALYZE')
+    print(f"{ROW_COUNT:,} rows, {PAGE_SIZE} rows per page")
+    print(f"{'page':>8} {'OFFSET ms':>10} {'keyset ms':>10}")
+    for page in PAGES:
+        after = key_before(conn, page)
+        assert database.get_leaderboard_page(PAGE_SIZE, after).fetchall() == offset_page(conn, page)
+        offset_ms = time_ms(lambda: offset_page(conn, page), 5 if page > 100 else CALLS)
+        keyset_ms = time_ms(lambda: database.get_leaderboard_page(PAGE_SIZE, after).fetchall())
+        print(f"{page:>8,} {offset_ms:>10.3f} {keyset_ms:>10.3f}")
+    stream_ms = time_ms(lambda: ''.join(leaderboard_api.leaderboard_page({'limit': '10000'})), 10)
+    print(f"streamed 10,000-row JSON page: {stream_ms:.1f} ms")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,93 @@
+"""Daily, weekly and per-outcome top 10: filtered query over the history vs boards
+
+History is spread over the past year, so a day is about 1/365th of it; the
+query walks the rank index until it has found ten rows of the window. Also
+times add_to_leaderboard with and without ranking the entry on the boards.
+
+Run from the project root: python -m benchmarks.bench_leaderboard_boards
+BENCH_ROWS sets the history size.
+"""
+import os
+import random
+import tempfile
+import timeit
+from datetime import datetime, timedelta, timezone
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+os.environ['DB_WRITE_QUEUE'] = 'false'
+
+import database
+from leaderboard_boards import SPANS
+
+ROW_COUNT = int(os.environ.get('BENCH_ROWS', 1_000_000))
+DAYS = 365
+TOP = 10
+CALLS = 200
+INSERTS = 2000
+VICTORY_TYPES = ('Perfect Victory', 'Glorious Victory', 'Pyrrhic Victory', 'Standard Victory', 'DIED')
+
+def window_start(span: str, now: datetime) -> str:
+    if span == 'day':
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif span == 'week':
+        start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        start = datetime(1970, 1, 1)
+    return start.strftime('%Y-%m-%d %H:%M:%S')
+
+def query_top(conn, since: str, victory_type) -> list:
+    outcome = 'AND victory_type = ?' if victory_type else ''
+    return conn.execute(f'''
+        SELECT player_name, score, xp, victory_type, health, date
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY player_name ORDER BY xp DESC, score DESC, id) AS best
+            FROM leaderboard
+            WHERE date >= ? {outcome})
+        WHERE best = 1
+        ORDER BY xp DESC, score DESC, id
+        LIMIT ?
+    ''', (since, *([victory_type] if victory_type else []), TOP)).fetchall()
+
+def history(now: datetime):
+    for i in range(ROW_COUNT):
+        date = now - timedelta(seconds=random.randrange(DAYS * 86400))
+        yield (f"player{i % 50_000}", random.randrange(300), random.randrange(250),
+               random.choice(VICTORY_TYPES), random.randrange(1, 101), date)
+
+def time_ms(function, calls: int = CALLS) -> float:
+    return timeit.timeit(function, number=calls) / calls * 1e3
+
+def plain_insert(conn, *entry) -> None:
+    with conn:
+        conn.execute('''
+            INSERT INTO leaderboard (player_name, score, xp, victory_type, health)
+            VALUES (?, ?, ?, ?, ?)
+        ''', entry)
+
+def run_benchmark() -> None:
+    database.init_db()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    database.add_to_leaderboard_many(history(now))
+    conn = database.get_connection()
+    conn.execute('ANALYZE')
+
+    print(f"{ROW_COUNT:,} entries over {DAYS} days, top {TOP}")
+    print(f"{'board':<24} {'query ms':>10} {'board ms':>10}")
+    for span in SPANS:
+        for victory_type in (None, 'Perfect Victory'):
+            since = window_start(span, now)
+            expected = [row[:5] for row in query_top(conn, since, victory_type)]
+            assert [entry.astuple()[:5] for entry in database.get_leaderboard_board(span, victory_type, TOP)] \
+                == expected, (span, victory_type)
+            query_ms = time_ms(lambda: query_top(conn, since, victory_type), 20)
+            board_ms = time_ms(lambda: database.get_leaderboard_board(span, victory_type, TOP))
+            print(f"{span + ' ' + (victory_type or 'all'):<24} {query_ms:>10.3f} {board_ms:>10.3f}")
+
+    entry = ('newcomer', 120, 150, 'Glorious Victory', 60)
+    plain_ms = time_ms(lambda: plain_insert(conn, *entry), INSERTS)
+    boards_ms = time_ms(lambda: database.add_to_leaderboard(*entry), INSERTS)
+    print(f"insert, leaderboard only: {plain_ms:.3f} ms; with boards: {boards_ms:.3f} ms")
+
+if __name__ == "__main__":
+    run_benchmark()
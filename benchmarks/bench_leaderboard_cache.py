@@ -0,0 +1,63 @@
+"""get_leaderboard(10) latency: SQLite on every view vs the in-process top-K cache
+
+The cached path is timed in the steady state and while another connection
+adds a row every WRITE_EVERY views, which forces a refresh.
+
+Run from the project root: python -m benchmarks.bench_leaderboard_cache
+"""
+import os
+import sqlite3
+import tempfile
+import time
+import timeit
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import database
+
+ROWS = 100000
+CALLS = 20000
+WRITE_EVERY = 100
+
+def run_benchmark() -> None:
+    database.init_db()
+    database.add_to_leaderboard_many((f"player{i}", i % 150, i % 250, 'Standard Victory', 50)
+                                     for i in range(ROWS))
+    other = sqlite3.connect(database.DB_PATH)
+
+    def time_us(function) -> float:
+        return timeit.timeit(function, number=CALLS) / CALLS * 1e6
+
+    def views_with_writes() -> float:
+        """Microseconds per view, not counting the inserts themselves"""
+        elapsed = 0.0
+        for view in range(CALLS):
+            if view % WRITE_EVERY == 0:
+                entry = (f"writer{view}", view % 150, view % 300, 'Standard Victory', 50)
+                entry_id = other.execute('''
+                    INSERT INTO leaderboard (player_name, score, xp, victory_type, health)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', entry).lastrowid
+                other.execute(database.STATEMENTS['upsert_player_best'],
+                              (entry[0], entry_id, *entry[1:], None))
+                other.commit()
+            start = time.perf_counter()
+            database.get_leaderboard(10)
+            elapsed += time.perf_counter() - start
+        return elapsed / CALLS * 1e6
+
+    cache_size = database.LEADERBOARD_CACHE_SIZE
+    database.LEADERBOARD_CACHE_SIZE = 0
+    uncached = time_us(lambda: database.get_leaderboard(10))
+    database.LEADERBOARD_CACHE_SIZE = cache_size
+    cached = time_us(lambda: database.get_leaderboard(10))
+    with_writes = views_with_writes()
+    print(f"{ROWS} leaderboard rows, {CALLS} views")
+    print(f"{'path':<34} {'us/view':>8}")
+    print(f"{'SQLite every view':<34} {uncached:>8.1f}")
+    print(f"{'cache, steady state':<34} {cached:>8.1f}")
+    print(f"{f'cache, insert every {WRITE_EVERY} views':<34} {with_writes:>8.1f}")
+    print(f"cache stats: {database.leaderboard_cache.stats()}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,117 @@
+"""Query plans and top-10 latency for the leaderboard at 1M rows
+
+Asserts with EXPLAIN QUERY PLAN that every lookup path in database.py
+is served by an index, running the app's own ranking reads against a
+connection that returns plans instead of rows, then times the top 10 of
+player_best with and without idx_player_best_rank. The in-process
+leaderboard cache is turned off so get_leaderboard reaches SQLite.
+
+Run from the project root: python -m benchmarks.bench_leaderboard_index
+"""
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import timeit
+from unittest.mock import patch
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+os.environ['LEADERBOARD_CACHE_SIZE'] = '0'
+
+import database
+import leaderboard_boards
+import regional_metrics
+
+ROW_COUNT = int(os.environ.get('BENCH_ROWS', 1_000_000))
+CALLS = 200
+VICTORY_TYPES = ('Perfect Victory', 'Glorious Victory', 'Pyrrhic Victory', 'Standard Victory', 'DIED')
+AFTER = (100, 50, 1000)
+
+class ExplainingConnection:
+    """Stands in for a connection, returning each query's plan instead of its rows"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        return self.conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)
+
+def page(conn, *args, **kwargs) -> list:
+    with patch.object(database, 'get_read_connection', return_value=conn):
+        return database.get_leaderboard_page(*args, **kwargs).fetchall()
+
+def statement(name: str, parameters: tuple):
+    return lambda conn: conn.execute(database.STATEMENTS[name], parameters).fetchall()
+
+def sql(query: str, parameters: tuple):
+    return lambda conn: conn.execute(query, parameters).fetchall()
+
+# (lookup, call on a connection, text the plan must contain, sorts allowed).
+# A date window ranks the entries it finds, so its plan sorts them.
+QUERY_PLAN_CHECKS = [
+    ('get_leaderboard', statement('get_leaderboard', (10,)), 'COVERING INDEX idx_player_best_rank', False),
+    ('leaderboard page', lambda conn: page(conn, 50, AFTER), 'COVERING INDEX idx_player_best_rank', False),
+    ('outcome page', lambda conn: page(conn, 50, AFTER, victory_type='DIED'),
+     'COVERING INDEX idx_player_outcome_best_page', False),
+    ('date window page', lambda conn: page(conn, 50, AFTER, since='2025-01-01 00:00:00'),
+     'INDEX idx_leaderboard_date', True),
+    ('outcome date window page',
+     lambda conn: page(conn, 50, AFTER, victory_type='DIED', since='2025-01-01 00:00:00'),
+     'INDEX idx_leaderboard_date', True),
+    ('board', lambda conn: leaderboard_boards.read_board(conn, 'day', '2025-01-01', '*', 10),
+     'PRIMARY KEY', False),
+    ('magic link', sql('SELECT email, magic_link_expiry FROM users WHERE magic_link_token = ?', ('token',)),
+     'COVERING INDEX idx_users_magic_link_token', False),
+    ('user games', sql('UPDATE users SET total_games = total_games + 1 WHERE email = ?', ('a@b.c',)),
+     'INDEX sqlite_autoindex_users_1', False),
+    ('regional stats', statement('get_regional_stats', ('us-ca',)),
+     'INDEX sqlite_autoindex_regional_stats_1', False),
+    ('regional totals', sql('SELECT metric, count FROM regional_counters WHERE region_key = ? AND bucket = ?',
+                            ('us-ca', regional_metrics.ALL_TIME)), 'PRIMARY KEY', False),
+    ('hourly series', lambda conn: regional_metrics.read_series(conn, 'us-ca', 'hour', '2025-01-01T00'),
+     'PRIMARY KEY', False),
+    ('session stats', statement('get_player_session_stats', ('p', 's')),
+     'INDEX sqlite_autoindex_player_session_stats_1', False),
+    ('achievement', sql('INSERT OR IGNORE INTO player_achievements (player_name, achievement) VALUES (?, ?)',
+                        ('p', 'a')), None, False),
+]
+
+def query_plan(conn, call) -> str:
+    return ' | '.join(row[3] for row in call(ExplainingConnection(conn)))
+
+def check_query_plans(conn) -> None:
+    for lookup, call, expected, sorts in QUERY_PLAN_CHECKS:
+        plan = query_plan(conn, call)
+        assert 'SCAN' not in re.sub(r'SCAN (\w+ USING COVERING INDEX|\(subquery)', '', plan), f"{lookup}: {plan}"
+        assert sorts or 'TEMP B-TREE' not in plan, f"{lookup}: {plan}"
+        if expected:
+            assert expected in plan, f"{lookup}: {plan}"
+        print(f"ok  {lookup:<26} {plan or 'no lookup'}")
+
+def fill_leaderboard(count: int) -> None:
+    database.add_to_leaderboard_many((f"player{i % 50000}", random.randint(0, 300), random.randint(0, 260),
+                                      random.choice(VICTORY_TYPES), random.randint(-20, 100))
+                                     for i in range(count))
+
+def time_top10(conn, calls: int = CALLS) -> float:
+    query = database.STATEMENTS['get_leaderboard']
+    return timeit.timeit(lambda: conn.execute(query, (10,)).fetchall(), number=calls) / calls * 1e3
+
+def run_benchmark() -> None:
+    database.init_db()
+    conn = database.get_connection()
+    check_query_plans(conn)
+    fill_leaderboard(ROW_COUNT)
+    conn.execute('ANALYZE')
+    check_query_plans(conn)
+
+    indexed_ms = time_top10(conn)
+    conn.execute('DROP INDEX idx_player_best_rank')
+    sort_plan = query_plan(sqlite3.connect(database.DB_PATH), statement('get_leaderboard', (10,)))
+    sorted_ms = time_top10(conn, 5)
+    print(f"top-10 of {conn.execute('SELECT COUNT(*) FROM player_best').fetchone()[0]:,} players "
+          f"({ROW_COUNT:,} entries): {indexed_ms:.3f} ms from index, {sorted_ms:.1f} ms without ({sort_plan})")
+
+if __name__ == "__main__":
+    run_benchmark()
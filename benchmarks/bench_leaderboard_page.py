@@ -0,0 +1,64 @@
+"""GET /leaderboard through the WSGI app: render per hit vs the page cache
+
+Times full requests: re-rendering on every hit (as before the page cache),
+a cached 200, a cached gzip 200, and a 304 for a client that sent the ETag.
+
+Run from the project root: python -m benchmarks.bench_leaderboard_page
+"""
+import io
+import logging
+import os
+import tempfile
+import timeit
+
+os.environ.setdefault('SESSION_BACKEND', 'memory')
+
+import database
+
+database.DB_PATH = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import web_game
+
+logging.disable(logging.CRITICAL)
+
+ROWS = 10000
+CALLS = 3000
+
+def get(headers: dict) -> tuple:
+    """Send a GET /leaderboard, returning (status, response headers, body size)"""
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': '/leaderboard', 'SERVER_NAME': 'bench',
+        'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(b'')
+    }
+    environ.update({f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()})
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = {name.lower(): value for name, value in response_headers}
+
+    body = b''.join(web_game.app(environ, start_response))
+    return response['status'], response['headers'], len(body)
+
+def time_us(headers: dict) -> float:
+    return timeit.timeit(lambda: get(headers), number=CALLS) / CALLS * 1e6
+
+def run_benchmark() -> None:
+    database.add_to_leaderboard_many((f"player{i}", i % 150, i % 250, 'Standard Victory', 50)
+                                     for i in range(ROWS))
+    _, headers, plain_size = get({})
+    _, gzip_headers, gzip_size = get({'Accept-Encoding': 'gzip'})
+    version = web_game.get_leaderboard_version
+    web_game.get_leaderboard_version = lambda: None
+    uncached = time_us({})
+    web_game.get_leaderboard_version = version
+    print(f"{'request':<28} {'us/request':>10} {'bytes':>7}")
+    print(f"{'render every hit':<28} {uncached:>10.1f} {plain_size:>7}")
+    print(f"{'cached 200':<28} {time_us({}):>10.1f} {plain_size:>7}")
+    print(f"{'cached 200, gzip':<28} {time_us({'Accept-Encoding': 'gzip'}):>10.1f} {gzip_size:>7}")
+    print(f"{'304 Not Modified':<28} {time_us({'If-None-Match': headers['etag']}):>10.1f} {0:>7}")
+    print(f"{'304 Not Modified, gzip':<28} "
+          f"{time_us({'Accept-Encoding': 'gzip', 'If-None-Match': gzip_headers['etag']}):>10.1f} {0:>7}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,75 @@
+"""Top 10 players when a few grinders own most of the history: leaderboard vs player_best
+
+Deduplicating the history per player means ranking every entry; player_best
+already holds one row per player. The raw top 10 shows how few distinct
+players it would contain. Also times add_to_leaderboard, which now upserts
+the player's best in the same transaction.
+
+Run from the project root: python -m benchmarks.bench_player_best
+BENCH_ROWS sets the history size.
+"""
+import os
+import random
+import tempfile
+import timeit
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+os.environ['DB_WRITE_QUEUE'] = 'false'
+os.environ['LEADERBOARD_CACHE_SIZE'] = '0'
+
+import database
+
+ROW_COUNT = int(os.environ.get('BENCH_ROWS', 1_000_000))
+PLAYERS = 20_000
+GRINDERS = 10
+GRINDER_SHARE = 0.8
+TOP = 10
+INSERTS = 2000
+
+RAW_TOP = '''
+    SELECT player_name, score, xp, victory_type, health, date
+    FROM leaderboard
+    ORDER BY xp DESC, score DESC, id
+    LIMIT ?
+'''
+HISTORY_TOP = '''
+    SELECT player_name, score, xp, victory_type, health, date
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY player_name ORDER BY xp DESC, score DESC, id) AS position
+        FROM leaderboard)
+    WHERE position = 1
+    ORDER BY xp DESC, score DESC, id
+    LIMIT ?
+'''
+
+def history():
+    for _ in range(ROW_COUNT):
+        if random.random() < GRINDER_SHARE:
+            player = f"grinder{random.randrange(GRINDERS)}"
+        else:
+            player = f"player{random.randrange(PLAYERS)}"
+        yield player, random.randrange(300), random.randrange(250), 'DIED', 0
+
+def time_ms(function, calls: int) -> float:
+    return timeit.timeit(function, number=calls) / calls * 1e3
+
+def run_benchmark() -> None:
+    database.init_db()
+    database.add_to_leaderboard_many(history())
+    conn = database.get_connection()
+    conn.execute('ANALYZE')
+    best_count = conn.execute('SELECT COUNT(*) FROM player_best').fetchone()[0]
+
+    raw_top = conn.execute(RAW_TOP, (TOP,)).fetchall()
+    expected = conn.execute(HISTORY_TOP, (TOP,)).fetchall()
+    assert [entry.astuple()[:5] for entry in database.get_leaderboard(TOP)] == [row[:5] for row in expected]
+
+    print(f"{ROW_COUNT:,} entries, {best_count:,} players, {GRINDER_SHARE:.0%} of entries by {GRINDERS} grinders")
+    print(f"distinct players in the raw top {TOP}: {len({row[0] for row in raw_top})}")
+    print(f"top {TOP} players, ranking the history: {time_ms(lambda: conn.execute(HISTORY_TOP, (TOP,)).fetchall(), 3):.1f} ms")
+    print(f"top {TOP} players, from player_best:    {time_ms(lambda: database.get_leaderboard(TOP), 200):.3f} ms")
+    print(f"add_to_leaderboard: {time_ms(lambda: database.add_to_leaderboard('grinder0', 10, 10, 'DIED', 0), INSERTS):.3f} ms")
+
+if __name__ == "__main__":
+    run_benchmark()
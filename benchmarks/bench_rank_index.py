@@ -0,0 +1,65 @@
+"""Rank lookups among the bests of 10M leaderboard entries: COUNT(*) over the index vs RankIndex
+
+A rank lookup near the top of the board is cheap either way; one near the
+bottom makes SQLite count almost every entry. The index pays once to load,
+then per commit only for the rows added since.
+
+Run from the project root: python -m benchmarks.bench_rank_index
+BENCH_ROWS sets the entry count.
+"""
+import os
+import random
+import tempfile
+import time
+import timeit
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import database
+from rank_index import RankIndex
+
+ROW_COUNT = int(os.environ.get('BENCH_ROWS', 10_000_000))
+LOOKUPS = (('top', 240, 300), ('middle', 100, 150), ('bottom', 0, 0))
+CALLS = 1000
+SQL_CALLS = 5
+NEW_ROWS = 100
+VICTORY_TYPES = ('Perfect Victory', 'Glorious Victory', 'Pyrrhic Victory', 'Standard Victory', 'DIED')
+
+def count_rank(conn, xp: int, score: int) -> int:
+    return conn.execute('SELECT COUNT(*) FROM player_best WHERE (xp, score) > (?, ?)',
+                        (xp, score)).fetchone()[0] + 1
+
+def time_ms(function, calls: int) -> float:
+    return timeit.timeit(function, number=calls) / calls * 1e3
+
+def run_benchmark() -> None:
+    database.init_db()
+    started = time.perf_counter()
+    database.add_to_leaderboard_many((f"player{i % 100_000}", random.randrange(300), random.randrange(250),
+                                      random.choice(VICTORY_TYPES), random.randrange(1, 101))
+                                     for i in range(ROW_COUNT))
+    print(f"{ROW_COUNT:,} entries inserted in {time.perf_counter() - started:.0f} s")
+
+    conn = database.get_connection()
+    index = RankIndex(lambda: database.open_connection(check_same_thread=False))
+    started = time.perf_counter()
+    index.load()
+    print(f"RankIndex load: {time.perf_counter() - started:.1f} s")
+
+    print(f"{'lookup':<8} {'rank':>12} {'COUNT(*) ms':>12} {'RankIndex ms':>13}")
+    for name, xp, score in LOOKUPS:
+        rank = index.rank_of(xp, score)
+        assert rank == count_rank(conn, xp, score)
+        sql_ms = time_ms(lambda: count_rank(conn, xp, score), SQL_CALLS)
+        index_ms = time_ms(lambda: index.rank_of(xp, score), CALLS)
+        print(f"{name:<8} {rank:>12,} {sql_ms:>12.3f} {index_ms:>13.4f}")
+
+    players = conn.execute('SELECT COUNT(*) FROM player_best').fetchone()[0]
+    database.add_to_leaderboard_many(("newcomer", random.randrange(300), random.randrange(250), 'DIED', 0)
+                                     for _ in range(NEW_ROWS))
+    refresh_ms = time_ms(lambda: index.rank_of(0, 0), 1)
+    assert index.count() == players + 1
+    print(f"first lookup after {NEW_ROWS} new entries: {refresh_ms:.3f} ms")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,64 @@
+"""Regional telemetry posts: a writer mutation per update vs per-worker counters
+
+Request threads call update_regional_stats as /api/stats/regional does.
+Reports calls per second, the writer mutations and commits each mode cost,
+and checks both modes leave identical running totals.
+
+Run from the project root: python -m benchmarks.bench_regional_counters
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import database
+
+THREADS = 8
+CALLS_PER_THREAD = 5000
+REGIONS = 200
+PLAYERS = 2000
+
+def post_updates(seed: int) -> None:
+    rng = random.Random(seed)
+    styles = (None,) + database.REGIONAL_COMBAT_STYLES
+    actions = (None,) + database.REGIONAL_ACTIONS
+    for _ in range(CALLS_PER_THREAD):
+        database.update_regional_stats(f"region-{rng.randrange(REGIONS)}", 'US', 'CA',
+                                       f"player{rng.randrange(PLAYERS)}", rng.choice(styles), rng.choice(actions))
+
+def run_mode(interval: float) -> tuple:
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), 'game.db')
+    database.REGIONAL_STATS_FLUSH_INTERVAL = interval
+    database.init_db()
+    writer = database.get_writer()
+    threads = [threading.Thread(target=post_updates, args=(seed,)) for seed in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    database.close_writer()
+    conn = database.get_connection()
+    rows = conn.execute('''
+        SELECT region_key, metric, count FROM regional_counters
+        WHERE bucket = 'all' ORDER BY region_key, metric
+    ''').fetchall()
+    database.close_connection()
+    return THREADS * CALLS_PER_THREAD / elapsed, writer.mutations, writer.commits, rows
+
+def run_benchmark() -> None:
+    print(f"{THREADS} threads x {CALLS_PER_THREAD} updates over {REGIONS} regions")
+    print(f"{'mode':<28} {'calls/s':>10} {'mutations':>10} {'commits':>8}")
+    results = {}
+    for label, interval in (('writer mutation per update', 0), ('counters, 5 s flush', 5)):
+        calls_per_second, mutations, commits, rows = results[label] = run_mode(interval)
+        print(f"{label:<28} {calls_per_second:>10,.0f} {mutations:>10,} {commits:>8,}")
+    direct, summed = (result[3] for result in results.values())
+    assert direct == summed, "modes disagree on the final counts"
+
+if __name__ == "__main__":
+    run_benchmark()
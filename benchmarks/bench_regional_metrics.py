@@ -0,0 +1,86 @@
+"""Regional dashboards on regional_counters: daily series before and after the hourly rollup
+
+Fills DAYS of hourly buckets for every region and metric, then times a
+DAYS-long daily series, which sums every hourly row, against the same
+series once compact() has rolled them into daily rows. Also times that
+backlog rollup, the hourly one that follows it, the running-total read
+behind get_regional_stats and one flush of REGIONS summed regions.
+
+Run from the project root: python -m benchmarks.bench_regional_metrics
+"""
+import os
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta, timezone
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+os.environ['DB_WRITE_QUEUE'] = 'false'
+
+import database
+import regional_metrics
+from regional_counters import PendingRegion
+
+REGIONS = 200
+DAYS = 30
+READS = 200
+
+def fill_hours(conn, now: datetime) -> None:
+    for hour in range(DAYS * 24):
+        with conn:
+            regional_metrics.increment(conn, [(f"region-{region}", metric, 1 + (hour + region) % 7)
+                                              for region in range(REGIONS)
+                                              for metric in database.REGIONAL_METRICS],
+                                       now - timedelta(hours=hour))
+
+def time_ms(function, calls: int) -> float:
+    return timeit.timeit(function, number=calls) / calls * 1e3
+
+def daily_series() -> list:
+    return database.get_regional_series('region-7', 'day', DAYS)
+
+def run_benchmark() -> None:
+    database.init_db()
+    conn = database.get_connection()
+    now = datetime.now(timezone.utc)
+    fill_hours(conn, now)
+    count_rows = lambda: conn.execute('SELECT COUNT(*) FROM regional_counters').fetchone()[0]
+    hourly_rows = count_rows()
+    expected = daily_series()
+    hourly_ms = time_ms(daily_series, READS)
+
+    start = time.perf_counter()
+    with conn:
+        rolled = regional_metrics.compact(conn, database.REGIONAL_HOURLY_RETENTION, now)
+    compact_ms = (time.perf_counter() - start) * 1e3
+    # The hour after, as every process sees it: one hour of rows to roll
+    start = time.perf_counter()
+    with conn:
+        rolled_hour = regional_metrics.compact(conn, database.REGIONAL_HOURLY_RETENTION,
+                                               now + timedelta(hours=1))
+    hour_ms = (time.perf_counter() - start) * 1e3
+    assert daily_series() == expected, "rollup changed the daily series"
+    daily_ms = time_ms(daily_series, READS)
+    totals_ms = time_ms(lambda: database.get_regional_stats('region-7'), READS)
+
+    pending = {}
+    for region in range(REGIONS):
+        summed = pending[f"region-{region}"] = PendingRegion('US', 'CA')
+        summed.counts = {'total_games': 20, 'combat_style_brave': 7, 'action_fight': 12}
+        summed.players = {f"player{region}-{i}" for i in range(5)}
+    start = time.perf_counter()
+    with conn:
+        database._apply_regional_counters(conn, pending)
+    flush_ms = (time.perf_counter() - start) * 1e3
+
+    print(f"{REGIONS} regions x {len(database.REGIONAL_METRICS)} metrics, {DAYS} days of hourly buckets")
+    print(f"rows: {hourly_rows:,} hourly, {count_rows():,} after rolling up {rolled:,} "
+          f"({database.REGIONAL_HOURLY_RETENTION} h kept) in {compact_ms:,.0f} ms")
+    print(f"next hourly rollup: {rolled_hour:,} rows in {hour_ms:.1f} ms")
+    print(f"{DAYS}-day series, summing hours:   {hourly_ms:>8.3f} ms")
+    print(f"{DAYS}-day series, daily rows:      {daily_ms:>8.3f} ms")
+    print(f"get_regional_stats:             {totals_ms:>8.3f} ms")
+    print(f"flush of {REGIONS} summed regions:     {flush_ms:>8.1f} ms")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,70 @@
+"""update_regional_stats at 1M leaderboard rows: LIKE distinct-player scan vs regional_players
+
+The LIKE pattern has a leading wildcard, so the old update scanned the whole
+leaderboard on every call; the membership insert is one primary-key probe
+whatever the leaderboard holds. Commit per call on one connection.
+
+Run from the project root: python -m benchmarks.bench_regional_players
+BENCH_ROWS sets the leaderboard size.
+"""
+import os
+import random
+import tempfile
+import timeit
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import database
+
+ROW_COUNT = int(os.environ.get('BENCH_ROWS', 1_000_000))
+REGIONS = 50
+PLAYERS = 5000
+LIKE_CALLS = 20
+CALLS = 20000
+
+def like_regional_stats(conn, region_key: str, country: str, region: str, player_name: str) -> None:
+    """The update as it was, counting players with a LIKE scan of the leaderboard
+
+    The wide counter columns it wrote are gone, so the count is stored as
+    the region's running total instead.
+    """
+    conn.execute(database.STATEMENTS['upsert_region'], (region_key, country, region))
+    conn.execute('''
+        INSERT OR REPLACE INTO regional_counters (region_key, metric, bucket, count)
+        SELECT ?, 'total_players', 'all', COUNT(DISTINCT player_name)
+        FROM leaderboard
+        WHERE player_name LIKE ?
+    ''', (region_key, f"%{player_name}%"))
+
+def calls():
+    while True:
+        yield f"region-{random.randrange(REGIONS)}", 'US', 'CA', f"player{random.randrange(PLAYERS)}"
+
+def time_us(conn, function, count: int) -> float:
+    arguments = calls()
+    def run():
+        with conn:
+            function(conn, *next(arguments))
+    return timeit.timeit(run, number=count) / count * 1e6
+
+def run_benchmark() -> None:
+    database.init_db()
+    database.add_to_leaderboard_many((f"player{i % 200_000}", random.randrange(300), random.randrange(250),
+                                      'DIED', 0) for i in range(ROW_COUNT))
+    conn = database.get_connection()
+    like_us = time_us(conn, like_regional_stats, LIKE_CALLS)
+    conn.execute('DELETE FROM regional_counters')
+    conn.commit()
+    membership_us = time_us(conn, lambda conn, *call: database._apply_regional_stats(conn, *call, None, None),
+                            CALLS)
+    counted = conn.execute('''
+        SELECT SUM(count) FROM regional_counters WHERE metric = 'total_players' AND bucket = 'all'
+    ''').fetchone()[0]
+    members = conn.execute('SELECT COUNT(*) FROM regional_players').fetchone()[0]
+    assert counted == members, (counted, members)
+    print(f"{ROW_COUNT:,} leaderboard rows, commit per call")
+    print(f"LIKE scan:          {like_us:>10,.0f} us/call")
+    print(f"regional_players:   {membership_us:>10,.1f} us/call ({members:,} region memberships)")
+
+if __name__ == "__main__":
+    run_benchmark()
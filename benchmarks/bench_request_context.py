@@ -0,0 +1,126 @@
+"""Session store and cookie operations per POST /choice, per-call lookups vs RequestContext
+
+Drives the WSGI app in-process through the same seeded games twice: once
+with contexts that resolve the session and read or write the store on
+every call, as the routes did before RequestContext, and once with the
+request-scoped RequestContext. Only the /choice requests are counted and
+timed; restarting a finished game goes around the counters.
+
+Run from the project root: python -m benchmarks.bench_request_context
+"""
+import io
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Dict
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+os.environ.setdefault('SESSION_BACKEND', 'memory')
+
+import database
+
+database.DB_PATH = os.path.join(tempfile.mkdtemp(), 'game.db')
+
+import request_context
+import web_game
+
+logging.disable(logging.CRITICAL)
+
+REQUESTS = 2000
+CHOICES = ('adventure', 'fight', 'search_alone', 'get_help', 'rest', 'run')
+
+class PerCallContext(request_context.RequestContext):
+    """The lookup path before RequestContext: nothing is kept between calls
+
+    Every call resolves the session id again, every read goes to the store
+    and every save is written at once.
+    """
+
+    @property
+    def session_id(self) -> str:
+        return self._resolve_session_id()
+
+    def current_state(self):
+        self.state_loads += 1
+        return self._load_state(self.session_id)
+
+    def stored_state(self):
+        return self.current_state()
+
+    def save(self, state) -> None:
+        self._store_state(self.session_id, state)
+        self.state_writes += 1
+
+    def commit(self) -> None:
+        pass
+
+class CountingStore:
+    """Session store wrapper counting reads and writes"""
+
+    def __init__(self, store):
+        self.store = store
+        self.gets = 0
+        self.sets = 0
+
+    def get(self, session_id):
+        self.gets += 1
+        return self.store.get(session_id)
+
+    def set(self, session_id, state):
+        self.sets += 1
+        self.store.set(session_id, state)
+
+def post(path: str, form: dict, cookies: dict) -> int:
+    """Send a form POST through the app and return the Set-Cookie count"""
+    body = urlencode(form).encode()
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'SERVER_NAME': 'bench',
+        'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(body),
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded', 'CONTENT_LENGTH': str(len(body)),
+        'HTTP_COOKIE': '; '.join(f'{name}={value}' for name, value in cookies.items())
+    }
+    headers = []
+    b''.join(web_game.app(environ, lambda status, response_headers, exc_info=None:
+                          headers.extend(response_headers)))
+    set_cookies = [value for name, value in headers if name.lower() == 'set-cookie']
+    for value in set_cookies:
+        name, _, cookie_value = value.split(';')[0].partition('=')
+        cookies[name] = cookie_value
+    return len(set_cookies)
+
+def play(store: CountingStore) -> Dict[str, float]:
+    """Play REQUESTS seeded choices, returning per-POST store reads, writes, cookies and time"""
+    random.seed(42)
+    cookies: dict = {}
+    post('/start', {'player_name': 'Bench'}, cookies)
+    gets = sets = cookie_writes = 0
+    elapsed = 0.0
+    for _ in range(REQUESTS):
+        gets_before, sets_before = store.gets, store.sets
+        started = time.perf_counter()
+        cookie_writes += post('/choice', {'choice': random.choice(CHOICES)}, cookies)
+        elapsed += time.perf_counter() - started
+        gets += store.gets - gets_before
+        sets += store.sets - sets_before
+        if store.store.get(cookies['session_id']).health is None:
+            post('/start', {'player_name': 'Bench'}, cookies)
+    return {'reads': gets / REQUESTS, 'writes': sets / REQUESTS,
+            'cookies': cookie_writes / REQUESTS, 'us': elapsed / REQUESTS * 1e6}
+
+def run_benchmark() -> None:
+    store = CountingStore(web_game.session_store)
+    web_game.session_store = store
+    play(store)  # Warm up templates and imports
+    with patch.object(request_context, 'RequestContext', PerCallContext):
+        before = play(store)
+    after = play(store)
+    print(f"{'per POST /choice':<18} {'per call':>9} {'context':>9}")
+    for label, key, digits in (('store reads', 'reads', 2), ('store writes', 'writes', 2),
+                               ('cookies set', 'cookies', 2), ('time us', 'us', 1)):
+        print(f"{label:<18} {before[key]:>9.{digits}f} {after[key]:>9.{digits}f}")
+
+if __name__ == "__main__":
+    run_benchmark()
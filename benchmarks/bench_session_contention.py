@@ -0,0 +1,51 @@
+"""Session map throughput under concurrent threads
+
+Each thread reads and writes its own sessions; compares a single-lock
+BoundedSessionMap with the lock-striped ShardedSessionMap.
+
+Run from the project root: python -m benchmarks.bench_session_contention
+"""
+import secrets
+import threading
+import time
+
+from game_state import GameState
+from session_store import BoundedSessionMap, ShardedSessionMap
+
+THREAD_COUNTS = (1, 4, 16, 64)
+OPERATIONS = 400_000
+SESSIONS_PER_THREAD = 100
+
+def run_threads(session_map, thread_count: int) -> float:
+    """Return operations per second with thread_count threads sharing session_map"""
+    per_thread = OPERATIONS // thread_count
+    start_barrier = threading.Barrier(thread_count + 1)
+    session_ids = [[secrets.token_hex(16) for _ in range(SESSIONS_PER_THREAD)]
+                   for _ in range(thread_count)]
+    state = GameState('Bench', None, 100, 0, 0, 100, 0, 0)
+
+    def worker(own_ids):
+        start_barrier.wait()
+        for i in range(per_thread // 2):
+            session_id = own_ids[i % SESSIONS_PER_THREAD]
+            session_map.set(session_id, state)
+            session_map.get(session_id)
+
+    threads = [threading.Thread(target=worker, args=(ids,)) for ids in session_ids]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return per_thread * thread_count / (time.perf_counter() - started)
+
+def run_benchmark() -> None:
+    print(f"{'threads':>8} {'single lock ops/s':>18} {'16 shards ops/s':>16}")
+    for thread_count in THREAD_COUNTS:
+        single = run_threads(BoundedSessionMap(), thread_count)
+        sharded = run_threads(ShardedSessionMap(16), thread_count)
+        print(f"{thread_count:>8} {single:>18,.0f} {sharded:>16,.0f}")
+
+if __name__ == "__main__":
+    run_benchmark()
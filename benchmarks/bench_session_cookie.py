@@ -0,0 +1,32 @@
+"""Per-request cost of encoding and verifying signed state cookies
+
+Run from the project root: SESSION_COOKIE_SECRET=... python -m benchmarks.bench_session_cookie
+"""
+import os
+import timeit
+
+os.environ.setdefault('SESSION_COOKIE_SECRET', 'benchmark-secret')
+
+from game_state import GameState
+from session_cookie import TurnTracker, decode_state_cookie, encode_state_cookie
+
+ITERATIONS = 200_000
+SESSION_ID = '5f0c6b1e9a8d4c3b2a19f8e7d6c5b4a3'
+
+def run_benchmark() -> None:
+    state = GameState('Adventurer', None, 80, 45, 120, 100, 25, 100)
+    cookie = encode_state_cookie(SESSION_ID, state, 7)
+    tracker = TurnTracker()
+
+    def verify() -> None:
+        _, turn = decode_state_cookie(SESSION_ID, cookie, 3600)
+        tracker.check(SESSION_ID, turn)
+
+    encode_seconds = timeit.timeit(lambda: encode_state_cookie(SESSION_ID, state, 8), number=ITERATIONS)
+    verify_seconds = timeit.timeit(verify, number=ITERATIONS)
+    print(f"cookie size: {len(cookie)} bytes")
+    print(f"encode: {encode_seconds / ITERATIONS * 1e6:.2f} us/request")
+    print(f"verify: {verify_seconds / ITERATIONS * 1e6:.2f} us/request")
+
+if __name__ == "__main__":
+    run_benchmark()
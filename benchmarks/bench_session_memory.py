@@ -0,0 +1,43 @@
+"""Bytes per live session for the nested-dict and GameState representations
+
+Run from the project root: python -m benchmarks.bench_session_memory
+"""
+import gc
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from game_state import GameState
+
+SESSION_COUNTS = (100_000, 1_000_000)
+
+def build_dict_state(player_name: str, turn: int) -> Dict[str, Any]:
+    """Session shape stored by the original game_states dict"""
+    stats = {'health': 100 - turn % 90, 'score': turn % 150, 'xp': turn % 220}
+    return {'stats': stats, 'previous_stats': stats.copy(), 'player_name': player_name}
+
+def build_slots_state(player_name: str, turn: int) -> GameState:
+    return GameState(player_name, None, 100 - turn % 90, turn % 150, turn % 220,
+                     100 - turn % 90, turn % 150, turn % 220)
+
+def measure_bytes_per_session(build_state: Callable[[str, int], Any], count: int) -> float:
+    """Allocate count sessions keyed by session id and return bytes per session"""
+    player_names: List[str] = [f"player{i}" for i in range(count)]
+    session_ids: List[str] = [f"{i:032x}" for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    sessions = {session_ids[i]: build_state(player_names[i], i) for i in range(count)}
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+    return allocated / count
+
+def run_benchmark() -> None:
+    print(f"{'sessions':>10} {'dict bytes':>12} {'GameState bytes':>16} {'saving':>8}")
+    for count in SESSION_COUNTS:
+        dict_bytes = measure_bytes_per_session(build_dict_state, count)
+        slots_bytes = measure_bytes_per_session(build_slots_state, count)
+        saving = 100 * (1 - slots_bytes / dict_bytes)
+        print(f"{count:>10} {dict_bytes:>12.1f} {slots_bytes:>16.1f} {saving:>7.1f}%")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,53 @@
+"""Snapshot write, restore and lazy lookup times at 1M sessions
+
+Run from the project root: python -m benchmarks.bench_session_snapshot
+"""
+import os
+import random
+import tempfile
+import time
+
+from game_state import GameState
+from session_snapshot import SessionSnapshot, write_snapshot
+
+SESSION_COUNT = 1_000_000
+LOOKUPS = 100_000
+
+def build_entries(count: int, saved_at: int):
+    for i in range(count):
+        state = GameState(f"player{i}", None, 100 - i % 90, i % 150, i % 220, 100, i % 140, i % 200)
+        yield f"{i:032x}", state, saved_at
+
+def run_benchmark() -> None:
+    path = os.path.join(tempfile.mkdtemp(), 'sessions.snapshot')
+    entries = list(build_entries(SESSION_COUNT, int(time.time())))
+
+    started = time.perf_counter()
+    write_snapshot(path, entries)
+    write_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    snapshot = SessionSnapshot(path)
+    restore_seconds = time.perf_counter() - started
+
+    keys = [entries[random.randrange(SESSION_COUNT)][0] for _ in range(LOOKUPS)]
+    started = time.perf_counter()
+    for key in keys:
+        snapshot.get(key)
+    lookup_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    decoded = sum(1 for _ in snapshot.entries())
+    full_decode_seconds = time.perf_counter() - started
+
+    print(f"sessions:            {SESSION_COUNT}")
+    print(f"file size:           {os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"snapshot write:      {write_seconds:.2f} s")
+    print(f"restore (map+header): {restore_seconds * 1e3:.3f} ms")
+    print(f"lazy lookup:         {lookup_seconds / LOOKUPS * 1e6:.2f} us/session")
+    print(f"full decode:         {full_decode_seconds:.2f} s ({decoded} sessions, not done at boot)")
+    snapshot.close()
+    os.remove(path)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,131 @@
+"""Bulk load leaderboard and telemetry rows into the game database
+
+Examples, run from the project root:
+    python bulk_import.py from-db game.db                  # CLI game or a restored backup
+    python bulk_import.py csv leaderboard results.csv      # header row names the columns
+    python bulk_import.py synthetic 1000000                # load-test data
+
+Rows go into DB_PATH through executemany in chunks of --chunk-size. For large
+offline loads --defer-indexes drops the target tables' indexes first and
+rebuilds them once at the end, roughly twice as fast as keeping
+them up to date row by row; do not use it while the game is serving traffic.
+"""
+import argparse
+import csv
+import random
+import sqlite3
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import database
+
+# table: (import columns, bulk insert function)
+IMPORTERS: Dict[str, Tuple[Tuple[str, ...], Callable[..., int]]] = {
+    'leaderboard': (database.LEADERBOARD_IMPORT_COLUMNS, database.add_to_leaderboard_many),
+    'player_achievements': (database.ACHIEVEMENT_IMPORT_COLUMNS, database.record_achievements_many),
+    'player_session_stats': (database.SESSION_STATS_IMPORT_COLUMNS, database.add_player_session_stats_many),
+}
+
+SYNTHETIC_VICTORY_TYPES = ('Perfect Victory', 'Glorious Victory', 'Pyrrhic Victory',
+                           'Standard Victory', 'DIED')
+
+def drop_indexes(tables: Iterable[str]) -> List[str]:
+    """Drop the named tables' explicit indexes, returning the statements that recreate them"""
+    conn = database.get_connection()
+    placeholders = ', '.join('?' for _ in tables)
+    indexes = conn.execute(f"""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+    """, tuple(tables)).fetchall()
+    with conn:
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+    return [sql for _, sql in indexes]
+
+def restore_indexes(statements: Iterable[str]) -> None:
+    conn = database.get_connection()
+    with conn:
+        for sql in statements:
+            conn.execute(sql)
+
+def source_rows(source: sqlite3.Connection, table: str, columns: Sequence[str]) -> Iterator[tuple]:
+    """Stream a source table in import column order, NULL for columns it lacks"""
+    present = {row[1] for row in source.execute(f"PRAGMA table_info({table})")}
+    selected = ', '.join(column if column in present else 'NULL' for column in columns)
+    return source.execute(f"SELECT {selected} FROM {table}")
+
+def import_database(path: str, chunk_size: int) -> Dict[str, int]:
+    """Copy every known table found in another game database"""
+    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    tables = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    counts = {}
+    try:
+        for table, (columns, insert) in IMPORTERS.items():
+            if table in tables:
+                counts[table] = insert(source_rows(source, table, columns), chunk_size)
+    finally:
+        source.close()
+    return counts
+
+def csv_rows(path: str, columns: Sequence[str]) -> Iterator[tuple]:
+    """Stream a CSV file in import column order; empty cells and missing columns become None
+
+    The bulk insert functions then apply their column defaults or reject the row.
+    """
+    with open(path, newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        positions = [header.index(column) if column in header else None for column in columns]
+        for record in reader:
+            yield tuple(record[position] or None if position is not None else None
+                        for position in positions)
+
+def synthetic_leaderboard(count: int, players: int = 10000) -> Iterable[tuple]:
+    for _ in range(count):
+        yield (f"player{random.randrange(players)}", random.randrange(200), random.randrange(300),
+               random.choice(SYNTHETIC_VICTORY_TYPES), random.randrange(1, 101))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk load rows into the game database")
+    parser.add_argument('--chunk-size', type=int, default=database.DB_BULK_CHUNK_SIZE,
+                        help="rows per transaction")
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help="drop indexes during the load and rebuild them afterwards")
+    commands = parser.add_subparsers(dest='command', required=True)
+    from_db = commands.add_parser('from-db', help="import from another game database")
+    from_db.add_argument('path')
+    from_csv = commands.add_parser('csv', help="import a CSV file with a header row")
+    from_csv.add_argument('table', choices=sorted(IMPORTERS))
+    from_csv.add_argument('path')
+    synthetic = commands.add_parser('synthetic', help="generate random leaderboard rows")
+    synthetic.add_argument('count', type=int)
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    start = time.perf_counter()
+    deferred = drop_indexes(IMPORTERS) if args.defer_indexes else []
+    try:
+        if args.command == 'from-db':
+            counts = import_database(args.path, args.chunk_size)
+        elif args.command == 'csv':
+            columns, insert = IMPORTERS[args.table]
+            counts = {args.table: insert(csv_rows(args.path, columns), args.chunk_size)}
+        else:
+            counts = {'leaderboard': database.add_to_leaderboard_many(synthetic_leaderboard(args.count),
+                                                                      args.chunk_size)}
+    except ValueError as e:
+        print(f"Import stopped at a bad row: {e}; chunks already committed were kept")
+        return 1
+    finally:
+        restore_indexes(deferred)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    print(f"Imported {total} rows into {database.DB_PATH} in {elapsed:.1f}s "
+          f"({total / max(elapsed, 1e-9) * 60:,.0f} rows/min)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
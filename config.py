@@ -1,3 +1,5 @@
+import os
+
 # Development configuration settings
 DEVELOPMENT_CONFIG = {
     'TEMPLATE_STRICT_VARS': True,  # Enable strict template variable checking
@@ -22,6 +24,14 @@ DEVELOPMENT_CONFIG = {
         'max_request_size': 10 * 1024,  # 10KB
         'request_timeout': 5,  # seconds
         'session_lifetime': 24 * 60 * 60  # 24 hours
+    },
+    'SESSIONS': {
+        'max_entries': 100000,  # Live sessions held per worker
+        'max_bytes': 64 * 1024 * 1024,  # 64MB approximate budget per worker
+        'sweep_interval': 60,  # seconds
+        'flush_interval_ms': 500,  # Write-behind flush period
+        'flush_batch_size': 256,  # Flush early once this many sessions are dirty
+        'shards': 16  # Lock stripes for in-process session maps
     }
 }
 
@@ -52,5 +62,18 @@ PRODUCTION_CONFIG = {
         'csrf_enabled': True,
         'secure_cookies': True,
         'strict_transport_security': True
+    },
+    'SESSIONS': {
+        'max_entries': 100000,  # Live sessions held per worker
+        'max_bytes': 64 * 1024 * 1024,  # 64MB approximate budget per worker
+        'sweep_interval': 60,  # seconds
+        'flush_interval_ms': 500,  # Write-behind flush period
+        'flush_batch_size': 256,  # Flush early once this many sessions are dirty
+        'shards': 16  # Lock stripes for in-process session maps
     }
-} 
\ No newline at end of file
+}
+
+def get_config() -> dict:
+    """Return the configuration for the current environment"""
+    debug = os.environ.get('DEBUG', 'False').lower() == 'true'
+    return DEVELOPMENT_CONFIG if debug else PRODUCTION_CONFIG
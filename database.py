@@ -1,171 +1,601 @@
 import sqlite3
-from dataclasses import dataclass
-from typing import Optional, List
-from datetime import datetime
+from typing import Optional, List, Dict, Iterable, Sequence
+from itertools import islice
+from datetime import datetime, timezone
 import os
 import secrets
 import hashlib
+import threading
+import time
+import atexit
+from concurrent.futures import Future
+from db_migrations import run_migrations
+from db_rows import LeaderboardEntry, decode_leaderboard, fetch_dict, clear_column_maps
+from db_writer import DatabaseWriter
+from leaderboard_cache import LeaderboardCache
+import leaderboard_boards
+from rank_index import RankIndex
+from regional_counters import PendingRegion, RegionalCounters
+import regional_metrics
 
 # Ensure data directory exists
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
-DB_PATH = os.path.join(DATA_DIR, 'game.db')
-
-@dataclass
-class LeaderboardEntry:
-    player_name: str
-    score: int
-    xp: int
-    victory_type: str
-    health: int
-    date: datetime
-
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Drop existing tables to start fresh
-    c.execute('DROP TABLE IF EXISTS leaderboard')
-    
-    # Create leaderboard table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS leaderboard
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         player_name TEXT,
-         score INTEGER,
-         xp INTEGER,
-         victory_type TEXT,
-         health INTEGER,
-         date TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
-    ''')
-    
-    # Create users table with magic link authentication
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         email TEXT UNIQUE,
-         display_name TEXT,
-         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-         last_played_at TIMESTAMP,
-         total_games INTEGER DEFAULT 0,
-         best_score INTEGER DEFAULT 0,
-         best_xp INTEGER DEFAULT 0,
-         magic_link_token TEXT,
-         magic_link_expiry TIMESTAMP)
-    ''')
-    
-    # Create regional stats table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS regional_stats
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         region_key TEXT UNIQUE,
-         country TEXT,
-         region TEXT,
-         total_games INTEGER DEFAULT 0,
-         total_players INTEGER DEFAULT 0,
-         combat_style_brave INTEGER DEFAULT 0,
-         combat_style_cautious INTEGER DEFAULT 0,
-         combat_style_balanced INTEGER DEFAULT 0,
-         action_fight INTEGER DEFAULT 0,
-         action_run INTEGER DEFAULT 0,
-         action_rest INTEGER DEFAULT 0,
-         action_search_alone INTEGER DEFAULT 0,
-         action_get_help INTEGER DEFAULT 0,
-         last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
-    ''')
-    
-    # Create player achievements table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS player_achievements
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         player_name TEXT,
-         achievement TEXT,
-         achieved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-         UNIQUE(player_name, achievement))
-    ''')
-    
-    # Create player session stats table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS player_session_stats
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         player_name TEXT,
-         session_id TEXT UNIQUE,
-         first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-         games_played INTEGER DEFAULT 0,
-         total_score INTEGER DEFAULT 0,
-         total_xp INTEGER DEFAULT 0,
-         best_score INTEGER DEFAULT 0,
-         best_xp INTEGER DEFAULT 0,
-         turn_count INTEGER DEFAULT 0,
-         treasures_found INTEGER DEFAULT 0,
-         treasure_attempts INTEGER DEFAULT 0,
-         combat_style TEXT DEFAULT 'balanced',
-         last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
-    ''')
-    
-    conn.commit()
-    conn.close()
+DB_PATH = os.environ.get('DB_PATH', os.path.join(DATA_DIR, 'game.db'))
+
+# Background writer settings
+DB_WRITE_QUEUE = os.environ.get('DB_WRITE_QUEUE', 'true').lower() == 'true'
+DB_WRITE_QUEUE_SIZE = int(os.environ.get('DB_WRITE_QUEUE_SIZE', '10000'))
+DB_WRITE_BATCH_SIZE = int(os.environ.get('DB_WRITE_BATCH_SIZE', '500'))
+DB_WRITE_TIMEOUT = float(os.environ.get('DB_WRITE_TIMEOUT', '30'))
+DB_BULK_CHUNK_SIZE = int(os.environ.get('DB_BULK_CHUNK_SIZE', '10000'))
+
+# Top leaderboard rows kept in process; 0 sends every get_leaderboard to SQLite
+LEADERBOARD_CACHE_SIZE = int(os.environ.get('LEADERBOARD_CACHE_SIZE', '100'))
+# Rows kept on each daily, weekly and all-time board, overall and per outcome
+LEADERBOARD_BOARD_SIZE = int(os.environ.get('LEADERBOARD_BOARD_SIZE', '100'))
+# Per-worker rank index; off, each rank lookup counts the better rows in SQLite
+LEADERBOARD_RANK_INDEX = os.environ.get('LEADERBOARD_RANK_INDEX', 'true').lower() == 'true'
+
+# Read snapshot settings: reads go to a read-only copy at most DB_SNAPSHOT_INTERVAL seconds old
+DB_READ_SNAPSHOT = os.environ.get('DB_READ_SNAPSHOT', 'false').lower() == 'true'
+DB_SNAPSHOT_PATH = os.environ.get('DB_SNAPSHOT_PATH', os.path.join(DATA_DIR, 'game.snapshot.db'))
+DB_SNAPSHOT_INTERVAL = float(os.environ.get('DB_SNAPSHOT_INTERVAL', '5'))
+
+# Seconds regional stats are summed in each process before being written together; 0 writes every update
+REGIONAL_STATS_FLUSH_INTERVAL = float(os.environ.get('REGIONAL_STATS_FLUSH_INTERVAL', '5'))
+# Hours of hourly regional buckets kept before they are rolled up into daily ones
+REGIONAL_HOURLY_RETENTION = int(os.environ.get('REGIONAL_HOURLY_RETENTION', '48'))
+
+# Column order of rows accepted by the *_many bulk functions
+LEADERBOARD_IMPORT_COLUMNS = ('player_name', 'score', 'xp', 'victory_type', 'health', 'date')
+ACHIEVEMENT_IMPORT_COLUMNS = ('player_name', 'achievement')
+SESSION_STATS_IMPORT_COLUMNS = ('player_name', 'session_id', 'games_played', 'total_score', 'total_xp',
+                                'best_score', 'best_xp', 'turn_count', 'treasures_found',
+                                'treasure_attempts', 'combat_style')
+
+# Applied once to every read-only snapshot connection
+SNAPSHOT_PRAGMAS = (
+    'PRAGMA cache_size=-8000',
+    'PRAGMA mmap_size=67108864'
+)
+
+# Applied once to every pooled connection
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-8000',  # 8MB page cache
+    'PRAGMA mmap_size=67108864',  # 64MB
+    'PRAGMA temp_store=MEMORY'
+)
+
+# Counters the stats updates may touch; anything else is rejected or ignored
+REGIONAL_COMBAT_STYLES = ('brave', 'cautious', 'balanced')
+REGIONAL_ACTIONS = ('fight', 'run', 'rest', 'search_alone', 'get_help')
+SESSION_STAT_COUNTERS = ('games_played', 'total_score', 'total_xp', 'best_score', 'best_xp',
+                         'turn_count', 'treasures_found', 'treasure_attempts')
+
+REGIONAL_COUNTERS = ([f"combat_style_{style}" for style in REGIONAL_COMBAT_STYLES] +
+                     [f"action_{action}" for action in REGIONAL_ACTIONS])
+# Every metric regional_counters may hold; a new style or action only needs adding above
+REGIONAL_METRICS = ('total_games', 'total_players', *REGIONAL_COUNTERS)
+
+PLAYER_BEST_CONFLICT = '''
+    ON CONFLICT(player_name) DO UPDATE SET
+        entry_id = excluded.entry_id,
+        score = excluded.score,
+        xp = excluded.xp,
+        victory_type = excluded.victory_type,
+        health = excluded.health,
+        date = excluded.date
+    WHERE (excluded.xp, excluded.score) > (player_best.xp, player_best.score)
+'''
+
+PLAYER_OUTCOME_BEST_CONFLICT = '''
+    ON CONFLICT(player_name, victory_type) DO UPDATE SET
+        entry_id = excluded.entry_id,
+        score = excluded.score,
+        xp = excluded.xp,
+        health = excluded.health,
+        date = excluded.date
+    WHERE (excluded.xp, excluded.score) > (player_outcome_best.xp, player_outcome_best.score)
+'''
+
+def _build_statements() -> dict:
+    """Fixed statement text for stats updates and reads, built once from the whitelists
+
+    Every call binds parameters into the same strings, so each connection's
+    statement cache prepares them once; a counter that is not bumped is
+    simply added 0.
+    """
+    return {
+        'upsert_region': '''
+            INSERT INTO regional_stats (region_key, country, region)
+            VALUES (?, ?, ?)
+            ON CONFLICT(region_key) DO UPDATE SET last_updated = CURRENT_TIMESTAMP
+        ''',
+        'insert_regional_player': '''
+            INSERT OR IGNORE INTO regional_players (region_key, player_name)
+            VALUES (?, ?)
+        ''',
+        # Strictly better only, so a tie keeps the older entry
+        'upsert_player_best': f'''
+            INSERT INTO player_best (player_name, entry_id, score, xp, victory_type, health, date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            {PLAYER_BEST_CONFLICT}
+        ''',
+        'upsert_player_best_range': f'''
+            INSERT INTO player_best (player_name, entry_id, score, xp, victory_type, health, date)
+            SELECT player_name, id, COALESCE(score, 0), COALESCE(xp, 0), victory_type, health, date
+            FROM leaderboard
+            WHERE id > ? AND id <= ? AND player_name IS NOT NULL
+            ORDER BY id
+            {PLAYER_BEST_CONFLICT}
+        ''',
+        'upsert_player_outcome_best': f'''
+            INSERT INTO player_outcome_best (player_name, victory_type, entry_id, score, xp, health, date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            {PLAYER_OUTCOME_BEST_CONFLICT}
+        ''',
+        'upsert_player_outcome_best_range': f'''
+            INSERT INTO player_outcome_best (player_name, victory_type, entry_id, score, xp, health, date)
+            SELECT player_name, victory_type, id, score, xp, health, date
+            FROM leaderboard
+            WHERE id > ? AND id <= ? AND player_name IS NOT NULL AND victory_type IS NOT NULL
+            ORDER BY id
+            {PLAYER_OUTCOME_BEST_CONFLICT}
+        ''',
+        'get_leaderboard': '''
+            SELECT player_name, score, xp, victory_type, health, date
+            FROM player_best
+            ORDER BY xp DESC, score DESC, entry_id
+            LIMIT ?
+        ''',
+        'get_regional_stats': '''
+            SELECT * FROM regional_stats WHERE region_key = ?
+        ''',
+        'get_player_session_stats': '''
+            SELECT * FROM player_session_stats 
+            WHERE player_name = ? AND session_id = ?
+        ''',
+        'insert_player_session': '''
+            INSERT OR IGNORE INTO player_session_stats (player_name, session_id)
+            VALUES (?, ?)
+        ''',
+        'update_player_session_stats': f'''
+            UPDATE player_session_stats 
+            SET {', '.join(f"{column} = {column} + ?" for column in SESSION_STAT_COUNTERS)},
+                combat_style = COALESCE(?, combat_style),
+                last_updated = CURRENT_TIMESTAMP
+            WHERE player_name = ? AND session_id = ?
+        ''',
+    }
+
+STATEMENTS = _build_statements()
+
+_connections = threading.local()
+_writer: Optional[DatabaseWriter] = None
+_writer_pid: Optional[int] = None
+_writer_lock = threading.Lock()
+
+_regional_counters: Optional[RegionalCounters] = None
+_regional_counters_pid: Optional[int] = None
+_regional_counters_lock = threading.Lock()
+
+def open_connection(check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open a new connection to DB_PATH with CONNECTION_PRAGMAS applied"""
+    conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=check_same_thread)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's pooled connection to DB_PATH
+
+    Connections are opened and configured once per thread and process; a
+    connection inherited across fork() is never reused by the child.
+    """
+    key = (os.getpid(), DB_PATH)
+    conn = getattr(_connections, 'conn', None)
+    if conn is None or _connections.key != key:
+        conn = open_connection()
+        _connections.conn = conn
+        _connections.key = key
+    return conn
+
+def close_connection() -> None:
+    """Close this thread's pooled and snapshot connections, if they belong to this process"""
+    conn = getattr(_connections, 'conn', None)
+    if conn is not None and _connections.key[0] == os.getpid():
+        conn.close()
+    _connections.conn = None
+    snapshot = getattr(_connections, 'snapshot', None)
+    if snapshot is not None and _connections.snapshot_key[0] == os.getpid():
+        snapshot.close()
+    _connections.snapshot = None
 
-def add_to_leaderboard(player_name: str, score: int, xp: int, victory_type: str, health: int):
+def get_read_connection() -> sqlite3.Connection:
+    """Return this thread's connection for reads
+
+    With DB_READ_SNAPSHOT on and a snapshot present, this is an immutable
+    read-only connection to DB_SNAPSHOT_PATH that never takes locks, reopened
+    whenever the refresher swaps in a new file; otherwise the pooled live one.
+    """
+    if not DB_READ_SNAPSHOT:
+        return get_connection()
+    try:
+        key = (os.getpid(), DB_SNAPSHOT_PATH, os.stat(DB_SNAPSHOT_PATH).st_ino)
+    except FileNotFoundError:
+        return get_connection()
+    conn = getattr(_connections, 'snapshot', None)
+    if conn is None or _connections.snapshot_key != key:
+        if conn is not None and _connections.snapshot_key[0] == os.getpid():
+            conn.close()
+        conn = sqlite3.connect(f"file:{DB_SNAPSHOT_PATH}?mode=ro&immutable=1", uri=True)
+        for pragma in SNAPSHOT_PRAGMAS:
+            conn.execute(pragma)
+        _connections.snapshot = conn
+        _connections.snapshot_key = key
+    return conn
+
+def snapshot_is_stale(max_age: float = DB_SNAPSHOT_INTERVAL) -> bool:
+    """True if the snapshot is missing, or older than max_age and behind the live database
+
+    Compares modification times so any worker's refresh counts; an idle
+    database is not copied again.
+    """
+    try:
+        taken_at = os.stat(DB_SNAPSHOT_PATH).st_mtime
+    except FileNotFoundError:
+        return True
+    if time.time() - taken_at < max_age:
+        return False
+    changed_at = max((os.stat(path).st_mtime for path in (DB_PATH, f"{DB_PATH}-wal")
+                      if os.path.exists(path)), default=0)
+    return changed_at >= taken_at
+
+def refresh_snapshot() -> None:
+    """Copy the live database into a new snapshot file and swap it in atomically
+
+    Readers holding the previous file keep reading it until they notice the
+    swap, so the snapshot file is never modified while it is open.
+    """
+    taken_at = time.time()
+    temp_path = f"{DB_SNAPSHOT_PATH}.tmp-{os.getpid()}"
+    snapshot = sqlite3.connect(temp_path)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO leaderboard (player_name, score, xp, victory_type, health)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (player_name, score, xp, victory_type, health))
-        conn.commit()
+        get_connection().backup(snapshot)
+        snapshot.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        snapshot.close()
+    os.utime(temp_path, (taken_at, taken_at))
+    os.replace(temp_path, DB_SNAPSHOT_PATH)
+
+def start_snapshot_refresher(interval: float = DB_SNAPSHOT_INTERVAL) -> threading.Thread:
+    """Keep the read snapshot about interval seconds behind at most, from a daemon thread"""
+    def refresh_forever():
+        while True:
+            try:
+                if snapshot_is_stale(interval):
+                    refresh_snapshot()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Database snapshot refresh failed: {e}")
+            time.sleep(interval / 10)
+
+    refresher = threading.Thread(target=refresh_forever, name='db-snapshot-refresher', daemon=True)
+    refresher.start()
+    return refresher
+
+leaderboard_cache = LeaderboardCache(lambda: open_connection(check_same_thread=False),
+                                     LEADERBOARD_CACHE_SIZE)
+rank_index = RankIndex(lambda: open_connection(check_same_thread=False))
+
+def forget_rolled_back() -> None:
+    """Drop what this process remembers about writes that were just rolled back"""
+    leaderboard_boards.invalidate()
+    regional_metrics.invalidate()
+
+def get_writer() -> Optional[DatabaseWriter]:
+    """Return this process's background writer, starting it on first use
+
+    Returns None when DB_WRITE_QUEUE is disabled. A writer inherited across
+    fork() is replaced, since its thread did not survive into the child.
+    """
+    global _writer, _writer_pid
+    if not DB_WRITE_QUEUE:
+        return None
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = DatabaseWriter(open_connection, DB_WRITE_QUEUE_SIZE, DB_WRITE_BATCH_SIZE,
+                                     forget_rolled_back, DB_WRITE_TIMEOUT)
+            _writer_pid = os.getpid()
+            _writer.start()
+            atexit.register(close_writer)
+        return _writer
+
+def close_writer() -> None:
+    """Flush summed regional stats, commit queued writes and stop this process's writer"""
+    global _writer
+    close_regional_counters()
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None and _writer_pid == os.getpid():
+        writer.close()
+
+def submit_write(mutation, *args) -> Future:
+    """Run mutation(conn, *args) in a group commit, or inline if the queue is off"""
+    writer = get_writer()
+    if writer is not None:
+        return writer.submit(mutation, *args)
+    future: Future = Future()
+    conn = get_connection()
+    try:
+        with conn:
+            future.set_result(mutation(conn, *args))
     except sqlite3.Error as e:
-        print(f"Database error: {e}")
+        forget_rolled_back()
+        print(f"Database error in {mutation.__name__}: {e}")
+        future.set_exception(e)
+    except Exception:
+        forget_rolled_back()
+        raise
+    return future
+
+def init_db() -> int:
+    """Bring the schema up to date; a current database is left untouched"""
+    version = run_migrations(DB_PATH)
+    clear_column_maps()
+    return version
+
+def _insert_leaderboard_entry(conn: sqlite3.Connection, player_name: str, score: int, xp: int,
+                              victory_type: str, health: int):
+    entry_id, date = conn.execute('''
+        INSERT INTO leaderboard (player_name, score, xp, victory_type, health)
+        VALUES (?, ?, ?, ?, ?)
+        RETURNING id, date
+    ''', (player_name, score, xp, victory_type, health)).fetchone()
+    if player_name is not None:
+        conn.execute(STATEMENTS['upsert_player_best'],
+                     (player_name, entry_id, score, xp, victory_type, health, date))
+        if victory_type is not None:
+            conn.execute(STATEMENTS['upsert_player_outcome_best'],
+                         (player_name, victory_type, entry_id, score, xp, health, date))
+    leaderboard_boards.rank_on_boards(
+        conn, [(entry_id, player_name, score, xp, victory_type, health, date)], LEADERBOARD_BOARD_SIZE)
+
+def add_to_leaderboard(player_name: str, score: int, xp: int, victory_type: str, health: int) -> Future:
+    return submit_write(_insert_leaderboard_entry, player_name, score, xp, victory_type, health)
+
+def insert_many(sql: str, rows: Iterable[Sequence], chunk_size: int = DB_BULK_CHUNK_SIZE) -> int:
+    """Stream rows through executemany, committing once per chunk
+
+    rows may be any iterable, including a generator or a cursor over another
+    database; only one chunk is held in memory. Returns the number of rows
+    written. A failing chunk is rolled back and the error raised; chunks
+    committed before it are kept.
+    """
+    conn = get_connection()
+    rows = iter(rows)
+    written = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return written
+        with conn:
+            written += conn.executemany(sql, chunk).rowcount
+
+def _import_int(name: str, value, default: Optional[int]) -> Optional[int]:
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r}")
+
+def _import_date(value) -> Optional[str]:
+    """A date as CURRENT_TIMESTAMP writes it, in UTC; None takes the insert time"""
+    if value is None or value == '':
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f"Invalid date: {value!r}")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def _leaderboard_row(row: Sequence) -> tuple:
+    """Normalize a bulk row: missing score and xp count as 0, dates must parse
+
+    Raises ValueError for a non-integer score, xp or health or an unreadable
+    date, so every reader can rely on what the game itself writes.
+    """
+    player_name, score, xp, victory_type, health, date = (tuple(row) + (None,))[:6]
+    return (player_name, _import_int('score', score, 0), _import_int('xp', xp, 0), victory_type,
+            _import_int('health', health, None), _import_date(date))
+
+def add_to_leaderboard_many(entries: Iterable[Sequence], chunk_size: int = DB_BULK_CHUNK_SIZE) -> int:
+    """Bulk insert (player_name, score, xp, victory_type, health[, date]) rows
+
+    Rows are normalized by _leaderboard_row; a row it rejects stops the
+    import with ValueError, keeping the chunks before it. The new rows are
+    then ranked on the leaderboard boards and personal bests, chunk_size
+    rows per transaction, read back by id so the entries themselves are
+    never held in memory.
+    """
+    conn = get_connection()
+    first_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM leaderboard').fetchone()[0]
+    try:
+        return insert_many('''
+            INSERT INTO leaderboard (player_name, score, xp, victory_type, health, date)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', map(_leaderboard_row, entries), chunk_size)
     finally:
-        conn.close()
+        # Chunks committed before a rejected row are ranked all the same
+        rank_new_entries(first_id, chunk_size)
+
+def rank_new_entries(after_id: int = 0, chunk_size: int = DB_BULK_CHUNK_SIZE) -> None:
+    """Rank leaderboard rows with ids past after_id on the boards and personal bests
+
+    0 re-ranks the whole history.
+    """
+    conn = get_connection()
+    while True:
+        try:
+            with conn:
+                rows = conn.execute('''
+                    SELECT id, player_name, score, xp, victory_type, health, date
+                    FROM leaderboard
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (after_id, chunk_size)).fetchall()
+                if not rows:
+                    return
+                conn.execute(STATEMENTS['upsert_player_best_range'], (after_id, rows[-1][0]))
+                conn.execute(STATEMENTS['upsert_player_outcome_best_range'], (after_id, rows[-1][0]))
+                leaderboard_boards.rank_on_boards(conn, rows, LEADERBOARD_BOARD_SIZE)
+        except Exception:
+            forget_rolled_back()
+            raise
+        after_id = rows[-1][0]
+
+def get_leaderboard_version() -> Optional[int]:
+    """Version of the cached leaderboard, or None when the cache is off"""
+    if not LEADERBOARD_CACHE_SIZE:
+        return None
+    try:
+        return leaderboard_cache.version()
+    except sqlite3.Error as e:
+        print(f"Database error in get_leaderboard_version: {e}")
+        return None
+
+LEADERBOARD_PAGE_COLUMNS = ('id', 'player_name', 'score', 'xp', 'victory_type', 'health', 'date')
+
+def get_leaderboard_page(limit: int, after: Optional[tuple] = None, victory_type: Optional[str] = None,
+                         since: Optional[str] = None, until: Optional[str] = None) -> sqlite3.Cursor:
+    """Cursor over players' personal bests ranked like /leaderboard: xp DESC, score DESC, oldest first
+
+    Each player's best is taken among their entries that pass the filters:
+    of one outcome, as on the per-outcome boards, and dated from since
+    (inclusive) to until (exclusive). id is the leaderboard id of the best
+    entry. after is the (xp, score, id) key of the last row already seen.
+    Unfiltered and outcome pages seek past it in player_best or
+    player_outcome_best, so every page costs the same as the first; a date
+    window has no stored bests, so its entries are ranked per player on
+    each page. Rows come back as LEADERBOARD_PAGE_COLUMNS tuples.
+    Conditions are fixed fragments, so there are at most 16 distinct
+    statements to prepare.
+    """
+    filters, params = [], []
+    if victory_type is not None:
+        filters.append('victory_type = ?')
+        params.append(victory_type)
+    if since is not None:
+        filters.append('date >= ?')
+        params.append(since)
+    if until is not None:
+        filters.append('date < ?')
+        params.append(until)
+    if since is None and until is None:
+        source = 'player_best' if victory_type is None else 'player_outcome_best'
+        conditions = filters
+    else:
+        source = f'''(
+            SELECT id AS entry_id, player_name, score, xp, victory_type, health, date,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY player_name ORDER BY xp DESC, score DESC, id) AS position
+            FROM leaderboard
+            WHERE player_name IS NOT NULL AND {' AND '.join(filters)})'''
+        conditions = ['position = 1']
+    if after is not None:
+        # Oldest first on ties, so the id runs the other way to xp and score
+        conditions.append('(xp, score) <= (?, ?) AND ((xp, score) < (?, ?) OR entry_id > ?)')
+        xp, score, entry_id = after
+        params.extend((xp, score, xp, score, entry_id))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return get_read_connection().execute(f'''
+        SELECT entry_id AS id, player_name, score, xp, victory_type, health, date
+        FROM {source}
+        {where}
+        ORDER BY xp DESC, score DESC, entry_id
+        LIMIT ?
+    ''', (*params, limit))
 
 def get_leaderboard(limit: int = 10) -> List[LeaderboardEntry]:
+    if limit <= LEADERBOARD_CACHE_SIZE:
+        try:
+            return leaderboard_cache.top(limit)
+        except sqlite3.Error as e:
+            print(f"Leaderboard cache unavailable, querying directly: {e}")
     entries = []
+    conn = get_read_connection()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            SELECT player_name, score, xp, victory_type, health, date
-            FROM leaderboard
-            ORDER BY xp DESC, score DESC
-            LIMIT ?
-        ''', (limit,))
-        entries = [LeaderboardEntry(name, score, xp, victory_type, health, datetime.fromisoformat(date))
-                  for name, score, xp, victory_type, health, date in c.fetchall()]
+        entries = decode_leaderboard(conn.execute(STATEMENTS['get_leaderboard'], (limit,)).fetchall())
     except sqlite3.Error as e:
         print(f"Database error in get_leaderboard: {e}")
-    finally:
-        conn.close()
     return entries
 
-def create_magic_link(email: str) -> str:
-    """Create a magic link token for email authentication"""
-    token = secrets.token_urlsafe(32)
-    expiry = datetime.now().timestamp() + 3600  # 1 hour expiry
-    
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
+def get_leaderboard_board(span: str = 'all', victory_type: Optional[str] = None, limit: int = 10,
+                          previous: bool = False) -> List[LeaderboardEntry]:
+    """Best entry per player of the current (or previous) day, ISO week or all time, optionally of one outcome
+
+    Boards are maintained as entries are added, so this reads at most
+    limit rows however long the history is. limit is capped at
+    LEADERBOARD_BOARD_SIZE. Boards are read from the live database even
+    with DB_READ_SNAPSHOT on, since /leaderboard caches them under
+    get_leaderboard_version(), which follows the live database.
+    """
+    if span not in leaderboard_boards.SPANS:
+        raise ValueError(f"Unknown leaderboard span: {span}")
+    periods = leaderboard_boards.previous_periods() if previous else leaderboard_boards.current_periods()
+    entries = []
+    try:
+        entries = decode_leaderboard(leaderboard_boards.read_board(
+            get_connection(), span, periods[span], victory_type or leaderboard_boards.ALL_OUTCOMES,
+            min(limit, LEADERBOARD_BOARD_SIZE)))
+    except sqlite3.Error as e:
+        print(f"Database error in get_leaderboard_board: {e}")
+    return entries
+
+def get_leaderboard_rank(xp: int, score: int) -> Optional[dict]:
+    """Rank an (xp, score) would take among players' bests, ties sharing a rank, and the player count"""
+    try:
+        if LEADERBOARD_RANK_INDEX:
+            return {'rank': rank_index.rank_of(xp, score), 'total': rank_index.count()}
+        conn = get_read_connection()
+        above, total = conn.execute('''
+            SELECT (SELECT COUNT(*) FROM player_best WHERE (xp, score) > (?, ?)),
+                   (SELECT COUNT(*) FROM player_best)
+        ''', (xp, score)).fetchone()
+        return {'rank': above + 1, 'total': total}
+    except sqlite3.Error as e:
+        print(f"Database error in get_leaderboard_rank: {e}")
+        return None
+
+def _store_magic_link(conn: sqlite3.Connection, email: str, token: str, expiry: float):
     # Create or update user
-    c.execute('''
+    conn.execute('''
         INSERT INTO users (email, magic_link_token, magic_link_expiry)
         VALUES (?, ?, ?)
         ON CONFLICT(email) DO UPDATE SET
             magic_link_token = excluded.magic_link_token,
             magic_link_expiry = excluded.magic_link_expiry
     ''', (email, token, expiry))
+
+def create_magic_link(email: str) -> str:
+    """Create a magic link token for email authentication"""
+    token = secrets.token_urlsafe(32)
+    expiry = datetime.now().timestamp() + 3600  # 1 hour expiry
     
-    conn.commit()
-    conn.close()
-    
+    # Wait for the commit so the link is never sent before it can be verified
+    submit_write(_store_magic_link, email, token, expiry).result(DB_WRITE_TIMEOUT)
     return token
 
-def verify_magic_link(token: str) -> tuple[bool, str]:
-    """Verify a magic link token and return (success, email)"""
-    conn = sqlite3.connect(DB_PATH)
+def _consume_magic_link(conn: sqlite3.Connection, token: str) -> tuple[bool, str]:
     c = conn.cursor()
-    
     c.execute('''
         SELECT email, magic_link_expiry 
         FROM users 
@@ -188,17 +618,14 @@ def verify_magic_link(token: str) -> tuple[bool, str]:
         WHERE email = ?
     ''', (email,))
     
-    conn.commit()
-    conn.close()
-    
     return True, email
 
-def update_user_stats(email: str, score: int, xp: int):
-    """Update user's stats after a game"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    c.execute('''
+def verify_magic_link(token: str) -> tuple[bool, str]:
+    """Verify a magic link token and return (success, email)"""
+    return submit_write(_consume_magic_link, token).result(DB_WRITE_TIMEOUT)
+
+def _record_user_game(conn: sqlite3.Connection, email: str, score: int, xp: int):
+    conn.execute('''
         UPDATE users 
         SET last_played_at = CURRENT_TIMESTAMP,
             total_games = total_games + 1,
@@ -206,152 +633,188 @@ def update_user_stats(email: str, score: int, xp: int):
             best_xp = MAX(best_xp, ?)
         WHERE email = ?
     ''', (score, xp, email))
-    
-    conn.commit()
-    conn.close()
+
+def update_user_stats(email: str, score: int, xp: int) -> Future:
+    """Update user's stats after a game"""
+    return submit_write(_record_user_game, email, score, xp)
+
+def _regional_increments(combat_style: Optional[str], action: Optional[str]) -> Dict[str, int]:
+    """REGIONAL_METRICS increments for one update"""
+    if combat_style and combat_style not in REGIONAL_COMBAT_STYLES:
+        raise ValueError(f"Unknown combat style: {combat_style}")
+    if action and action not in REGIONAL_ACTIONS:
+        raise ValueError(f"Unknown action: {action}")
+    increments = {'total_games': 1}
+    if combat_style:
+        increments[f"combat_style_{combat_style}"] = 1
+    if action:
+        increments[f"action_{action}"] = 1
+    return increments
+
+def _apply_regional_stats(conn: sqlite3.Connection, region_key: str, country: str, region: str,
+                          player_name: str, combat_style: Optional[str], action: Optional[str]):
+    increments = _regional_increments(combat_style, action)
+    conn.execute(STATEMENTS['upsert_region'], (region_key, country, region))
+    # A player counts towards total_players the first time they post for the region
+    if player_name:
+        increments['total_players'] = conn.execute(STATEMENTS['insert_regional_player'],
+                                                   (region_key, player_name)).rowcount
+    regional_metrics.compact(conn, REGIONAL_HOURLY_RETENTION)
+    regional_metrics.increment(conn, [(region_key, metric, count) for metric, count in increments.items()])
+
+def _apply_regional_counters(conn: sqlite3.Connection, pending: Dict[str, PendingRegion]):
+    counts = []
+    for region_key, summed in pending.items():
+        conn.execute(STATEMENTS['upsert_region'], (region_key, summed.country, summed.region))
+        counts.extend((region_key, metric, count) for metric, count in summed.counts.items())
+        if summed.players:
+            counts.append((region_key, 'total_players', conn.executemany(
+                STATEMENTS['insert_regional_player'], [(region_key, player) for player in summed.players]).rowcount))
+    regional_metrics.compact(conn, REGIONAL_HOURLY_RETENTION)
+    regional_metrics.increment(conn, counts)
+
+def flush_regional_counters(counters: RegionalCounters) -> None:
+    """Write everything counters has summed as one mutation, one upsert per region and metric
+
+    If the write fails the increments go back into counters for the next flush.
+    """
+    pending, flushed = counters.drain()
+    if not pending:
+        return
+
+    def resolve(written: Future) -> None:
+        if written.exception() is not None:
+            counters.restore(pending, flushed)
+        else:
+            flushed.set_result(None)
+
+    submit_write(_apply_regional_counters, pending).add_done_callback(resolve)
+
+def get_regional_counters() -> Optional[RegionalCounters]:
+    """Return this process's regional stats aggregator, starting it on first use
+
+    Returns None when REGIONAL_STATS_FLUSH_INTERVAL is 0. As with the
+    writer, one inherited across fork() is replaced.
+    """
+    global _regional_counters, _regional_counters_pid
+    if not REGIONAL_STATS_FLUSH_INTERVAL:
+        return None
+    with _regional_counters_lock:
+        if _regional_counters is None or _regional_counters_pid != os.getpid():
+            _regional_counters = RegionalCounters(flush_regional_counters, REGIONAL_STATS_FLUSH_INTERVAL)
+            _regional_counters_pid = os.getpid()
+            _regional_counters.start()
+            atexit.register(close_regional_counters)
+        return _regional_counters
+
+def close_regional_counters() -> None:
+    """Flush this process's summed regional stats and stop its flush thread"""
+    global _regional_counters
+    with _regional_counters_lock:
+        counters, _regional_counters = _regional_counters, None
+    if counters is not None and _regional_counters_pid == os.getpid():
+        counters.close()
 
 def update_regional_stats(region_key: str, country: str, region: str, player_name: str, 
-                         combat_style: Optional[str] = None, action: Optional[str] = None):
-    """Update regional statistics"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    try:
-        # First, try to insert a new region if it doesn't exist
-        c.execute('''
-            INSERT OR IGNORE INTO regional_stats (region_key, country, region)
-            VALUES (?, ?, ?)
-        ''', (region_key, country, region))
-        
-        # Update combat style if provided
-        if combat_style:
-            c.execute(f'''
-                UPDATE regional_stats 
-                SET combat_style_{combat_style} = combat_style_{combat_style} + 1,
-                    last_updated = CURRENT_TIMESTAMP
-                WHERE region_key = ?
-            ''', (region_key,))
-        
-        # Update action count if provided
-        if action:
-            c.execute(f'''
-                UPDATE regional_stats 
-                SET action_{action} = action_{action} + 1,
-                    last_updated = CURRENT_TIMESTAMP
-                WHERE region_key = ?
-            ''', (region_key,))
-        
-        # Update total games and players
-        c.execute('''
-            UPDATE regional_stats 
-            SET total_games = total_games + 1,
-                total_players = (
-                    SELECT COUNT(DISTINCT player_name) 
-                    FROM leaderboard 
-                    WHERE player_name LIKE ?
-                ),
-                last_updated = CURRENT_TIMESTAMP
-            WHERE region_key = ?
-        ''', (f"%{player_name}%", region_key))
-        
-        conn.commit()
-    except sqlite3.Error as e:
-        print(f"Database error in update_regional_stats: {e}")
-    finally:
-        conn.close()
+                         combat_style: Optional[str] = None, action: Optional[str] = None) -> Future:
+    """Update regional statistics
+
+    Raises ValueError for an unknown combat style or action. Unless
+    REGIONAL_STATS_FLUSH_INTERVAL is 0 the update is only summed in process,
+    and the future resolves when the flush that writes it commits.
+    """
+    increments = _regional_increments(combat_style, action)
+    counters = get_regional_counters()
+    if counters is None:
+        return submit_write(_apply_regional_stats, region_key, country, region, player_name,
+                            combat_style, action)
+    return counters.add(region_key, country, region, player_name, increments)
 
 def get_regional_stats(region_key: str) -> dict:
-    """Get regional statistics"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    """Get regional statistics: the region's row and the running total of every REGIONAL_METRICS"""
+    conn = get_read_connection()
     
     try:
-        c.execute('''
-            SELECT * FROM regional_stats WHERE region_key = ?
-        ''', (region_key,))
-        row = c.fetchone()
-        if row:
-            columns = [description[0] for description in c.description]
-            return dict(zip(columns, row))
-        return None
+        stats = fetch_dict(conn, STATEMENTS['get_regional_stats'], (region_key,))
+        if stats is not None:
+            totals = regional_metrics.read_totals(conn, region_key)
+            stats.update((metric, totals.get(metric, 0)) for metric in REGIONAL_METRICS)
+        return stats
     except sqlite3.Error as e:
         print(f"Database error in get_regional_stats: {e}")
         return None
-    finally:
-        conn.close()
 
-def update_player_achievement(player_name: str, achievement: str):
-    """Record a player achievement"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
+def get_regional_series(region_key: str, granularity: str = 'day', buckets: int = 30) -> List[dict]:
+    """Per-hour or per-day REGIONAL_METRICS of a region over the last `buckets` buckets
+
+    Reads the pre-aggregated buckets only, one dict per bucket that counted
+    anything, oldest first. Hours older than REGIONAL_HOURLY_RETENTION have
+    been rolled into days and are missing from hourly series.
+    """
+    if granularity not in regional_metrics.GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    series: Dict[str, dict] = {}
     try:
-        c.execute('''
-            INSERT OR IGNORE INTO player_achievements (player_name, achievement)
-            VALUES (?, ?)
-        ''', (player_name, achievement))
-        conn.commit()
+        rows = regional_metrics.read_series(get_read_connection(), region_key, granularity,
+                                            regional_metrics.first_bucket(granularity, buckets))
     except sqlite3.Error as e:
-        print(f"Database error in update_player_achievement: {e}")
-    finally:
-        conn.close()
+        print(f"Database error in get_regional_series: {e}")
+        return []
+    for bucket, metric, count in rows:
+        if metric in REGIONAL_METRICS:
+            if bucket not in series:
+                series[bucket] = {'bucket': bucket, **dict.fromkeys(REGIONAL_METRICS, 0)}
+            series[bucket][metric] = count
+    return list(series.values())
+
+def _insert_player_achievement(conn: sqlite3.Connection, player_name: str, achievement: str):
+    conn.execute('''
+        INSERT OR IGNORE INTO player_achievements (player_name, achievement)
+        VALUES (?, ?)
+    ''', (player_name, achievement))
+
+def update_player_achievement(player_name: str, achievement: str) -> Future:
+    """Record a player achievement"""
+    return submit_write(_insert_player_achievement, player_name, achievement)
 
-def update_player_session_stats(player_name: str, session_id: str, stats_update: dict):
+def record_achievements_many(achievements: Iterable[Sequence], chunk_size: int = DB_BULK_CHUNK_SIZE) -> int:
+    """Bulk record (player_name, achievement) rows, skipping ones already held"""
+    return insert_many('''
+        INSERT OR IGNORE INTO player_achievements (player_name, achievement)
+        VALUES (?, ?)
+    ''', achievements, chunk_size)
+
+def _apply_player_session_stats(conn: sqlite3.Connection, player_name: str, session_id: str,
+                                stats_update: dict):
+    conn.execute(STATEMENTS['insert_player_session'], (player_name, session_id))
+    increments = [stats_update.get(column, 0) for column in SESSION_STAT_COUNTERS]
+    if any(increments) or stats_update.get('combat_style') is not None:
+        conn.execute(STATEMENTS['update_player_session_stats'],
+                     [*increments, stats_update.get('combat_style'), player_name, session_id])
+
+def update_player_session_stats(player_name: str, session_id: str, stats_update: dict) -> Future:
     """Update player session statistics"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    try:
-        # First, try to insert a new session if it doesn't exist
-        c.execute('''
-            INSERT OR IGNORE INTO player_session_stats (player_name, session_id)
-            VALUES (?, ?)
-        ''', (player_name, session_id))
-        
-        # Build the update query dynamically based on provided stats
-        update_fields = []
-        update_values = []
-        for key, value in stats_update.items():
-            if key in ['games_played', 'total_score', 'total_xp', 'best_score', 'best_xp', 
-                      'turn_count', 'treasures_found', 'treasure_attempts']:
-                update_fields.append(f"{key} = {key} + ?")
-                update_values.append(value)
-            elif key in ['combat_style']:
-                update_fields.append(f"{key} = ?")
-                update_values.append(value)
-        
-        if update_fields:
-            update_fields.append("last_updated = CURRENT_TIMESTAMP")
-            query = f'''
-                UPDATE player_session_stats 
-                SET {', '.join(update_fields)}
-                WHERE player_name = ? AND session_id = ?
-            '''
-            c.execute(query, update_values + [player_name, session_id])
-            
-        conn.commit()
-    except sqlite3.Error as e:
-        print(f"Database error in update_player_session_stats: {e}")
-    finally:
-        conn.close()
+    return submit_write(_apply_player_session_stats, player_name, session_id, dict(stats_update))
+
+def add_player_session_stats_many(rows: Iterable[Sequence], chunk_size: int = DB_BULK_CHUNK_SIZE) -> int:
+    """Bulk insert rows ordered as SESSION_STATS_IMPORT_COLUMNS
+
+    Missing counters default to 0; sessions that already exist are skipped.
+    """
+    return insert_many('''
+        INSERT OR IGNORE INTO player_session_stats
+            (player_name, session_id, games_played, total_score, total_xp, best_score, best_xp,
+             turn_count, treasures_found, treasure_attempts, combat_style)
+        VALUES (?, ?, COALESCE(?, 0), COALESCE(?, 0), COALESCE(?, 0), COALESCE(?, 0), COALESCE(?, 0),
+                COALESCE(?, 0), COALESCE(?, 0), COALESCE(?, 0), COALESCE(?, 'balanced'))
+    ''', rows, chunk_size)
 
 def get_player_session_stats(player_name: str, session_id: str) -> dict:
     """Get player session statistics"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    conn = get_read_connection()
     
     try:
-        c.execute('''
-            SELECT * FROM player_session_stats 
-            WHERE player_name = ? AND session_id = ?
-        ''', (player_name, session_id))
-        row = c.fetchone()
-        if row:
-            columns = [description[0] for description in c.description]
-            return dict(zip(columns, row))
-        return None
+        return fetch_dict(conn, STATEMENTS['get_player_session_stats'], (player_name, session_id))
     except sqlite3.Error as e:
         print(f"Database error in get_player_session_stats: {e}")
         return None
-    finally:
-        conn.close()
\ No newline at end of file
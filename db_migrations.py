@@ -0,0 +1,420 @@
+import sqlite3
+import time
+from typing import List, Tuple
+
+# Ordered schema migrations: (user_version, description, statements).
+# Append new steps with the next version number; never edit released ones.
+MIGRATIONS: List[Tuple[int, str, Tuple[str, ...]]] = [
+    (1, 'Initial schema', (
+        # Create leaderboard table
+        '''
+            CREATE TABLE IF NOT EXISTS leaderboard
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             player_name TEXT,
+             score INTEGER,
+             xp INTEGER,
+             victory_type TEXT,
+             health INTEGER,
+             date TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+        ''',
+        # Create users table with magic link authentication
+        '''
+            CREATE TABLE IF NOT EXISTS users
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             email TEXT UNIQUE,
+             display_name TEXT,
+             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+             last_played_at TIMESTAMP,
+             total_games INTEGER DEFAULT 0,
+             best_score INTEGER DEFAULT 0,
+             best_xp INTEGER DEFAULT 0,
+             magic_link_token TEXT,
+             magic_link_expiry TIMESTAMP)
+        ''',
+        # Create regional stats table
+        '''
+            CREATE TABLE IF NOT EXISTS regional_stats
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             region_key TEXT UNIQUE,
+             country TEXT,
+             region TEXT,
+             total_games INTEGER DEFAULT 0,
+             total_players INTEGER DEFAULT 0,
+             combat_style_brave INTEGER DEFAULT 0,
+             combat_style_cautious INTEGER DEFAULT 0,
+             combat_style_balanced INTEGER DEFAULT 0,
+             action_fight INTEGER DEFAULT 0,
+             action_run INTEGER DEFAULT 0,
+             action_rest INTEGER DEFAULT 0,
+             action_search_alone INTEGER DEFAULT 0,
+             action_get_help INTEGER DEFAULT 0,
+             last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+        ''',
+        # Create player achievements table
+        '''
+            CREATE TABLE IF NOT EXISTS player_achievements
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             player_name TEXT,
+             achievement TEXT,
+             achieved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+             UNIQUE(player_name, achievement))
+        ''',
+        # Create player session stats table
+        '''
+            CREATE TABLE IF NOT EXISTS player_session_stats
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             player_name TEXT,
+             session_id TEXT UNIQUE,
+             first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+             games_played INTEGER DEFAULT 0,
+             total_score INTEGER DEFAULT 0,
+             total_xp INTEGER DEFAULT 0,
+             best_score INTEGER DEFAULT 0,
+             best_xp INTEGER DEFAULT 0,
+             turn_count INTEGER DEFAULT 0,
+             treasures_found INTEGER DEFAULT 0,
+             treasure_attempts INTEGER DEFAULT 0,
+             combat_style TEXT DEFAULT 'balanced',
+             last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+        '''
+    )),
+    (2, 'Covering indexes for leaderboard and magic link lookups', (
+        # Top-N leaderboard reads walk this index in order instead of sorting
+        '''
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_rank
+            ON leaderboard (xp DESC, score DESC, player_name, victory_type, health, date)
+        ''',
+        # Only outstanding tokens are indexed
+        '''
+            CREATE INDEX IF NOT EXISTS idx_users_magic_link_token
+            ON users (magic_link_token, email, magic_link_expiry)
+            WHERE magic_link_token IS NOT NULL
+        ''',
+    )),
+    (3, 'Keyset pagination indexes for the leaderboard API', (
+        # Rank order with id as the final tiebreaker; also serves the top-N reads
+        '''
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_page
+            ON leaderboard (xp DESC, score DESC, id DESC, player_name, victory_type, health, date)
+        ''',
+        'DROP INDEX IF EXISTS idx_leaderboard_rank',
+        # Pages filtered to one outcome
+        '''
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_victory_page
+            ON leaderboard (victory_type, xp DESC, score DESC, id DESC)
+        ''',
+    )),
+    (4, 'Daily, weekly and all-time leaderboard boards', (
+        # Best rows per (span, period, outcome), kept in rank order by the key itself
+        '''
+            CREATE TABLE IF NOT EXISTS leaderboard_boards
+            (span TEXT NOT NULL,
+             period TEXT NOT NULL,
+             outcome TEXT NOT NULL,
+             xp INTEGER NOT NULL,
+             score INTEGER NOT NULL,
+             entry_id INTEGER NOT NULL,
+             player_name TEXT,
+             victory_type TEXT,
+             health INTEGER,
+             date TIMESTAMP,
+             PRIMARY KEY (span, period, outcome, xp DESC, score DESC, entry_id))
+            WITHOUT ROWID
+        ''',
+        # Existing history goes on the all-time boards; day and week boards fill from new entries
+        '''
+            INSERT INTO leaderboard_boards
+                (span, period, outcome, xp, score, entry_id, player_name, victory_type, health, date)
+            SELECT 'all', '', '*', COALESCE(xp, 0), COALESCE(score, 0), id,
+                   player_name, victory_type, health, date
+            FROM leaderboard
+            ORDER BY xp DESC, score DESC, id
+            LIMIT 100
+        ''',
+        '''
+            INSERT INTO leaderboard_boards
+                (span, period, outcome, xp, score, entry_id, player_name, victory_type, health, date)
+            SELECT 'all', '', victory_type, COALESCE(xp, 0), COALESCE(score, 0), id,
+                   player_name, victory_type, health, date
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY victory_type ORDER BY xp DESC, score DESC, id) AS position
+                FROM leaderboard
+                WHERE victory_type IS NOT NULL)
+            WHERE position <= 100
+        ''',
+    )),
+    (5, 'Personal bests for the ranking views', (
+        # One row per player: the leaderboard entry with their best (xp, score)
+        '''
+            CREATE TABLE IF NOT EXISTS player_best
+            (player_name TEXT PRIMARY KEY,
+             entry_id INTEGER NOT NULL,
+             score INTEGER NOT NULL,
+             xp INTEGER NOT NULL,
+             victory_type TEXT,
+             health INTEGER,
+             date TIMESTAMP)
+        ''',
+        '''
+            INSERT INTO player_best (player_name, entry_id, score, xp, victory_type, health, date)
+            SELECT player_name, id, COALESCE(score, 0), COALESCE(xp, 0), victory_type, health, date
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY player_name ORDER BY xp DESC, score DESC, id) AS position
+                FROM leaderboard
+                WHERE player_name IS NOT NULL)
+            WHERE position = 1
+        ''',
+        # Top-N reads walk this index in order
+        '''
+            CREATE INDEX IF NOT EXISTS idx_player_best_rank
+            ON player_best (xp DESC, score DESC, entry_id, player_name, victory_type, health, date)
+        ''',
+        # Bests changed since a given entry, for the in-process leaderboard cache
+        '''
+            CREATE INDEX IF NOT EXISTS idx_player_best_entry
+            ON player_best (entry_id)
+        ''',
+    )),
+    (6, 'Distinct players per region', (
+        '''
+            CREATE TABLE IF NOT EXISTS regional_players
+            (region_key TEXT NOT NULL,
+             player_name TEXT NOT NULL,
+             PRIMARY KEY (region_key, player_name))
+            WITHOUT ROWID
+        ''',
+        # The column held the leaderboard LIKE match count for the last player
+        # to post, not a count for the region; it restarts from membership
+        'UPDATE regional_stats SET total_players = 0',
+    )),
+    (7, 'Normalized regional counters', (
+        # One row per region, bucket and metric; a metric is any name in
+        # database.REGIONAL_METRICS, so new actions need no column
+        '''
+            CREATE TABLE IF NOT EXISTS regional_counters
+            (region_key TEXT NOT NULL,
+             metric TEXT NOT NULL,
+             bucket TEXT NOT NULL,
+             count INTEGER NOT NULL DEFAULT 0,
+             PRIMARY KEY (region_key, bucket, metric))
+            WITHOUT ROWID
+        ''',
+        # Hourly buckets awaiting their rollup into days
+        '''
+            CREATE INDEX IF NOT EXISTS idx_regional_counters_hourly
+            ON regional_counters (bucket)
+            WHERE length(bucket) = 13
+        ''',
+        # The wide columns become running totals; they have no history to bucket
+        '''
+            INSERT INTO regional_counters (region_key, metric, bucket, count)
+            SELECT region_key, metric, 'all', count
+            FROM (
+                SELECT region_key, 'total_games' AS metric, total_games AS count FROM regional_stats
+                UNION ALL SELECT region_key, 'total_players', total_players FROM regional_stats
+                UNION ALL SELECT region_key, 'combat_style_brave', combat_style_brave FROM regional_stats
+                UNION ALL SELECT region_key, 'combat_style_cautious', combat_style_cautious FROM regional_stats
+                UNION ALL SELECT region_key, 'combat_style_balanced', combat_style_balanced FROM regional_stats
+                UNION ALL SELECT region_key, 'action_fight', action_fight FROM regional_stats
+                UNION ALL SELECT region_key, 'action_run', action_run FROM regional_stats
+                UNION ALL SELECT region_key, 'action_rest', action_rest FROM regional_stats
+                UNION ALL SELECT region_key, 'action_search_alone', action_search_alone FROM regional_stats
+                UNION ALL SELECT region_key, 'action_get_help', action_get_help FROM regional_stats)
+            WHERE region_key IS NOT NULL AND count > 0
+        ''',
+        'ALTER TABLE regional_stats DROP COLUMN total_games',
+        'ALTER TABLE regional_stats DROP COLUMN total_players',
+        'ALTER TABLE regional_stats DROP COLUMN combat_style_brave',
+        'ALTER TABLE regional_stats DROP COLUMN combat_style_cautious',
+        'ALTER TABLE regional_stats DROP COLUMN combat_style_balanced',
+        'ALTER TABLE regional_stats DROP COLUMN action_fight',
+        'ALTER TABLE regional_stats DROP COLUMN action_run',
+        'ALTER TABLE regional_stats DROP COLUMN action_rest',
+        'ALTER TABLE regional_stats DROP COLUMN action_search_alone',
+        'ALTER TABLE regional_stats DROP COLUMN action_get_help',
+    )),
+    (8, 'Normalize bulk-imported leaderboard rows', (
+        # Imports used to keep empty cells as NULL; the game never writes them
+        '''
+            UPDATE leaderboard SET score = COALESCE(score, 0), xp = COALESCE(xp, 0)
+            WHERE score IS NULL OR xp IS NULL
+        ''',
+        # Dates went in as given; store them the way CURRENT_TIMESTAMP writes
+        # them, and drop the ones SQLite cannot read either
+        '''
+            UPDATE leaderboard SET date = datetime(date)
+            WHERE date IS NOT NULL AND date IS NOT datetime(date)
+        ''',
+        '''
+            UPDATE player_best SET date = datetime(date)
+            WHERE date IS NOT NULL AND date IS NOT datetime(date)
+        ''',
+        '''
+            UPDATE leaderboard_boards SET date = datetime(date)
+            WHERE date IS NOT NULL AND date IS NOT datetime(date)
+        ''',
+    )),
+    (9, 'NOT NULL leaderboard score and xp', (
+        # SQLite cannot add NOT NULL to a column, so the table is rebuilt;
+        # keyset cursors and row-value comparisons rely on both being set
+        '''
+            CREATE TABLE leaderboard_rebuilt
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             player_name TEXT,
+             score INTEGER NOT NULL DEFAULT 0,
+             xp INTEGER NOT NULL DEFAULT 0,
+             victory_type TEXT,
+             health INTEGER,
+             date TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+        ''',
+        '''
+            INSERT INTO leaderboard_rebuilt (id, player_name, score, xp, victory_type, health, date)
+            SELECT id, player_name, COALESCE(score, 0), COALESCE(xp, 0), victory_type, health, date
+            FROM leaderboard
+            ORDER BY id
+        ''',
+        'DROP TABLE leaderboard',
+        'ALTER TABLE leaderboard_rebuilt RENAME TO leaderboard',
+        '''
+            CREATE INDEX idx_leaderboard_page
+            ON leaderboard (xp DESC, score DESC, id DESC, player_name, victory_type, health, date)
+        ''',
+        '''
+            CREATE INDEX idx_leaderboard_victory_page
+            ON leaderboard (victory_type, xp DESC, score DESC, id DESC)
+        ''',
+    )),
+    (10, 'One row per player on every leaderboard view', (
+        # Boards now keep each player's best entry for their period and
+        # outcome, as player_best does overall; unnamed entries are not ranked
+        'DELETE FROM player_best WHERE player_name IS NULL',
+        "DELETE FROM leaderboard_boards WHERE span != 'all' AND player_name IS NULL",
+        '''
+            DELETE FROM leaderboard_boards
+            WHERE span != 'all' AND (span, period, outcome, entry_id) IN (
+                SELECT span, period, outcome, entry_id
+                FROM (
+                    SELECT span, period, outcome, entry_id, ROW_NUMBER() OVER (
+                        PARTITION BY span, period, outcome, player_name
+                        ORDER BY xp DESC, score DESC, entry_id) AS position
+                    FROM leaderboard_boards
+                    WHERE span != 'all')
+                WHERE position > 1)
+        ''',
+        # All-time boards are rebuilt from the full history
+        "DELETE FROM leaderboard_boards WHERE span = 'all'",
+        '''
+            INSERT INTO leaderboard_boards
+                (span, period, outcome, xp, score, entry_id, player_name, victory_type, health, date)
+            SELECT 'all', '', '*', xp, score, entry_id, player_name, victory_type, health, date
+            FROM player_best
+            ORDER BY xp DESC, score DESC, entry_id
+            LIMIT 100
+        ''',
+        '''
+            INSERT INTO leaderboard_boards
+                (span, period, outcome, xp, score, entry_id, player_name, victory_type, health, date)
+            SELECT 'all', '', victory_type, xp, score, id, player_name, victory_type, health, date
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY victory_type ORDER BY xp DESC, score DESC, id) AS position
+                FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY victory_type, player_name ORDER BY xp DESC, score DESC, id) AS best
+                    FROM leaderboard
+                    WHERE victory_type IS NOT NULL AND player_name IS NOT NULL)
+                WHERE best = 1)
+            WHERE position <= 100
+        ''',
+        # Keyset pages of personal bests filtered to one outcome
+        '''
+            CREATE INDEX IF NOT EXISTS idx_player_best_victory
+            ON player_best (victory_type, xp DESC, score DESC, entry_id)
+        ''',
+    )),
+    (11, 'Personal bests per outcome', (
+        # Outcome pages rank each player's best of that outcome, as the
+        # per-outcome boards do, not the players whose overall best it was
+        '''
+            CREATE TABLE IF NOT EXISTS player_outcome_best
+            (player_name TEXT NOT NULL,
+             victory_type TEXT NOT NULL,
+             entry_id INTEGER NOT NULL,
+             score INTEGER NOT NULL,
+             xp INTEGER NOT NULL,
+             health INTEGER,
+             date TIMESTAMP,
+             PRIMARY KEY (player_name, victory_type))
+            WITHOUT ROWID
+        ''',
+        '''
+            INSERT INTO player_outcome_best (player_name, victory_type, entry_id, score, xp, health, date)
+            SELECT player_name, victory_type, id, score, xp, health, date
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY player_name, victory_type ORDER BY xp DESC, score DESC, id) AS position
+                FROM leaderboard
+                WHERE player_name IS NOT NULL AND victory_type IS NOT NULL)
+            WHERE position = 1
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_player_outcome_best_page
+            ON player_outcome_best (victory_type, xp DESC, score DESC, entry_id, player_name, health, date)
+        ''',
+        'DROP INDEX IF EXISTS idx_player_best_victory',
+        # Date-bounded pages rank the entries of their window
+        'CREATE INDEX IF NOT EXISTS idx_leaderboard_date ON leaderboard (date)',
+    )),
+    (12, 'Drop leaderboard indexes no query reads', (
+        # Ranked reads go to player_best, player_outcome_best and the boards;
+        # the raw history is only read by id and, for date windows, by date
+        'DROP INDEX IF EXISTS idx_leaderboard_page',
+        'DROP INDEX IF EXISTS idx_leaderboard_victory_page',
+    )),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn: sqlite3.Connection, target: int = LATEST_VERSION) -> int:
+    """Apply the migrations after conn's version up to target in one transaction
+
+    conn must be in autocommit mode (isolation_level=None). Returns how
+    many migrations were applied; a failing one rolls back all of them.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Another process may have migrated while we waited for the lock
+        version = get_schema_version(conn)
+        pending = [migration for migration in MIGRATIONS if version < migration[0] <= target]
+        for migration_version, description, statements in pending:
+            started = time.perf_counter()
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {migration_version}')
+            print(f"Applied migration {migration_version} ({description}) "
+                  f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+        conn.execute('COMMIT')
+    except sqlite3.Error:
+        conn.execute('ROLLBACK')
+        raise
+    return len(pending)
+
+def run_migrations(db_path: str) -> int:
+    """Apply pending migrations to db_path, returning how many were applied
+
+    A database that is already current is only read, never written, so
+    every worker can call this on boot without taking the write lock.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        if get_schema_version(conn) >= LATEST_VERSION:
+            return 0
+        conn.execute('PRAGMA journal_mode=WAL')
+        return migrate(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,73 @@
+import sqlite3
+from datetime import datetime
+from itertools import starmap
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+class LeaderboardEntry:
+    """One leaderboard row; the date is parsed from its text the first time it is read"""
+
+    __slots__ = ('player_name', 'score', 'xp', 'victory_type', 'health', '_date', '_date_text')
+
+    def __init__(self, player_name: str, score: int, xp: int, victory_type: str, health: int,
+                 date: Union[datetime, str, None]):
+        self.player_name = player_name
+        self.score = score
+        self.xp = xp
+        self.victory_type = victory_type
+        self.health = health
+        if isinstance(date, datetime):
+            self._date, self._date_text = date, None
+        else:
+            self._date, self._date_text = None, date
+
+    @property
+    def date(self) -> Optional[datetime]:
+        if self._date is None and self._date_text is not None:
+            self._date = datetime.fromisoformat(self._date_text)
+        return self._date
+
+    def astuple(self) -> tuple:
+        return (self.player_name, self.score, self.xp, self.victory_type, self.health, self.date)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, LeaderboardEntry):
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __repr__(self) -> str:
+        return (f"LeaderboardEntry(player_name={self.player_name!r}, score={self.score!r}, "
+                f"xp={self.xp!r}, victory_type={self.victory_type!r}, health={self.health!r}, "
+                f"date={self.date!r})")
+
+def decode_leaderboard(rows: Iterable[tuple]) -> List[LeaderboardEntry]:
+    """Decode (player_name, score, xp, victory_type, health, date) rows"""
+    return list(starmap(LeaderboardEntry, rows))
+
+# Column names per statement text, taken from the first cursor that ran it
+_column_maps: Dict[str, Tuple[str, ...]] = {}
+
+def column_map(cursor: sqlite3.Cursor, sql: str) -> Tuple[str, ...]:
+    columns = _column_maps.get(sql)
+    if columns is None:
+        columns = _column_maps[sql] = tuple(description[0] for description in cursor.description)
+    return columns
+
+def clear_column_maps() -> None:
+    """Forget cached column names, e.g. after a migration adds columns to a SELECT *"""
+    _column_maps.clear()
+
+def fetch_dict(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
+    """Run sql and return its first row as a column name to value dict"""
+    c = conn.execute(sql, params)
+    row = c.fetchone()
+    if row is None:
+        return None
+    return dict(zip(column_map(c, sql), row))
+
+def fetch_dicts(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+    c = conn.execute(sql, params)
+    rows = c.fetchall()
+    if not rows:
+        return []
+    columns = column_map(c, sql)
+    return [dict(zip(columns, row)) for row in rows]
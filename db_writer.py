@@ -0,0 +1,149 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+Mutation = Callable[..., Any]
+QueuedWrite = Tuple[Mutation, tuple, Future]
+
+_STOP = object()
+
+class DatabaseWriter:
+    """Single writer thread that applies queued mutations in group commits
+
+    Callers hand over a mutation function and its arguments and get a Future
+    back. The writer drains up to max_batch queued mutations, runs each one in
+    its own savepoint inside a single transaction, commits once, and only then
+    resolves the futures. A failing mutation is rolled back on its own and its
+    future carries the exception; the rest of the batch still commits.
+    on_rollback, if given, is called after any rollback so that state the
+    mutations kept outside the database can be dropped.
+
+    The connection is opened on the first batch. If opening it fails, or
+    anything else breaks a batch outside its savepoints, every future of
+    that batch carries the exception, the connection is dropped and the
+    next batch opens a new one, so the thread outlives the failure.
+    timeout is how long flush waits for the writer.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_queue: int = 10000,
+                 max_batch: int = 500, on_rollback: Optional[Callable[[], None]] = None,
+                 timeout: float = 30):
+        self.connect = connect
+        self.on_rollback = on_rollback
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.commits = 0
+        self.mutations = 0
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, mutation: Mutation, *args) -> Future:
+        """Queue mutation(conn, *args); blocks while the queue is full"""
+        future: Future = Future()
+        self._queue.put((mutation, args, future))
+        return future
+
+    def flush(self) -> None:
+        """Wait until everything queued so far has been committed
+
+        Raises TimeoutError if that takes longer than timeout seconds.
+        """
+        self.submit(lambda conn: None).result(self.timeout)
+
+    def close(self, timeout: float = 10) -> None:
+        """Commit what is queued and stop the writer thread"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> Tuple[List[QueuedWrite], bool]:
+        """Block for one queued write, then take whatever else is already waiting"""
+        batch: List[QueuedWrite] = []
+        item = self._queue.get()
+        while item is not _STOP:
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                return batch, False
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _run(self) -> None:
+        conn: Optional[sqlite3.Connection] = None
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            try:
+                if conn is None:
+                    conn = self.connect()
+                    conn.isolation_level = None
+                self._commit_batch(conn, batch)
+            except Exception as e:
+                print(f"Database error in writer thread, reconnecting: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if conn is not None:
+                    # Closing rolls back whatever the batch left uncommitted
+                    conn.close()
+                    conn = None
+                    self._rolled_back(suppress=True)
+        if conn is not None:
+            conn.close()
+
+    def _rolled_back(self, suppress: bool = False) -> None:
+        if self.on_rollback is None:
+            return
+        try:
+            self.on_rollback()
+        except Exception as e:
+            if not suppress:
+                raise
+            print(f"Error in writer rollback callback: {e}")
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List[QueuedWrite]) -> None:
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for mutation, args, future in batch:
+                conn.execute('SAVEPOINT mutation')
+                try:
+                    results.append((future, mutation(conn, *args), None))
+                    conn.execute('RELEASE mutation')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO mutation')
+                    conn.execute('RELEASE mutation')
+                    self._rolled_back()
+                    print(f"Database error in queued write {getattr(mutation, '__name__', mutation)}: {e}")
+                    results.append((future, None, e))
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            self._rolled_back()
+            print(f"Database error committing {len(batch)} queued writes: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.commits += 1
+        self.mutations += len(batch)
+        for future, result, error in results:
+            if future.done():
+                continue  # Cancelled by the caller
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
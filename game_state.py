@@ -0,0 +1,72 @@
+from typing import Any, Dict, Optional
+
+class GameState:
+    """Compact per-session game state with fixed fields
+
+    Current and previous stats are stored as plain ints next to each other
+    instead of two nested dicts; health is None while no game is running.
+    """
+
+    __slots__ = ('player_name', 'session_id', 'health', 'score', 'xp',
+                 'previous_health', 'previous_score', 'previous_xp')
+
+    def __init__(self, player_name: Optional[str] = None, session_id: Optional[str] = None,
+                 health: Optional[int] = None, score: int = 0, xp: int = 0,
+                 previous_health: Optional[int] = None, previous_score: int = 0,
+                 previous_xp: int = 0):
+        self.player_name = player_name
+        self.session_id = session_id
+        self.health = health
+        self.score = score
+        self.xp = xp
+        self.previous_health = previous_health
+        self.previous_score = previous_score
+        self.previous_xp = previous_xp
+
+    @property
+    def has_stats(self) -> bool:
+        return self.health is not None
+
+    def stats(self) -> Dict[str, int]:
+        return {'health': self.health, 'score': self.score, 'xp': self.xp}
+
+    def previous_stats(self) -> Dict[str, int]:
+        return {'health': self.previous_health, 'score': self.previous_score,
+                'xp': self.previous_xp}
+
+    def set_previous_stats(self, stats: Dict[str, int]) -> None:
+        self.previous_health = stats['health']
+        self.previous_score = stats['score']
+        self.previous_xp = stats['xp']
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the nested dict shape used by routes and templates"""
+        state: Dict[str, Any] = {}
+        if self.player_name is not None:
+            state['player_name'] = self.player_name
+        if self.session_id is not None:
+            state['session_id'] = self.session_id
+        if self.has_stats:
+            state['stats'] = self.stats()
+            state['previous_stats'] = self.previous_stats()
+        return state
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'GameState':
+        """Build a GameState from the nested dict shape"""
+        game_state = cls(state.get('player_name'), state.get('session_id'))
+        stats = state.get('stats')
+        if stats:
+            game_state.health = int(stats['health'])
+            game_state.score = int(stats['score'])
+            game_state.xp = int(stats['xp'])
+            game_state.set_previous_stats(state.get('previous_stats') or stats)
+        return game_state
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"GameState({self.to_dict()!r})"
@@ -1,3 +1,5 @@
+import sys
+
 # Logging
 errorlog = "logs/gunicorn-error.log"
 accesslog = "logs/gunicorn-access.log"
@@ -14,4 +16,28 @@ pidfile = "logs/gunicorn.pid"
 
 # Server socket
 bind = "127.0.0.1:8000"
-workers = 4 
\ No newline at end of file
+workers = 4
+
+# Server hooks
+def on_starting(server):
+    """Run schema migrations once in the master, before any worker boots"""
+    from database import init_db
+    init_db()
+
+def worker_exit(server, worker):
+    """Commit queued writes, flush game sessions and snapshot per-worker ones before exiting"""
+    database = sys.modules.get('database')
+    if database is not None:
+        database.close_writer()
+    web_game = sys.modules.get('web_game')
+    if web_game is not None:
+        from session_store import close_session_store
+        from session_snapshot import save_worker_snapshot
+        close_session_store(web_game.session_store)
+        if web_game.SESSION_BACKEND == 'memory':
+            save_worker_snapshot(web_game.session_store)
+
+def on_exit(server):
+    """Merge worker snapshots and the shared session store into one file"""
+    from session_snapshot import merge_worker_snapshots
+    merge_worker_snapshots()
@@ -0,0 +1,105 @@
+import base64
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from database import LEADERBOARD_PAGE_COLUMNS, get_leaderboard_page
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 10000
+# Larger pages are streamed in batches instead of built in memory
+STREAM_THRESHOLD = 500
+STREAM_BATCH = 500
+
+PageKey = Tuple[int, int, int]
+_KEY_INDEXES = tuple(LEADERBOARD_PAGE_COLUMNS.index(column) for column in ('xp', 'score', 'id'))
+_HEADER = '{"columns":' + json.dumps(LEADERBOARD_PAGE_COLUMNS, separators=(',', ':')) + ',"rows":['
+
+def encode_cursor(key: PageKey) -> str:
+    """Opaque cursor for the (xp, score, id) key of the last row on a page
+
+    xp and score are NOT NULL since migration 9, so every key round-trips
+    through decode_cursor.
+    """
+    return base64.urlsafe_b64encode(':'.join(map(str, key)).encode()).rstrip(b'=').decode()
+
+def decode_cursor(cursor: str) -> PageKey:
+    try:
+        xp, score, row_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split(':')
+        return int(xp), int(score), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+def parse_date(value: Optional[str]) -> Optional[str]:
+    """Normalize an ISO date or datetime to the stored 'YYYY-MM-DD HH:MM:SS' form"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+def parse_query(query: Dict[str, str]) -> dict:
+    """Validate /api/leaderboard query parameters, raising ValueError on bad input"""
+    try:
+        limit = int(query.get('limit') or DEFAULT_LIMIT)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    after = query.get('after')
+    return {
+        'limit': limit,
+        'after': decode_cursor(after) if after else None,
+        'victory_type': query.get('victory_type') or None,
+        'since': parse_date(query.get('since')),
+        'until': parse_date(query.get('until')),
+    }
+
+def parse_rank_query(query: Dict[str, str]) -> Tuple[int, int]:
+    """Validate /api/leaderboard/rank query parameters into (xp, score)"""
+    values = []
+    for name in ('xp', 'score'):
+        try:
+            value = int(query.get(name, ''))
+        except ValueError:
+            raise ValueError(f"{name} must be an integer")
+        if value < 0:
+            raise ValueError(f"{name} must not be negative")
+        values.append(value)
+    return values[0], values[1]
+
+def _dump_rows(rows: list) -> str:
+    return json.dumps(rows, separators=(',', ':'))[1:-1]
+
+def _footer(last_row: Optional[tuple], count: int, limit: int) -> str:
+    if last_row is None or count < limit:
+        return '],"next":null}'
+    key = tuple(last_row[index] for index in _KEY_INDEXES)
+    return f'],"next":"{encode_cursor(key)}"}}'
+
+def render_page(cursor: sqlite3.Cursor, limit: int) -> str:
+    rows = cursor.fetchall()
+    return _HEADER + _dump_rows(rows) + _footer(rows[-1] if rows else None, len(rows), limit)
+
+def stream_page(cursor: sqlite3.Cursor, limit: int) -> Iterator[str]:
+    """Yield the page as JSON text, STREAM_BATCH rows at a time"""
+    yield _HEADER
+    last_row, count = None, 0
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH)
+        if not rows:
+            break
+        yield (',' if count else '') + _dump_rows(rows)
+        last_row, count = rows[-1], count + len(rows)
+    yield _footer(last_row, count, limit)
+
+def leaderboard_page(query: Dict[str, str]):
+    """Response body for a validated query: a string, or a generator for large pages"""
+    params = parse_query(query)
+    # Run the query now so database errors surface before any body is sent
+    cursor = get_leaderboard_page(**params)
+    if params['limit'] > STREAM_THRESHOLD:
+        return stream_page(cursor, params['limit'])
+    return render_page(cursor, params['limit'])
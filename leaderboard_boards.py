@@ -0,0 +1,163 @@
+import heapq
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Board spans, newest first; 'day' and 'week' boards exist per UTC day and ISO week
+SPANS = ('day', 'week', 'all')
+# Outcome of the boards that take every entry
+ALL_OUTCOMES = '*'
+
+# (span, period, outcome)
+BoardKey = Tuple[str, str, str]
+# (entry_id, player_name, score, xp, victory_type, health, date), as stored in leaderboard
+BoardRow = Tuple[int, str, int, int, str, int, str]
+
+# Both are set inside the caller's transaction; whoever rolls it back calls invalidate()
+_rotated_periods: Optional[Dict[str, str]] = None
+# Rank key of the last row on each full board seen by this process. Boards
+# only ever improve, so an entry ranked after it cannot make the board even
+# if another process has raised the bar since.
+_cutoffs: Dict[BoardKey, Tuple[int, int, int]] = {}
+
+def invalidate() -> None:
+    """Forget the rotation and cutoffs, which a rolled back transaction may have set"""
+    global _rotated_periods
+    _rotated_periods = None
+    _cutoffs.clear()
+
+def period_of(span: str, moment: datetime) -> str:
+    if span == 'day':
+        return moment.strftime('%Y-%m-%d')
+    if span == 'week':
+        year, week, _ = moment.isocalendar()
+        return f'{year}-W{week:02d}'
+    return ''
+
+def current_periods(now: Optional[datetime] = None) -> Dict[str, str]:
+    """Period of every span at now, in UTC like CURRENT_TIMESTAMP"""
+    now = now or datetime.now(timezone.utc)
+    return {span: period_of(span, now) for span in SPANS}
+
+def previous_periods(now: Optional[datetime] = None) -> Dict[str, str]:
+    now = now or datetime.now(timezone.utc)
+    return {'day': period_of('day', now - timedelta(days=1)),
+            'week': period_of('week', now - timedelta(weeks=1)), 'all': ''}
+
+def board_keys(date: str, victory_type: Optional[str], kept: Dict[str, Tuple[str, ...]]) -> List[BoardKey]:
+    """Boards an entry belongs on, limited to the periods still kept"""
+    try:
+        moment = datetime.fromisoformat(date)
+    except (TypeError, ValueError):
+        moment = None
+    outcomes = (ALL_OUTCOMES, victory_type) if victory_type else (ALL_OUTCOMES,)
+    keys = []
+    for span in SPANS:
+        if span != 'all' and moment is None:
+            continue
+        period = period_of(span, moment) if moment else ''
+        if period in kept[span]:
+            keys.extend((span, period, outcome) for outcome in outcomes)
+    return keys
+
+def rotate(conn: sqlite3.Connection) -> Dict[str, Tuple[str, ...]]:
+    """Drop day and week boards older than the previous period; returns the periods kept
+
+    Boards are only written for the current and previous periods, so a new
+    day or week starts from an empty board and the one before it is kept
+    for reading. The delete runs once per period change in each process.
+    """
+    global _rotated_periods
+    current, previous = current_periods(), previous_periods()
+    if current != _rotated_periods:
+        conn.execute('''
+            DELETE FROM leaderboard_boards
+            WHERE (span = 'day' AND period < ?) OR (span = 'week' AND period < ?)
+        ''', (previous['day'], previous['week']))
+        _rotated_periods = current
+        _cutoffs.clear()
+    return {span: (current[span], previous[span]) for span in SPANS}
+
+def rank_on_boards(conn: sqlite3.Connection, rows: Iterable[BoardRow], size: int) -> None:
+    """Add leaderboard rows to every board they belong on, keeping each board's best `size` players
+
+    A board holds one row per player, their best entry for its period and
+    outcome, as player_best does overall; entries without a player name are
+    not ranked. Runs in the caller's transaction. Rows already on a board
+    are ignored, so a range of rows may be merged again safely.
+    """
+    kept = rotate(conn)
+    candidates: Dict[BoardKey, List[BoardRow]] = {}
+    for row in rows:
+        if row[1] is None:
+            continue
+        for key in board_keys(row[6], row[4], kept):
+            cutoff = _cutoffs.get(key)
+            if cutoff is not None and _rank_key(row) > cutoff:
+                continue
+            board = candidates.setdefault(key, [])
+            board.append(row)
+            if len(board) > 2 * size:
+                board[:] = heapq.nsmallest(size, _per_player(board), key=_rank_key)
+    for key, board in candidates.items():
+        held = {player_name: (-xp, -score, entry_id) for player_name, xp, score, entry_id in conn.execute('''
+            SELECT player_name, xp, score, entry_id FROM leaderboard_boards
+            WHERE span = ? AND period = ? AND outcome = ?
+        ''', key)}
+        inserts, replaced = [], []
+        for row in heapq.nsmallest(size, _per_player(board), key=_rank_key):
+            entry_id, player_name, score, xp, victory_type, health, date = row
+            current = held.get(player_name)
+            if current is not None:
+                if current <= _rank_key(row):
+                    continue
+                replaced.append((*key, -current[0], -current[1], current[2]))
+            inserts.append((*key, xp or 0, score or 0, entry_id, player_name, victory_type, health, date))
+        conn.executemany('''
+            DELETE FROM leaderboard_boards
+            WHERE span = ? AND period = ? AND outcome = ? AND xp = ? AND score = ? AND entry_id = ?
+        ''', replaced)
+        conn.executemany('''
+            INSERT OR IGNORE INTO leaderboard_boards
+                (span, period, outcome, xp, score, entry_id, player_name, victory_type, health, date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', inserts)
+        trimmed = conn.execute('''
+            DELETE FROM leaderboard_boards
+            WHERE span = ?1 AND period = ?2 AND outcome = ?3 AND entry_id NOT IN (
+                SELECT entry_id FROM leaderboard_boards
+                WHERE span = ?1 AND period = ?2 AND outcome = ?3
+                ORDER BY xp DESC, score DESC, entry_id
+                LIMIT ?4)
+        ''', (*key, size)).rowcount
+        if trimmed:
+            xp, score, entry_id = conn.execute('''
+                SELECT xp, score, entry_id FROM leaderboard_boards
+                WHERE span = ? AND period = ? AND outcome = ?
+                ORDER BY xp, score, entry_id DESC
+                LIMIT 1
+            ''', key).fetchone()
+            _cutoffs[key] = (-xp, -score, entry_id)
+
+def read_board(conn: sqlite3.Connection, span: str, period: str, outcome: str, limit: int) -> List[tuple]:
+    """(player_name, score, xp, victory_type, health, date) rows of one board, best first"""
+    return conn.execute('''
+        SELECT player_name, score, xp, victory_type, health, date
+        FROM leaderboard_boards
+        WHERE span = ? AND period = ? AND outcome = ?
+        ORDER BY xp DESC, score DESC, entry_id
+        LIMIT ?
+    ''', (span, period, outcome, limit)).fetchall()
+
+def _per_player(rows: List[BoardRow]) -> List[BoardRow]:
+    """Each player's best row"""
+    best: Dict[str, BoardRow] = {}
+    for row in rows:
+        player_name = row[1]
+        if player_name not in best or _rank_key(row) < _rank_key(best[player_name]):
+            best[player_name] = row
+    return list(best.values())
+
+def _rank_key(row: BoardRow) -> Tuple[int, int, int]:
+    """Board order: xp DESC, score DESC, oldest entry first on ties; imported NULLs count as 0"""
+    return -(row[3] or 0), -(row[2] or 0), row[0]
@@ -0,0 +1,130 @@
+import bisect
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from db_rows import LeaderboardEntry
+
+# Sort key matching ORDER BY xp DESC, score DESC, oldest row first on ties
+CacheKey = Tuple[int, int, int]
+
+class LeaderboardCache:
+    """Top personal bests of the leaderboard held in process
+
+    Each read checks PRAGMA data_version, which changes whenever any
+    connection, in this or another worker, commits to the database. Only
+    then is player_best consulted, and only for bests set by entries added
+    since the last look, which are merged into the held top rows, replacing
+    the player's previous best. Reads in the steady state touch no table.
+    Bests only ever improve; a table whose newest entry goes back is
+    reloaded from scratch.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int):
+        self.connect = connect
+        self.size = size
+        self.hits = 0
+        self.refreshes = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._version: Optional[int] = None
+        self._last_id = 0
+        self._newest_entry = 0
+        self._keys: List[CacheKey] = []
+        self._entries: List[LeaderboardEntry] = []
+        self._players: Dict[str, CacheKey] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = self.connect()
+            self._pid = os.getpid()
+            self._version = None
+        return self._conn
+
+    def _merge(self, rows: List[tuple]) -> None:
+        for entry_id, player_name, score, xp, victory_type, health, date in rows:
+            key = (-xp, -score, entry_id)
+            if len(self._keys) >= self.size and key >= self._keys[-1]:
+                continue
+            # A new best always outranks the one it replaces
+            previous = self._players.pop(player_name, None)
+            if previous is not None:
+                position = bisect.bisect_left(self._keys, previous)
+                del self._keys[position], self._entries[position]
+            position = bisect.bisect(self._keys, key)
+            self._keys.insert(position, key)
+            self._entries.insert(position, LeaderboardEntry(player_name, score, xp, victory_type, health, date))
+            self._players[player_name] = key
+            if len(self._keys) > self.size:
+                self._keys.pop()
+                del self._players[self._entries.pop().player_name]
+
+    def _refresh(self, conn: sqlite3.Connection) -> None:
+        """Fold in bests set since the last refresh; only the best `size` of them can matter
+
+        All queries run in one read transaction so the MAX values match the
+        rows seen. The first load walks the rank index; later ones only
+        read the new entry range, so the planner is kept on the entry index.
+        """
+        conn.execute('BEGIN')
+        try:
+            self._newest_entry = conn.execute('SELECT MAX(id) FROM leaderboard').fetchone()[0] or 0
+            last_id = conn.execute('SELECT MAX(entry_id) FROM player_best').fetchone()[0] or 0
+            if last_id < self._last_id:
+                self._keys, self._entries, self._players, self._last_id = [], [], {}, 0
+                self.reloads += 1
+            if last_id == self._last_id:
+                return
+            if self._last_id == 0:
+                rows = conn.execute('''
+                    SELECT entry_id, player_name, score, xp, victory_type, health, date
+                    FROM player_best
+                    ORDER BY xp DESC, score DESC, entry_id
+                    LIMIT ?
+                ''', (self.size,)).fetchall()
+            else:
+                rows = conn.execute('''
+                    SELECT entry_id, player_name, score, xp, victory_type, health, date
+                    FROM player_best INDEXED BY idx_player_best_entry
+                    WHERE entry_id > ?
+                    ORDER BY xp DESC, score DESC, entry_id
+                    LIMIT ?
+                ''', (self._last_id, self.size)).fetchall()
+        finally:
+            conn.commit()
+        self._merge(rows)
+        self._last_id = last_id
+        self.refreshes += 1
+
+    def _validate(self) -> None:
+        conn = self._connection()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if version != self._version:
+            self._refresh(conn)
+            self._version = version
+        else:
+            self.hits += 1
+
+    def load(self) -> None:
+        """Fill the cache now rather than on the first read"""
+        with self._lock:
+            self._validate()
+
+    def top(self, limit: int) -> List[LeaderboardEntry]:
+        """The best `limit` entries, at most `size`"""
+        with self._lock:
+            self._validate()
+            return self._entries[:limit]
+
+    def version(self) -> int:
+        """Highest leaderboard id seen; changes whenever a row is added, best or not"""
+        with self._lock:
+            self._validate()
+            return self._newest_entry
+
+    def stats(self) -> dict:
+        return {'size': len(self._entries), 'hits': self.hits, 'refreshes': self.refreshes,
+                'reloads': self.reloads}
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import threading
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from bottle import HTTPResponse, request
+
+GZIP_LEVEL = 6
+
+class RenderedPage:
+    """A rendered body with its gzip form and validators"""
+
+    __slots__ = ('body', 'gzip_body', 'etag', 'gzip_etag')
+
+    def __init__(self, body: str):
+        self.body = body.encode()
+        self.gzip_body = gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()[:20]
+        # Strong validators must differ between the plain and gzip representations
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+
+class PageCache:
+    """Rendered pages kept per name until their version changes"""
+
+    def __init__(self):
+        self.renders = 0
+        self._pages: Dict[str, Tuple[Hashable, RenderedPage]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, version: Optional[Hashable], render: Callable[[], str]) -> RenderedPage:
+        """Return the page for version, rendering it only if the version is new
+
+        A version of None means the caller cannot tell, so the page is rendered
+        every time.
+        """
+        cached = self._pages.get(name)
+        if version is not None and cached is not None and cached[0] == version:
+            return cached[1]
+        page = RenderedPage(render())
+        self.renders += 1
+        if version is not None:
+            with self._lock:
+                self._pages[name] = (version, page)
+        return page
+
+    def stats(self) -> Dict[str, int]:
+        return {'pages': len(self._pages), 'renders': self.renders}
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+def page_response(page: RenderedPage, max_age: int) -> HTTPResponse:
+    """Answer with the page, its gzip form, or 304 if the client's copy is current"""
+    use_gzip = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+    etag = page.gzip_etag if use_gzip else page.etag
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={max_age}',
+        'Vary': 'Accept-Encoding',
+    }
+    if_none_match = request.headers.get('If-None-Match', '')
+    if if_none_match.strip() == '*' or etag in (tag.strip() for tag in if_none_match.split(',')):
+        return HTTPResponse(status=304, **headers)
+    headers['Content-Type'] = 'text/html; charset=UTF-8'
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        return HTTPResponse(page.gzip_body, **headers)
+    return HTTPResponse(page.body, **headers)
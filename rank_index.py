@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Largest xp and score the index tells apart; higher values share the top
+# bucket, so one outlying row cannot make every worker allocate a huge tree
+RANK_INDEX_MAX_XP = 1023
+RANK_INDEX_MAX_SCORE = 1023
+
+class FenwickTree:
+    """Counts per non-negative index with O(log n) updates and prefix sums
+
+    The tree doubles when an index past its end is added; a doubled tree
+    only needs its new root set to the running total.
+    """
+
+    __slots__ = ('_tree', 'total')
+
+    def __init__(self, counts: Optional[List[int]] = None):
+        counts = counts or []
+        size = 1
+        while size < len(counts):
+            size *= 2
+        self._tree = [0] + counts + [0] * (size - len(counts))
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                self._tree[parent] += self._tree[index]
+        self.total = sum(counts)
+
+    def add(self, index: int, count: int = 1) -> None:
+        size = len(self._tree) - 1
+        while index >= size:
+            self._tree.extend([0] * size)
+            size *= 2
+            self._tree[size] = self.total
+        index += 1
+        while index <= size:
+            self._tree[index] += count
+            index += index & -index
+        self.total += count
+
+    def prefix(self, index: int) -> int:
+        """Sum of the counts at 0..index"""
+        index = min(index + 1, len(self._tree) - 1)
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+class RankIndex:
+    """Leaderboard rank of any (xp, score) among players' personal bests in O(log n)
+
+    One Fenwick tree counts player_best rows per xp and, for each xp seen,
+    another counts them per score, so the players ranked above a pair are
+    those with more xp plus those with the same xp and more score. Each
+    player's counted pair is remembered so an improved best can replace it.
+    The game never
+    produces negative or NULL xp or score; imported ones are counted as 0.
+    Values above RANK_INDEX_MAX_XP / RANK_INDEX_MAX_SCORE are counted at the
+    maximum, so they tie with each other.
+
+    Like LeaderboardCache, it notices commits from any worker through PRAGMA
+    data_version and then folds in only the bests set since the last look.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection]):
+        self.connect = connect
+        self.hits = 0
+        self.refreshes = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._version: Optional[int] = None
+        self._last_entry = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._xp = FenwickTree()
+        self._scores: Dict[int, FenwickTree] = {}
+        self._players: Dict[str, Tuple[int, int]] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = self.connect()
+            self._pid = os.getpid()
+            self._version = None
+        return self._conn
+
+    def _add(self, xp: Optional[int], score: Optional[int], count: int = 1) -> None:
+        xp, score = _bucket(xp, RANK_INDEX_MAX_XP), _bucket(score, RANK_INDEX_MAX_SCORE)
+        self._xp.add(xp, count)
+        scores = self._scores.get(xp)
+        if scores is None:
+            scores = self._scores[xp] = FenwickTree()
+        scores.add(score, count)
+
+    def _set_best(self, player_name: str, xp: int, score: int) -> None:
+        previous = self._players.get(player_name)
+        if previous is not None:
+            self._add(*previous, count=-1)
+        self._add(xp, score)
+        self._players[player_name] = (xp, score)
+
+    def _build(self, bests: Iterable[tuple]) -> None:
+        """Build every tree at once from (player_name, xp, score) rows"""
+        xp_counts: Dict[int, int] = {}
+        score_counts: Dict[int, Dict[int, int]] = {}
+        for player_name, xp, score in bests:
+            self._players[player_name] = (xp, score)
+            xp, score = _bucket(xp, RANK_INDEX_MAX_XP), _bucket(score, RANK_INDEX_MAX_SCORE)
+            xp_counts[xp] = xp_counts.get(xp, 0) + 1
+            scores = score_counts.setdefault(xp, {})
+            scores[score] = scores.get(score, 0) + 1
+        if xp_counts:
+            self._xp = FenwickTree(_dense(xp_counts))
+            self._scores = {xp: FenwickTree(_dense(scores)) for xp, scores in score_counts.items()}
+
+    def _refresh(self, conn: sqlite3.Connection) -> None:
+        """Count bests set since the last refresh, or every best on the first load"""
+        conn.execute('BEGIN')
+        try:
+            last_entry = conn.execute('SELECT MAX(entry_id) FROM player_best').fetchone()[0] or 0
+            if last_entry < self._last_entry:
+                self._reset()
+                self._last_entry = 0
+                self.reloads += 1
+            if last_entry == self._last_entry:
+                return
+            if self._last_entry == 0:
+                self._build(conn.execute('SELECT player_name, xp, score FROM player_best'))
+            else:
+                for player_name, xp, score in conn.execute('''
+                    SELECT player_name, xp, score
+                    FROM player_best INDEXED BY idx_player_best_entry
+                    WHERE entry_id > ?
+                ''', (self._last_entry,)):
+                    self._set_best(player_name, xp, score)
+        finally:
+            conn.commit()
+        self._last_entry = last_entry
+        self.refreshes += 1
+
+    def _validate(self) -> None:
+        conn = self._connection()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if version != self._version:
+            self._refresh(conn)
+            self._version = version
+        else:
+            self.hits += 1
+
+    def load(self) -> None:
+        """Count the personal bests now rather than on the first lookup"""
+        with self._lock:
+            self._validate()
+
+    def rank_of(self, xp: int, score: int) -> int:
+        """1 + the number of players whose best has more xp, or as much xp and more score
+
+        Equal pairs share a rank, so a new best ranks the same before and
+        after it is counted.
+        """
+        with self._lock:
+            self._validate()
+            xp, score = _bucket(xp, RANK_INDEX_MAX_XP), _bucket(score, RANK_INDEX_MAX_SCORE)
+            above = self._xp.total - self._xp.prefix(xp)
+            scores = self._scores.get(xp)
+            if scores is not None:
+                above += scores.total - scores.prefix(score)
+            return above + 1
+
+    def count(self) -> int:
+        """Number of players on the leaderboard"""
+        with self._lock:
+            self._validate()
+            return self._xp.total
+
+    def stats(self) -> dict:
+        return {'players': self._xp.total, 'hits': self.hits, 'refreshes': self.refreshes,
+                'reloads': self.reloads}
+
+def _bucket(value: Optional[int], maximum: int) -> int:
+    return min(max(value or 0, 0), maximum)
+
+def _dense(counts: Dict[int, int]) -> List[int]:
+    dense = [0] * (max(counts) + 1)
+    for index, count in counts.items():
+        dense[index] = count
+    return dense
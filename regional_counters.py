@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Set, Tuple
+
+class PendingRegion:
+    """Increments for one region since the last flush"""
+
+    __slots__ = ('country', 'region', 'counts', 'players')
+
+    def __init__(self, country: str, region: str):
+        self.country = country
+        self.region = region
+        self.counts: Dict[str, int] = {}
+        self.players: Set[str] = set()
+
+class RegionalCounters:
+    """Regional stats increments summed in process between flushes
+
+    add() only touches a dict, so telemetry posts do no database work. A
+    thread hands everything pending to flush() every interval seconds, and
+    close() hands over the rest. Every add() made before a flush returns the
+    future of that flush, which flush() resolves once the counts commit. A
+    flush that fails hands its increments back through restore(), so they
+    go out, and their future resolves, with the next one.
+    """
+
+    def __init__(self, flush: Callable[['RegionalCounters'], None], interval: float):
+        self.flush = flush
+        self.interval = interval
+        self.adds = 0
+        self.flushes = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, PendingRegion] = {}
+        self._flushed: Future = Future()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='regional-counters', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush(self)
+            except Exception as e:
+                print(f"Regional stats flush failed: {e}")
+
+    def close(self) -> None:
+        """Stop the flush thread and flush what is still pending"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush(self)
+
+    def add(self, region_key: str, country: str, region: str, player_name: str,
+            increments: Dict[str, int]) -> Future:
+        with self._lock:
+            pending = self._pending.get(region_key)
+            if pending is None:
+                pending = self._pending[region_key] = PendingRegion(country, region)
+            for metric, increment in increments.items():
+                pending.counts[metric] = pending.counts.get(metric, 0) + increment
+            if player_name:
+                pending.players.add(player_name)
+            self.adds += 1
+            return self._flushed
+
+    def drain(self) -> Tuple[Dict[str, PendingRegion], Future]:
+        """Take the pending increments and the future their adds were given"""
+        with self._lock:
+            pending, flushed = self._pending, self._flushed
+            if pending:
+                self._pending, self._flushed = {}, Future()
+                self.flushes += 1
+            return pending, flushed
+
+    def restore(self, pending: Dict[str, PendingRegion], flushed: Future) -> None:
+        """Merge increments whose flush failed back in, ahead of the next flush"""
+        with self._lock:
+            for region_key, restored in pending.items():
+                current = self._pending.get(region_key)
+                if current is None:
+                    self._pending[region_key] = restored
+                    continue
+                for metric, increment in restored.counts.items():
+                    current.counts[metric] = current.counts.get(metric, 0) + increment
+                current.players |= restored.players
+            self._flushed.add_done_callback(lambda written: _resolve(flushed, written))
+
+    def stats(self) -> dict:
+        return {'regions': len(self._pending), 'adds': self.adds, 'flushes': self.flushes}
+
+def _resolve(future: Future, outcome: Future) -> None:
+    if outcome.exception() is not None:
+        future.set_exception(outcome.exception())
+    else:
+        future.set_result(outcome.result())
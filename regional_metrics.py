@@ -0,0 +1,98 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Series granularities; hourly buckets are 'YYYY-MM-DDTHH' and daily ones
+# 'YYYY-MM-DD', both UTC, so the first ten characters of either are its day
+GRANULARITIES = ('hour', 'day')
+# Bucket of each metric's running total; sorts after every dated bucket
+ALL_TIME = 'all'
+
+# (region_key, metric, count)
+MetricCount = Tuple[str, str, int]
+
+# Set inside the caller's transaction; whoever rolls it back calls invalidate()
+_compacted_before: Optional[str] = None
+
+def invalidate() -> None:
+    """Forget the last rollup, which a rolled back transaction may have recorded"""
+    global _compacted_before
+    _compacted_before = None
+
+def bucket_of(granularity: str, moment: datetime) -> str:
+    if granularity == 'hour':
+        return moment.strftime('%Y-%m-%dT%H')
+    return moment.strftime('%Y-%m-%d')
+
+def first_bucket(granularity: str, buckets: int, now: Optional[datetime] = None) -> str:
+    """Oldest of the last `buckets` buckets up to now"""
+    now = now or datetime.now(timezone.utc)
+    step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+    return bucket_of(granularity, now - step * (buckets - 1))
+
+def increment(conn: sqlite3.Connection, counts: Iterable[MetricCount],
+              now: Optional[datetime] = None) -> None:
+    """Add counts to the current hour's bucket and the running total of each metric
+
+    Runs in the caller's transaction; counts of 0 are skipped.
+    """
+    hour = bucket_of('hour', now or datetime.now(timezone.utc))
+    conn.executemany('''
+        INSERT INTO regional_counters (region_key, metric, bucket, count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(region_key, bucket, metric) DO UPDATE SET count = count + excluded.count
+    ''', [(region_key, metric, bucket, count)
+          for region_key, metric, count in counts if count
+          for bucket in (hour, ALL_TIME)])
+
+def compact(conn: sqlite3.Connection, retention_hours: int, now: Optional[datetime] = None) -> int:
+    """Roll hourly buckets older than retention_hours into daily ones; returns the rows rolled
+
+    The sums and the delete share the caller's transaction, so a process
+    racing another one finds nothing left to roll. Runs once per hour in
+    each process; hourly rows are found through their partial index.
+    """
+    global _compacted_before
+    cutoff = bucket_of('hour', (now or datetime.now(timezone.utc)) - timedelta(hours=retention_hours))
+    if cutoff == _compacted_before:
+        return 0
+    conn.execute('''
+        INSERT INTO regional_counters (region_key, metric, bucket, count)
+        SELECT region_key, metric, substr(bucket, 1, 10), SUM(count)
+        FROM regional_counters INDEXED BY idx_regional_counters_hourly
+        WHERE length(bucket) = 13 AND bucket < ?
+        GROUP BY region_key, metric, substr(bucket, 1, 10)
+        ON CONFLICT(region_key, bucket, metric) DO UPDATE SET count = count + excluded.count
+    ''', (cutoff,))
+    rolled = conn.execute('''
+        DELETE FROM regional_counters
+        WHERE length(bucket) = 13 AND bucket < ?
+    ''', (cutoff,)).rowcount
+    _compacted_before = cutoff
+    return rolled
+
+def read_totals(conn: sqlite3.Connection, region_key: str) -> Dict[str, int]:
+    """Running total of every metric the region has counted"""
+    return dict(conn.execute('''
+        SELECT metric, count FROM regional_counters
+        WHERE region_key = ? AND bucket = ?
+    ''', (region_key, ALL_TIME)).fetchall())
+
+def read_series(conn: sqlite3.Connection, region_key: str, granularity: str, since: str) -> List[tuple]:
+    """(bucket, metric, count) rows of a region from bucket `since` on, oldest first
+
+    Daily series add up each day's rolled-up row and any hourly rows not yet
+    compacted into it. Hourly series only go back as far as the retention.
+    """
+    if granularity == 'hour':
+        return conn.execute('''
+            SELECT bucket, metric, count FROM regional_counters
+            WHERE region_key = ? AND bucket >= ? AND bucket < ? AND length(bucket) = 13
+            ORDER BY bucket, metric
+        ''', (region_key, since, ALL_TIME)).fetchall()
+    return conn.execute('''
+        SELECT substr(bucket, 1, 10) AS day, metric, SUM(count) FROM regional_counters
+        WHERE region_key = ? AND bucket >= ? AND bucket < ?
+        GROUP BY day, metric
+        ORDER BY day, metric
+    ''', (region_key, since, ALL_TIME)).fetchall()
@@ -0,0 +1,89 @@
+from typing import Callable, Optional
+
+from bottle import HTTPResponse, request
+
+from game_state import GameState
+
+CONTEXT_KEY = 'game.context'
+_NOT_LOADED = object()
+
+class RequestContext:
+    """Session id and game state resolved at most once per request
+
+    Routes read and save state through the context; the stored copy is
+    loaded lazily on first use and written back once when the request ends.
+    """
+
+    def __init__(self, resolve_session_id: Callable[[], str],
+                 load_state: Callable[[str], Optional[GameState]],
+                 store_state: Callable[[str, GameState], None]):
+        self._resolve_session_id = resolve_session_id
+        self._load_state = load_state
+        self._store_state = store_state
+        self._session_id: Optional[str] = None
+        self._stored_state = _NOT_LOADED
+        self.pending_state: Optional[GameState] = None
+        self.dirty = False
+        self.state_loads = 0
+        self.state_writes = 0
+
+    @property
+    def session_id(self) -> str:
+        if self._session_id is None:
+            self._session_id = self._resolve_session_id()
+        return self._session_id
+
+    def stored_state(self) -> Optional[GameState]:
+        """State as it was stored before this request"""
+        if self._stored_state is _NOT_LOADED:
+            self._stored_state = self._load_state(self.session_id)
+            self.state_loads += 1
+        return self._stored_state
+
+    def current_state(self) -> Optional[GameState]:
+        """Latest state, including changes saved earlier in this request"""
+        return self.pending_state if self.dirty else self.stored_state()
+
+    def save(self, state: GameState) -> None:
+        self.pending_state = state
+        self.dirty = True
+
+    def commit(self) -> None:
+        """Write the pending state back once, if anything changed"""
+        if self.dirty:
+            self._store_state(self.session_id, self.pending_state)
+            self.state_writes += 1
+            self.dirty = False
+
+def current_context() -> RequestContext:
+    """Return the context created for the current request"""
+    context = request.environ.get(CONTEXT_KEY)
+    if context is None:
+        raise RuntimeError("No request context; is RequestContextPlugin installed?")
+    return context
+
+class RequestContextPlugin:
+    """Bottle plugin giving every route a RequestContext and committing it"""
+
+    name = 'request_context'
+    api = 2
+
+    def __init__(self, resolve_session_id: Callable[[], str],
+                 load_state: Callable[[str], Optional[GameState]],
+                 store_state: Callable[[str, GameState], None]):
+        self.resolve_session_id = resolve_session_id
+        self.load_state = load_state
+        self.store_state = store_state
+
+    def apply(self, callback, route):
+        def wrapper(*args, **kwargs):
+            context = RequestContext(self.resolve_session_id, self.load_state, self.store_state)
+            request.environ[CONTEXT_KEY] = context
+            try:
+                body = callback(*args, **kwargs)
+            except HTTPResponse:
+                context.commit()
+                raise
+            context.commit()
+            return body
+        return wrapper
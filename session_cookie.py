@@ -0,0 +1,111 @@
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from game_state import GameState
+
+# Signed cookie settings
+SESSION_COOKIE_NAME = 'game_state'
+SESSION_COOKIE_SECRET = os.environ.get('SESSION_COOKIE_SECRET', '')
+SESSION_COOKIE_VERSION = 1
+SIGNATURE_BYTES = 16
+MAX_NAME_BYTES = 255
+MAX_TRACKED_SESSIONS = 100000
+
+# version, flags, turn, issued_at, current and previous health/score/xp, name length
+COOKIE_STRUCT = struct.Struct('>BBII6iB')
+FLAG_HAS_STATS = 1
+
+class InvalidSessionCookie(ValueError):
+    """Raised when a state cookie is malformed, forged, expired or replayed"""
+
+def _signing_key() -> bytes:
+    if not SESSION_COOKIE_SECRET:
+        raise ValueError("SESSION_COOKIE_SECRET must be set to use cookie sessions")
+    return SESSION_COOKIE_SECRET.encode()
+
+def _sign(session_id: str, payload: bytes) -> bytes:
+    """Signature binding the payload to the session it was issued for"""
+    message = session_id.encode() + b'\0' + payload
+    return hmac.new(_signing_key(), message, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+def encode_state_cookie(session_id: str, state: GameState, turn: int) -> str:
+    """Serialize a game state into a compact signed cookie value"""
+    name = (state.player_name or '').encode()[:MAX_NAME_BYTES].decode(errors='ignore').encode()
+    flags = FLAG_HAS_STATS if state.has_stats else 0
+    payload = COOKIE_STRUCT.pack(
+        SESSION_COOKIE_VERSION, flags, turn, int(time.time()),
+        state.health or 0, state.score, state.xp,
+        state.previous_health or 0, state.previous_score, state.previous_xp,
+        len(name)
+    ) + name
+    return base64.urlsafe_b64encode(payload + _sign(session_id, payload)).rstrip(b'=').decode()
+
+def decode_state_cookie(session_id: str, value: str, max_age: float) -> tuple[GameState, int]:
+    """Verify a state cookie and return (state, turn)"""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    except (ValueError, TypeError) as e:
+        raise InvalidSessionCookie(f"Malformed state cookie: {e}")
+    payload, signature = raw[:-SIGNATURE_BYTES], raw[-SIGNATURE_BYTES:]
+    if len(payload) < COOKIE_STRUCT.size or not hmac.compare_digest(signature, _sign(session_id, payload)):
+        raise InvalidSessionCookie("Bad state cookie signature")
+    (version, flags, turn, issued_at, health, score, xp, previous_health, previous_score,
+     previous_xp, name_length) = COOKIE_STRUCT.unpack_from(payload)
+    if version != SESSION_COOKIE_VERSION:
+        raise InvalidSessionCookie(f"Unsupported state cookie version {version}")
+    if time.time() - issued_at > max_age:
+        raise InvalidSessionCookie("State cookie expired")
+    name = payload[COOKIE_STRUCT.size:COOKIE_STRUCT.size + name_length].decode()
+    state = GameState(name or None)
+    if flags & FLAG_HAS_STATS:
+        state.health, state.score, state.xp = health, score, xp
+        state.previous_health, state.previous_score, state.previous_xp = (
+            previous_health, previous_score, previous_xp)
+    return state, turn
+
+class TurnTracker:
+    """Highest turn seen per session, used to reject replayed cookies
+
+    The tracker is per worker, so it stops replays of older turns against a
+    worker that has already served a newer one; the cookie max age bounds
+    what remains possible across workers. New turns are numbered past both
+    the cookie's turn and the highest one seen, so a player whose replayed
+    cookie was rejected can carry on from the fresh cookie they are given.
+    """
+
+    def __init__(self, max_sessions: int = MAX_TRACKED_SESSIONS):
+        self.max_sessions = max_sessions
+        self._turns: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, session_id: str, turn: int) -> None:
+        if turn < self._turns.get(session_id, 0):
+            raise InvalidSessionCookie(f"Replayed state cookie for turn {turn}")
+        self.record(session_id, turn)
+
+    def record(self, session_id: str, turn: int) -> None:
+        with self._lock:
+            self._store(session_id, max(turn, self._turns.get(session_id, 0)))
+
+    def issue(self, session_id: str, turn: int) -> int:
+        """Record and return the turn after both turn and the highest seen for the session"""
+        with self._lock:
+            turn = max(turn, self._turns.get(session_id, 0)) + 1
+            self._store(session_id, turn)
+            return turn
+
+    def _store(self, session_id: str, turn: int) -> None:
+        self._turns[session_id] = turn
+        self._turns.move_to_end(session_id)
+        if len(self._turns) > self.max_sessions:
+            self._turns.popitem(last=False)
+
+    def last_turn(self, session_id: str) -> Optional[int]:
+        return self._turns.get(session_id)
@@ -0,0 +1,275 @@
+import glob
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from game_state import GameState
+from session_store import (DATA_DIR, SESSION_BACKEND, SESSION_DB_PATH, SESSION_LIFETIME,
+                           SQLiteSessionBackend, SharedMemorySessionBackend)
+
+# Snapshot file settings
+SESSION_SNAPSHOT_PATH = os.environ.get('SESSION_SNAPSHOT_PATH',
+                                       os.path.join(DATA_DIR, 'sessions.snapshot'))
+SNAPSHOT_MAGIC = b'GSNP'
+SNAPSHOT_VERSION = 1
+KEY_SIZE = 32
+
+# magic, version, key size, session count
+HEADER_STRUCT = struct.Struct('<4sHHQ')
+# padded session id, record offset
+INDEX_STRUCT = struct.Struct(f'<{KEY_SIZE}sQ')
+# saved_at, flags, current and previous health/score/xp, name length, session id length
+RECORD_STRUCT = struct.Struct('<IB6iHB')
+FLAG_HAS_STATS = 1
+
+SnapshotEntry = Tuple[str, GameState, int]
+
+def encode_record(state: GameState, saved_at: int) -> bytes:
+    name = (state.player_name or '').encode()
+    session_id = (state.session_id or '').encode()
+    flags = FLAG_HAS_STATS if state.has_stats else 0
+    return RECORD_STRUCT.pack(
+        saved_at, flags, state.health or 0, state.score, state.xp,
+        state.previous_health or 0, state.previous_score, state.previous_xp,
+        len(name), len(session_id)
+    ) + name + session_id
+
+def decode_record(buffer, offset: int) -> Tuple[GameState, int]:
+    """Decode the record at offset, returning (state, saved_at)"""
+    (saved_at, flags, health, score, xp, previous_health, previous_score, previous_xp,
+     name_length, session_id_length) = RECORD_STRUCT.unpack_from(buffer, offset)
+    start = offset + RECORD_STRUCT.size
+    name = bytes(buffer[start:start + name_length]).decode()
+    start += name_length
+    session_id = bytes(buffer[start:start + session_id_length]).decode()
+    state = GameState(name or None, session_id or None)
+    if flags & FLAG_HAS_STATS:
+        state.health, state.score, state.xp = health, score, xp
+        state.previous_health, state.previous_score, state.previous_xp = (
+            previous_health, previous_score, previous_xp)
+    return state, saved_at
+
+def write_snapshot(path: str, entries: Iterable[SnapshotEntry]) -> int:
+    """Write sessions to a snapshot file atomically, returning how many were written
+
+    Layout: header, then an index of fixed-width session ids sorted for
+    binary search, then the packed records the index points at.
+    """
+    keyed = sorted((session_id.encode(), state, saved_at) for session_id, state, saved_at in entries
+                   if len(session_id.encode()) <= KEY_SIZE)
+    records_offset = HEADER_STRUCT.size + INDEX_STRUCT.size * len(keyed)
+    index = bytearray(HEADER_STRUCT.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, KEY_SIZE, len(keyed)))
+    records = bytearray()
+    for key, state, saved_at in keyed:
+        index += INDEX_STRUCT.pack(key, records_offset + len(records))
+        records += encode_record(state, saved_at)
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(temp_path, 'wb') as snapshot_file:
+        snapshot_file.write(index)
+        snapshot_file.write(records)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temp_path, path)
+    return len(keyed)
+
+class SessionSnapshot:
+    """Memory-mapped snapshot; records are only decoded when looked up"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as snapshot_file:
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+            # No record was saved after the file was written
+            self.written_at = os.fstat(snapshot_file.fileno()).st_mtime
+        magic, version, key_size, self.count = HEADER_STRUCT.unpack_from(self._map)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or key_size != KEY_SIZE:
+            self._map.close()
+            raise ValueError(f"Unsupported session snapshot: {path}")
+
+    def _find(self, session_id: str) -> Optional[int]:
+        """Binary search the index, returning the record offset"""
+        key = session_id.encode().ljust(KEY_SIZE, b'\0')
+        if len(key) > KEY_SIZE:
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = HEADER_STRUCT.size + middle * INDEX_STRUCT.size
+            middle_key = self._map[position:position + KEY_SIZE]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return INDEX_STRUCT.unpack_from(self._map, position)[1]
+        return None
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._find(session_id) is not None
+
+    def get(self, session_id: str, max_age: float = SESSION_LIFETIME) -> Optional[GameState]:
+        offset = self._find(session_id)
+        if offset is None:
+            return None
+        state, saved_at = decode_record(self._map, offset)
+        return state if time.time() - saved_at <= max_age else None
+
+    def entries(self) -> Iterator[SnapshotEntry]:
+        for position in range(HEADER_STRUCT.size, HEADER_STRUCT.size + self.count * INDEX_STRUCT.size,
+                              INDEX_STRUCT.size):
+            key, offset = INDEX_STRUCT.unpack_from(self._map, position)
+            state, saved_at = decode_record(self._map, offset)
+            yield key.rstrip(b'\0').decode(), state, saved_at
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+def open_snapshot(path: str = SESSION_SNAPSHOT_PATH) -> Optional[SessionSnapshot]:
+    """Map the snapshot at path if there is a readable one"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return SessionSnapshot(path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Ignoring session snapshot {path}: {e}")
+        return None
+
+class SnapshotRestoringStore:
+    """Session store that falls back to a snapshot for sessions it has not seen
+
+    Sessions are decoded from the snapshot on first access and copied into the
+    live store, so a restarted worker serves traffic immediately. Only ids in
+    the snapshot are remembered as superseded, and the snapshot and those ids
+    are dropped once every session in it has expired.
+    """
+
+    def __init__(self, store, snapshot: SessionSnapshot, max_age: float = SESSION_LIFETIME):
+        self.store = store
+        self.snapshot: Optional[SessionSnapshot] = snapshot
+        self.restored = 0
+        self._expires_at = snapshot.written_at + max_age
+        self._superseded: Set[str] = set()
+
+    def _live_snapshot(self) -> Optional[SessionSnapshot]:
+        """The snapshot while it may still hold an unexpired session"""
+        if self.snapshot is not None and time.time() > self._expires_at:
+            # Not closed: another thread may still be reading it
+            self.snapshot = None
+            self._superseded = set()
+        return self.snapshot
+
+    def _supersede(self, session_id: str) -> None:
+        snapshot = self._live_snapshot()
+        if snapshot is not None and session_id in snapshot:
+            self._superseded.add(session_id)
+
+    def get(self, session_id: str) -> Optional[GameState]:
+        state = self.store.get(session_id)
+        snapshot = self._live_snapshot()
+        if state is None and snapshot is not None and session_id not in self._superseded:
+            state = snapshot.get(session_id)
+            if state is not None:
+                self._superseded.add(session_id)
+                self.store.set(session_id, state)
+                self.restored += 1
+        return state
+
+    def set(self, session_id: str, state: GameState) -> None:
+        self._supersede(session_id)
+        self.store.set(session_id, state)
+
+    def delete(self, session_id: str) -> None:
+        self._supersede(session_id)
+        self.store.delete(session_id)
+
+    def items(self) -> Iterator[Tuple[str, GameState]]:
+        return self.store.items()
+
+    def saved_items(self) -> Iterator[SnapshotEntry]:
+        return self.store.saved_items()
+
+    def data_version(self) -> int:
+        return self.store.data_version()
+
+    def sweep(self) -> int:
+        return self.store.sweep()
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.store.stats()
+        stats['restored_sessions'] = self.restored
+        snapshot = self.snapshot
+        stats['snapshot_sessions'] = len(snapshot) if snapshot is not None else 0
+        stats['superseded_sessions'] = len(self._superseded)
+        return stats
+
+    def close(self) -> None:
+        close = getattr(self.store, 'close', None)
+        if close is not None:
+            close()
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+def restore_session_snapshot(store, path: str = SESSION_SNAPSHOT_PATH):
+    """Wrap store so sessions from the last snapshot are restored lazily"""
+    snapshot = open_snapshot(path)
+    return SnapshotRestoringStore(store, snapshot) if snapshot else store
+
+def store_entries(store) -> Iterator[SnapshotEntry]:
+    """Live sessions stamped with when each was last saved, so merges keep the newest copy"""
+    return store.saved_items()
+
+def merge_entries(sources: Iterable[Iterable[SnapshotEntry]],
+                  max_age: float = SESSION_LIFETIME) -> List[SnapshotEntry]:
+    """Keep the most recently saved copy of each unexpired session"""
+    cutoff = time.time() - max_age
+    merged: Dict[str, SnapshotEntry] = {}
+    for entries in sources:
+        for entry in entries:
+            if entry[2] >= cutoff and (entry[0] not in merged or merged[entry[0]][2] <= entry[2]):
+                merged[entry[0]] = entry
+    return list(merged.values())
+
+def save_session_snapshot(store, path: str = SESSION_SNAPSHOT_PATH) -> int:
+    """Snapshot a single-process store, keeping sessions not yet restored"""
+    previous = open_snapshot(path)
+    sources = [previous.entries()] if previous else []
+    sources.append(store_entries(store))
+    count = write_snapshot(path, merge_entries(sources))
+    if previous:
+        previous.close()
+    return count
+
+def save_worker_snapshot(store, path: str = SESSION_SNAPSHOT_PATH) -> int:
+    """Write this worker's live sessions to a part file merged later by the master"""
+    return write_snapshot(f"{path}.part-{os.getpid()}", store_entries(store))
+
+def shared_snapshot_source(backend: str = SESSION_BACKEND):
+    """Open the store every worker shared, or None for per-process backends"""
+    if backend in ('sqlite', 'writebehind'):
+        return SQLiteSessionBackend(SESSION_DB_PATH)
+    if backend == 'shm':
+        return SharedMemorySessionBackend()
+    return None
+
+def merge_worker_snapshots(path: str = SESSION_SNAPSHOT_PATH, backend: str = SESSION_BACKEND) -> int:
+    """Combine the previous snapshot, worker part files and the shared store into one file"""
+    previous = open_snapshot(path)
+    part_paths = glob.glob(f"{path}.part-*")
+    parts = [snapshot for snapshot in map(open_snapshot, part_paths) if snapshot]
+    sources = [snapshot.entries() for snapshot in ([previous] if previous else []) + parts]
+    shared_store = shared_snapshot_source(backend)
+    if shared_store is not None:
+        sources.append(store_entries(shared_store))
+    count = write_snapshot(path, merge_entries(sources))
+    for snapshot in ([previous] if previous else []) + parts:
+        snapshot.close()
+    for part_path in part_paths:
+        os.remove(part_path)
+    return count
@@ -0,0 +1,598 @@
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+from config import get_config
+from game_state import GameState
+
+# Session storage settings
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite')
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', os.path.join(DATA_DIR, 'sessions.db'))
+SHM_DIR = '/dev/shm'
+SESSION_SHM_PATH = os.environ.get('SESSION_SHM_PATH', os.path.join(SHM_DIR, 'game_sessions.db'))
+SESSION_CACHE_ENABLED = os.environ.get('SESSION_CACHE', 'true').lower() == 'true'
+
+# Session limits
+SESSION_CONFIG = get_config()['SESSIONS']
+SESSION_LIFETIME = int(os.environ.get('SESSION_LIFETIME', get_config()['SECURITY']['session_lifetime']))
+SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', SESSION_CONFIG['max_entries']))
+SESSION_MAX_BYTES = int(os.environ.get('SESSION_MAX_BYTES', SESSION_CONFIG['max_bytes']))
+SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', SESSION_CONFIG['sweep_interval']))
+SESSION_SHARDS = int(os.environ.get('SESSION_SHARDS', SESSION_CONFIG['shards']))
+SWEEP_BATCH_SIZE = 1000
+
+# Write-behind persistence
+SESSION_WRITE_BEHIND_PRIMARY = os.environ.get('SESSION_WRITE_BEHIND_PRIMARY', 'shm')
+SESSION_FLUSH_INTERVAL_MS = int(os.environ.get('SESSION_FLUSH_INTERVAL_MS', SESSION_CONFIG['flush_interval_ms']))
+SESSION_FLUSH_BATCH_SIZE = int(os.environ.get('SESSION_FLUSH_BATCH_SIZE', SESSION_CONFIG['flush_batch_size']))
+
+# What each BoundedSessionMap entry costs besides its state and key: the
+# [state, size, last used] list with its int and float, and the key's slots
+# in the dict and its OrderedDict link (32 bytes amortized, by tracemalloc)
+MAP_ENTRY_OVERHEAD = sys.getsizeof([None, None, None]) + sys.getsizeof(1 << 30) + sys.getsizeof(0.0) + 32
+
+def estimate_state_size(state: GameState) -> int:
+    """Approximate memory held by a session state and the values it references, in bytes"""
+    size = sys.getsizeof(state)
+    for name in GameState.__slots__:
+        value = getattr(state, name)
+        # None and small ints are shared by the interpreter
+        if value is not None and not (isinstance(value, int) and -5 <= value <= 256):
+            size += sys.getsizeof(value)
+    return size
+
+def estimate_entry_size(session_id: str, state: GameState) -> int:
+    """Approximate memory a BoundedSessionMap entry holds: the state, its key and the entry itself"""
+    size = estimate_state_size(state) + MAP_ENTRY_OVERHEAD
+    if session_id is not state.session_id:
+        size += sys.getsizeof(session_id)
+    return size
+
+class BoundedSessionMap:
+    """LRU map of session states with idle expiry and entry/byte limits
+
+    Entries are kept in access order, so idle sessions collect at the front
+    and every write only has to look at the oldest few to expire them.
+    """
+
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, max_bytes: int = SESSION_MAX_BYTES,
+                 ttl: float = SESSION_LIFETIME):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: 'OrderedDict[str, list]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[GameState]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if now - entry[2] > self.ttl:
+                self._remove(session_id)
+                self.expirations += 1
+                return None
+            entry[2] = now
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def set(self, session_id: str, state: GameState) -> None:
+        size = estimate_entry_size(session_id, state)
+        with self._lock:
+            self._remove(session_id)
+            self._entries[session_id] = [state, size, time.monotonic()]
+            self.total_bytes += size
+            self._expire_oldest(SWEEP_BATCH_SIZE)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._remove(session_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def sweep(self) -> int:
+        """Expire every idle session, returning how many were removed"""
+        with self._lock:
+            return self._expire_oldest(len(self._entries))
+
+    def _expire_oldest(self, limit: int) -> int:
+        cutoff = time.monotonic() - self.ttl
+        expired = 0
+        while expired < limit and self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry[2] >= cutoff:
+                break
+            self._remove(session_id)
+            expired += 1
+        self.expirations += expired
+        return expired
+
+    def _remove(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def items(self) -> Iterator[Tuple[str, GameState]]:
+        """Iterate over a point-in-time copy of the unexpired sessions"""
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            entries = [(session_id, entry[0]) for session_id, entry in self._entries.items()
+                       if entry[2] >= cutoff]
+        return iter(entries)
+
+    def saved_items(self) -> Iterator[Tuple[str, GameState, int]]:
+        """Like items(), with the Unix time each session was last used"""
+        now, clock = time.time(), time.monotonic()
+        cutoff = clock - self.ttl
+        with self._lock:
+            entries = [(session_id, entry[0], int(now - (clock - entry[2])))
+                       for session_id, entry in self._entries.items() if entry[2] >= cutoff]
+        return iter(entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'live_sessions': len(self._entries),
+            'bytes': self.total_bytes,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+UPSERT_SESSION_SQL = '''
+    INSERT INTO game_sessions (session_id, game_state, last_updated)
+    VALUES (?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(session_id) DO UPDATE SET
+        game_state = excluded.game_state,
+        last_updated = excluded.last_updated
+'''
+
+# Write-behind flushes carry the time each state was saved, to the millisecond;
+# a copy older than the stored row, queued by another worker, is not written
+SAVE_SESSION_SQL = '''
+    INSERT INTO game_sessions (session_id, game_state, last_updated)
+    VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%f', ?, 'unixepoch'))
+    ON CONFLICT(session_id) DO UPDATE SET
+        game_state = excluded.game_state,
+        last_updated = excluded.last_updated
+    WHERE excluded.last_updated >= game_sessions.last_updated
+'''
+
+def encode_state(state: GameState) -> str:
+    return json.dumps(state.to_dict(), separators=(',', ':'))
+
+class ShardedSessionMap:
+    """BoundedSessionMap split into independently locked shards
+
+    Threads working on different sessions usually hit different shards, so
+    they rarely wait on each other's locks. Limits are divided between shards.
+    """
+
+    def __init__(self, shards: int = SESSION_SHARDS, max_entries: int = SESSION_MAX_ENTRIES,
+                 max_bytes: int = SESSION_MAX_BYTES, ttl: float = SESSION_LIFETIME):
+        self._shards = tuple(BoundedSessionMap(max(1, max_entries // shards),
+                                               max(1, max_bytes // shards), ttl)
+                             for _ in range(shards))
+        self._shard_count = shards
+
+    def get(self, session_id: str) -> Optional[GameState]:
+        return self._shards[hash(session_id) % self._shard_count].get(session_id)
+
+    def set(self, session_id: str, state: GameState) -> None:
+        self._shards[hash(session_id) % self._shard_count].set(session_id, state)
+
+    def delete(self, session_id: str) -> None:
+        self._shards[hash(session_id) % self._shard_count].delete(session_id)
+
+    def clear(self) -> None:
+        for shard in self._shards:
+            shard.clear()
+
+    def sweep(self) -> int:
+        return sum(shard.sweep() for shard in self._shards)
+
+    def items(self) -> Iterator[Tuple[str, GameState]]:
+        for shard in self._shards:
+            yield from shard.items()
+
+    def saved_items(self) -> Iterator[Tuple[str, GameState, int]]:
+        for shard in self._shards:
+            yield from shard.saved_items()
+
+    def stats(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for shard in self._shards:
+            for key, value in shard.stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+class MemorySessionBackend:
+    """Per-process session storage (single worker or development only)"""
+
+    def __init__(self):
+        self._states = ShardedSessionMap()
+
+    def get(self, session_id: str) -> Optional[GameState]:
+        return self._states.get(session_id)
+
+    def set(self, session_id: str, state: GameState) -> None:
+        self._states.set(session_id, state)
+
+    def delete(self, session_id: str) -> None:
+        self._states.delete(session_id)
+
+    def data_version(self) -> int:
+        """Memory storage is never changed by another process"""
+        return 0
+
+    def items(self) -> Iterator[Tuple[str, GameState]]:
+        return self._states.items()
+
+    def saved_items(self) -> Iterator[Tuple[str, GameState, int]]:
+        return self._states.saved_items()
+
+    def sweep(self) -> int:
+        return self._states.sweep()
+
+    def stats(self) -> Dict[str, int]:
+        return self._states.stats()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+class SQLiteSessionBackend:
+    """Session storage in a WAL-mode SQLite file shared by all workers"""
+
+    synchronous = 'NORMAL'
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._connection().execute('''
+            CREATE TABLE IF NOT EXISTS game_sessions
+            (session_id TEXT PRIMARY KEY,
+             game_state TEXT NOT NULL,
+             last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP) WITHOUT ROWID
+        ''')
+        self._connection().execute('''
+            CREATE INDEX IF NOT EXISTS idx_game_sessions_last_updated
+            ON game_sessions (last_updated)
+        ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, session_id: str) -> Optional[GameState]:
+        row = self._connection().execute(
+            'SELECT game_state FROM game_sessions WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        return GameState.from_dict(json.loads(row[0])) if row else None
+
+    def set(self, session_id: str, state: GameState) -> None:
+        self._connection().execute(UPSERT_SESSION_SQL, (session_id, encode_state(state)))
+
+    def set_many(self, states: Dict[str, Tuple[GameState, float]]) -> None:
+        """Write many (state, Unix time saved) sessions in a single transaction
+
+        A session whose stored copy was saved later is left as it is.
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(SAVE_SESSION_SQL, ((session_id, encode_state(state), saved_at)
+                                                for session_id, (state, saved_at) in states.items()))
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+
+    def delete(self, session_id: str) -> None:
+        self._connection().execute(
+            'DELETE FROM game_sessions WHERE session_id = ?', (session_id,)
+        )
+
+    def items(self) -> Iterator[Tuple[str, GameState]]:
+        rows = self._connection().execute('SELECT session_id, game_state FROM game_sessions')
+        for session_id, game_state in rows:
+            yield session_id, GameState.from_dict(json.loads(game_state))
+
+    def saved_items(self) -> Iterator[Tuple[str, GameState, int]]:
+        """Like items(), with the Unix time each session was last saved"""
+        rows = self._connection().execute('''
+            SELECT session_id, game_state, COALESCE(CAST(strftime('%s', last_updated) AS INTEGER), 0)
+            FROM game_sessions
+        ''')
+        for session_id, game_state, saved_at in rows:
+            yield session_id, GameState.from_dict(json.loads(game_state)), saved_at
+
+    def data_version(self) -> int:
+        """Counter that changes whenever another connection commits"""
+        return self._connection().execute('PRAGMA data_version').fetchone()[0]
+
+    def sweep(self, ttl: float = SESSION_LIFETIME) -> int:
+        """Delete sessions idle for longer than ttl seconds, in small batches"""
+        conn = self._connection()
+        removed = 0
+        while True:
+            deleted = conn.execute('''
+                DELETE FROM game_sessions WHERE session_id IN (
+                    SELECT session_id FROM game_sessions
+                    WHERE last_updated < datetime('now', ?)
+                    LIMIT ?)
+            ''', (f'-{int(ttl)} seconds', SWEEP_BATCH_SIZE)).rowcount
+            removed += deleted
+            if deleted < SWEEP_BATCH_SIZE:
+                return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {'live_sessions': len(self)}
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM game_sessions').fetchone()[0]
+
+class SharedMemorySessionBackend(SQLiteSessionBackend):
+    """SQLite session storage on tmpfs, shared by workers on the same host
+
+    Sessions survive worker restarts but not a host reboot, so fsync is skipped.
+    Without the tmpfs directory the file goes in DATA_DIR instead, never at
+    SESSION_DB_PATH, where the write-behind store keeps its durable copy.
+    """
+
+    synchronous = 'OFF'
+
+    def __init__(self, path: str = SESSION_SHM_PATH):
+        if not os.path.isdir(os.path.dirname(path)):
+            fallback = os.path.join(DATA_DIR, os.path.basename(path))
+            print(f"{os.path.dirname(path)} does not exist; keeping shared-memory sessions in {fallback}")
+            path = fallback
+        if os.path.abspath(path) == os.path.abspath(SESSION_DB_PATH):
+            raise ValueError(f"Shared-memory sessions cannot share SESSION_DB_PATH: {path}")
+        super().__init__(path)
+
+class ReadThroughCache:
+    """In-process cache in front of a shared backend
+
+    Entries stay valid until another process commits to the backend, which is
+    detected through the backend's data_version counter. That counter is per
+    connection and the backend keeps one connection per thread, so each
+    thread compares against the value it last saw itself.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._states = ShardedSessionMap()
+        self._seen = threading.local()
+
+    def _validate(self) -> None:
+        version = self.backend.data_version()
+        seen = self._seen
+        if getattr(seen, 'pid', None) != os.getpid() or version != seen.version:
+            # A thread's first look cannot tell what changed before it either
+            self._states.clear()
+            seen.pid, seen.version = os.getpid(), version
+
+    def get(self, session_id: str) -> Optional[GameState]:
+        self._validate()
+        state = self._states.get(session_id)
+        if state is None:
+            state = self.backend.get(session_id)
+            if state is not None:
+                self._states.set(session_id, state)
+        return state
+
+    def set(self, session_id: str, state: GameState) -> None:
+        self._validate()
+        self.backend.set(session_id, state)
+        self._states.set(session_id, state)
+
+    def delete(self, session_id: str) -> None:
+        self.backend.delete(session_id)
+        self._states.delete(session_id)
+
+    def items(self) -> Iterator[Tuple[str, GameState]]:
+        return self.backend.items()
+
+    def saved_items(self) -> Iterator[Tuple[str, GameState, int]]:
+        return self.backend.saved_items()
+
+    def data_version(self) -> int:
+        return self.backend.data_version()
+
+    def sweep(self) -> int:
+        self._states.sweep()
+        return self.backend.sweep()
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.backend.stats()
+        stats.update({f'cache_{key}': value for key, value in self._states.stats().items()})
+        return stats
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+class WriteBehindSessionBackend:
+    """Fast primary store with batched, asynchronous copies to a durable file
+
+    Saves go to the primary store immediately and are queued; a flusher thread
+    writes queued sessions to the durable SQLite file in one transaction every
+    flush_interval_ms, or sooner once flush_batch_size sessions are waiting.
+    Sessions missing from the primary store are reloaded from the durable copy.
+    Each queued state keeps the time it was saved, so when several workers
+    queue the same session the durable copy ends up with the newest one.
+    """
+
+    def __init__(self, primary, durable: SQLiteSessionBackend,
+                 flush_interval_ms: int = SESSION_FLUSH_INTERVAL_MS,
+                 flush_batch_size: int = SESSION_FLUSH_BATCH_SIZE):
+        self.primary = primary
+        self.durable = durable
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_batch_size = flush_batch_size
+        self.flushes = 0
+        self.flushed_sessions = 0
+        self._dirty: Dict[str, Tuple[GameState, float]] = {}
+        self._lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the background flusher and flush again at interpreter exit"""
+        self._flusher = threading.Thread(target=self._flush_forever, name='session-flusher',
+                                         daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def get(self, session_id: str) -> Optional[GameState]:
+        state = self.primary.get(session_id)
+        if state is None:
+            with self._lock:
+                queued = self._dirty.get(session_id)
+            state = queued[0] if queued else None
+            if state is None:
+                state = self.durable.get(session_id)
+            if state is not None:
+                self.primary.set(session_id, state)
+        return state
+
+    def set(self, session_id: str, state: GameState) -> None:
+        self.primary.set(session_id, state)
+        with self._lock:
+            self._dirty[session_id] = (state, time.time())
+            pending = len(self._dirty)
+        if pending >= self.flush_batch_size:
+            self._flush_requested.set()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._dirty.pop(session_id, None)
+        self.primary.delete(session_id)
+        self.durable.delete(session_id)
+
+    def flush(self) -> int:
+        """Write every queued session to the durable store, returning the count"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        try:
+            self.durable.set_many(dirty)
+        except sqlite3.Error:
+            with self._lock:
+                dirty.update(self._dirty)
+                self._dirty = dirty
+            raise
+        self.flushes += 1
+        self.flushed_sessions += len(dirty)
+        return len(dirty)
+
+    def _flush_forever(self) -> None:
+        while not self._stopped.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Session flush failed: {e}")
+
+    def close(self) -> None:
+        """Stop the flusher and write out anything still queued"""
+        self._stopped.set()
+        self._flush_requested.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def items(self) -> Iterator[Tuple[str, GameState]]:
+        return self.primary.items()
+
+    def saved_items(self) -> Iterator[Tuple[str, GameState, int]]:
+        return self.primary.saved_items()
+
+    def data_version(self) -> int:
+        return self.primary.data_version()
+
+    def sweep(self) -> int:
+        self.primary.sweep()
+        return self.durable.sweep()
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.primary.stats()
+        with self._lock:
+            stats['pending_writes'] = len(self._dirty)
+        stats['flushes'] = self.flushes
+        stats['flushed_sessions'] = self.flushed_sessions
+        return stats
+
+    def __len__(self) -> int:
+        return len(self.primary)
+
+SESSION_BACKENDS = {
+    'memory': MemorySessionBackend,
+    'sqlite': SQLiteSessionBackend,
+    'shm': SharedMemorySessionBackend
+}
+
+def create_session_store(backend: str = SESSION_BACKEND, cache: bool = SESSION_CACHE_ENABLED):
+    """Create the configured session store"""
+    if backend == 'writebehind':
+        primary = create_session_store(SESSION_WRITE_BEHIND_PRIMARY, cache)
+        store = WriteBehindSessionBackend(primary, SQLiteSessionBackend(SESSION_DB_PATH))
+        store.start()
+        return store
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"Unknown session backend: {backend}")
+    store = SESSION_BACKENDS[backend]()
+    if cache and backend != 'memory':
+        store = ReadThroughCache(store)
+    return store
+
+def close_session_store(store) -> None:
+    """Flush and stop background work for stores that have any"""
+    close = getattr(store, 'close', None)
+    if close is not None:
+        close()
+
+def start_session_sweeper(store, interval: float = SESSION_SWEEP_INTERVAL) -> threading.Thread:
+    """Expire idle sessions from a daemon thread every interval seconds"""
+    def sweep_forever():
+        while True:
+            time.sleep(interval)
+            try:
+                store.sweep()
+            except sqlite3.Error as e:
+                print(f"Session sweep failed: {e}")
+
+    sweeper = threading.Thread(target=sweep_forever, name='session-sweeper', daemon=True)
+    sweeper.start()
+    return sweeper
@@ -0,0 +1,71 @@
+"""Bulk leaderboard imports: row normalization, rejected rows and ranking what was kept
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import sqlite3
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import database
+import leaderboard_boards
+from db_migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+class TestLeaderboardRow(unittest.TestCase):
+    def test_missing_score_and_xp_count_as_zero(self) -> None:
+        self.assertEqual(database._leaderboard_row(('hero', None, '', 'DIED', None)),
+                         ('hero', 0, 0, 'DIED', None, None))
+
+    def test_numeric_strings_become_integers(self) -> None:
+        self.assertEqual(database._leaderboard_row(('hero', '12', '30', 'DIED', '-5', '')),
+                         ('hero', 12, 30, 'DIED', -5, None))
+
+    def test_dates_are_stored_as_utc_timestamps(self) -> None:
+        for value in ('2025-01-03T10:00:00Z', '2025-01-03 12:00:00+02:00', '2025-01-03 10:00:00',
+                      datetime(2025, 1, 3, 5, tzinfo=timezone(timedelta(hours=-5)))):
+            self.assertEqual(database._leaderboard_row(('hero', 1, 1, 'DIED', 1, value))[5],
+                             '2025-01-03 10:00:00')
+
+    def test_unreadable_values_are_rejected(self) -> None:
+        for row in (('hero', 'ten', 1, 'DIED', 1), ('hero', 1, 1.5j, 'DIED', 1),
+                    ('hero', 1, 1, 'DIED', 'full'), ('hero', 1, 1, 'DIED', 1, 'yesterday')):
+            self.assertRaises(ValueError, database._leaderboard_row, row)
+
+class TestAddToLeaderboardMany(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Importing into an in-memory database")
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        migrate(self.conn)
+        self.conn.isolation_level = ''
+        patcher = patch.object(database, 'get_connection', return_value=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        leaderboard_boards.invalidate()
+        self.addCleanup(leaderboard_boards.invalidate)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+
+    def test_rows_are_normalized_and_ranked(self) -> None:
+        written = database.add_to_leaderboard_many([('alice', '50', '120', 'DIED', '0', '2025-01-01T10:00:00Z'),
+                                                    ('alice', 80, 200, 'Perfect Victory', 90),
+                                                    ('bob', None, None, 'DIED', None)], chunk_size=2)
+        self.assertEqual(written, 3)
+        self.assertEqual(self.conn.execute('''
+            SELECT score, xp, date FROM leaderboard WHERE id = 1
+        ''').fetchone(), (50, 120, '2025-01-01 10:00:00'))
+        self.assertEqual(self.conn.execute('''
+            SELECT player_name, xp FROM player_best ORDER BY xp DESC
+        ''').fetchall(), [('alice', 200), ('bob', 0)])
+
+    def test_rejected_row_keeps_and_ranks_earlier_chunks(self) -> None:
+        rows = [('alice', 10, 10, 'DIED', 1), ('bob', 20, 20, 'DIED', 1), ('carol', 'lots', 30, 'DIED', 1)]
+        self.assertRaises(ValueError, database.add_to_leaderboard_many, rows, 2)
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM leaderboard').fetchone()[0], 2)
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM player_best').fetchone()[0], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Schema migrations on a fresh database, on the baseline schema step by step, and run twice
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import sqlite3
+import unittest
+from typing import List
+from unittest.mock import patch
+
+import db_migrations
+from db_migrations import LATEST_VERSION, MIGRATIONS, get_schema_version, migrate
+
+logger = logging.getLogger(__name__)
+
+def create_baseline(conn: sqlite3.Connection) -> None:
+    """The tables init_db created before migrations existed, at user_version 0"""
+    for statement in MIGRATIONS[0][2]:
+        conn.execute(statement)
+
+def schema(conn: sqlite3.Connection) -> List[tuple]:
+    return conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY type, name').fetchall()
+
+def columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+class TestDbMigrations(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Opening an in-memory database")
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+
+    def fill_baseline(self) -> None:
+        create_baseline(self.conn)
+        self.conn.executemany('''
+            INSERT INTO leaderboard (player_name, score, xp, victory_type, health, date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [('alice', 50, 120, 'DIED', 0, '2025-01-01 10:00:00'),
+              ('alice', 80, 200, 'Perfect Victory', 90, '2025-01-02 10:00:00'),
+              ('bob', None, None, 'DIED', None, '2025-01-03T10:00:00Z'),
+              (None, 10, 10, 'DIED', 5, None)])
+        self.conn.execute('''
+            INSERT INTO regional_stats (region_key, country, region, total_games, action_fight)
+            VALUES ('us-ca', 'US', 'CA', 7, 3)
+        ''')
+
+    def test_fresh_database_reaches_latest_version(self) -> None:
+        applied = migrate(self.conn)
+        self.assertEqual(applied, len(MIGRATIONS))
+        self.assertEqual(get_schema_version(self.conn), LATEST_VERSION)
+        tables = {row[1] for row in schema(self.conn) if row[0] == 'table'}
+        for table in ('leaderboard', 'users', 'player_best', 'leaderboard_boards',
+                      'regional_counters', 'regional_players'):
+            self.assertIn(table, tables)
+
+    def test_baseline_upgrades_through_every_version(self) -> None:
+        self.fill_baseline()
+        self.assertEqual(get_schema_version(self.conn), 0)
+        for version, description, _ in MIGRATIONS:
+            logger.debug(f"Migrating to {version} ({description})")
+            self.assertEqual(migrate(self.conn, version), 1)
+            self.assertEqual(get_schema_version(self.conn), version)
+            self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM leaderboard').fetchone()[0], 4)
+            self.assertEqual(self.conn.execute('PRAGMA integrity_check').fetchone()[0], 'ok')
+
+    def test_baseline_rows_survive_upgrade(self) -> None:
+        self.fill_baseline()
+        migrate(self.conn)
+        self.assertEqual(self.conn.execute('''
+            SELECT score, xp, date FROM leaderboard WHERE player_name = 'bob'
+        ''').fetchone(), (0, 0, '2025-01-03 10:00:00'))
+        self.assertEqual(self.conn.execute('''
+            SELECT player_name, xp FROM player_best ORDER BY player_name
+        ''').fetchall(), [('alice', 200), ('bob', 0)])
+        self.assertEqual(dict(self.conn.execute('''
+            SELECT metric, count FROM regional_counters WHERE region_key = 'us-ca' AND bucket = 'all'
+        ''').fetchall()), {'total_games': 7, 'action_fight': 3})
+        self.assertNotIn('total_games', columns(self.conn, 'regional_stats'))
+
+    def test_upgrade_ranks_history_once_per_player(self) -> None:
+        self.fill_baseline()
+        migrate(self.conn)
+        self.assertEqual(self.conn.execute('''
+            SELECT player_name, xp FROM leaderboard_boards
+            WHERE span = 'all' AND outcome = '*'
+            ORDER BY xp DESC, score DESC, entry_id
+        ''').fetchall(), [('alice', 200), ('bob', 0)])
+
+    def test_upgrade_keeps_only_read_indexes_on_history(self) -> None:
+        self.fill_baseline()
+        migrate(self.conn)
+        self.assertEqual([row[1] for row in self.conn.execute('PRAGMA index_list(leaderboard)')],
+                         ['idx_leaderboard_date'])
+
+    def test_rerun_on_current_database_changes_nothing(self) -> None:
+        migrate(self.conn)
+        before = schema(self.conn)
+        self.assertEqual(migrate(self.conn), 0)
+        self.assertEqual(schema(self.conn), before)
+        self.assertEqual(get_schema_version(self.conn), LATEST_VERSION)
+
+    def test_lower_target_than_current_applies_nothing(self) -> None:
+        migrate(self.conn)
+        self.assertEqual(migrate(self.conn, 1), 0)
+        self.assertEqual(get_schema_version(self.conn), LATEST_VERSION)
+
+    def test_failing_migration_rolls_back_the_run(self) -> None:
+        broken = MIGRATIONS + [(LATEST_VERSION + 1, 'Broken', ('CREATE TABLE extra (id INTEGER)',
+                                                               'SELECT * FROM missing_table'))]
+        with patch.object(db_migrations, 'MIGRATIONS', broken):
+            self.assertRaises(sqlite3.OperationalError, migrate, self.conn, LATEST_VERSION + 1)
+        self.assertEqual(get_schema_version(self.conn), 0)
+        self.assertEqual(schema(self.conn), [])
+
+if __name__ == '__main__':
+    unittest.main()
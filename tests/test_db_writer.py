@@ -0,0 +1,97 @@
+"""Background writer: savepoints per mutation, rollback callbacks and surviving a failed connect
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+from typing import List
+
+from db_writer import DatabaseWriter
+
+logger = logging.getLogger(__name__)
+
+def insert_score(conn: sqlite3.Connection, score: int) -> int:
+    return conn.execute('INSERT INTO scores (score) VALUES (?) RETURNING id', (score,)).fetchone()[0]
+
+def insert_then_fail(conn: sqlite3.Connection, score: int) -> None:
+    insert_score(conn, score)
+    raise sqlite3.IntegrityError('rejected')
+
+class TestDatabaseWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Creating a temporary database for the writer")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'writer.db')
+        with sqlite3.connect(self.path) as conn:
+            conn.execute('CREATE TABLE scores (id INTEGER PRIMARY KEY, score INTEGER)')
+        conn.close()
+        self.rollbacks = 0
+        self.connect_errors: List[Exception] = []
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connect_errors:
+            raise self.connect_errors.pop(0)
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def on_rollback(self) -> None:
+        self.rollbacks += 1
+
+    def writer(self) -> DatabaseWriter:
+        writer = DatabaseWriter(self.connect, on_rollback=self.on_rollback, timeout=5)
+        self.addCleanup(writer.close)
+        return writer
+
+    def scores(self) -> List[int]:
+        with sqlite3.connect(self.path) as conn:
+            rows = [row[0] for row in conn.execute('SELECT score FROM scores ORDER BY id')]
+        conn.close()
+        return rows
+
+    def test_failed_mutation_rolls_back_alone(self) -> None:
+        writer = self.writer()
+        # Queued before the thread starts, so all three share one transaction
+        futures = [writer.submit(insert_score, 1), writer.submit(insert_then_fail, 2),
+                   writer.submit(insert_score, 3)]
+        writer.start()
+        self.assertEqual(futures[0].result(5), 1)
+        self.assertIsInstance(futures[1].exception(5), sqlite3.IntegrityError)
+        self.assertEqual(futures[2].result(5), 2)
+        self.assertEqual(self.scores(), [1, 3])
+        self.assertEqual(writer.commits, 1)
+
+    def test_rollback_callback_runs_per_failed_mutation(self) -> None:
+        writer = self.writer()
+        writer.start()
+        writer.submit(insert_then_fail, 1).exception(5)
+        writer.submit(insert_score, 2).result(5)
+        self.assertEqual(self.rollbacks, 1)
+
+    def test_failed_connect_fails_batch_and_next_batch_reconnects(self) -> None:
+        self.connect_errors.append(sqlite3.OperationalError('unable to open database file'))
+        writer = self.writer()
+        writer.start()
+        self.assertIsInstance(writer.submit(insert_score, 1).exception(5), sqlite3.OperationalError)
+        self.assertEqual(writer.submit(insert_score, 2).result(5), 1)
+        self.assertEqual(self.scores(), [2])
+
+    def test_broken_rollback_callback_does_not_stop_writer(self) -> None:
+        writer = DatabaseWriter(self.connect, on_rollback=lambda: 1 / 0, timeout=5)
+        self.addCleanup(writer.close)
+        writer.start()
+        self.assertIsInstance(writer.submit(insert_then_fail, 1).exception(5), ZeroDivisionError)
+        self.assertEqual(writer.submit(insert_score, 2).result(5), 1)
+
+    def test_close_commits_queued_writes(self) -> None:
+        writer = self.writer()
+        writer.start()
+        for score in range(5):
+            writer.submit(insert_score, score)
+        writer.close()
+        self.assertEqual(self.scores(), list(range(5)))
+
+if __name__ == '__main__':
+    unittest.main()
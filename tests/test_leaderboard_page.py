@@ -0,0 +1,90 @@
+"""Leaderboard API pages, filtered and not, checked against a brute-force ranking of every entry
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import random
+import sqlite3
+import unittest
+from typing import List, Optional
+from unittest.mock import patch
+
+import database
+import leaderboard_boards
+from db_migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+PLAYERS = ('alice', 'bob', 'carol', 'dave', 'erin', 'frank', None)
+OUTCOMES = ('DIED', 'Standard Victory', 'Perfect Victory')
+
+class TestLeaderboardPage(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Ranking seeded entries in an in-memory database")
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        migrate(self.conn)
+        for name in ('get_connection', 'get_read_connection'):
+            patcher = patch.object(database, name, return_value=self.conn)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        leaderboard_boards.invalidate()
+        self.addCleanup(leaderboard_boards.invalidate)
+        rng = random.Random(22)
+        # Few distinct scores so ties fall back to the oldest entry
+        self.conn.executemany('''
+            INSERT INTO leaderboard (player_name, score, xp, victory_type, health, date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(rng.choice(PLAYERS), rng.randrange(5), rng.randrange(5), rng.choice(OUTCOMES),
+               rng.randrange(101), f'2025-01-{rng.randrange(1, 29):02d} 12:00:00')
+              for _ in range(300)])
+        database.rank_new_entries(0, 64)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+
+    def brute_force(self, victory_type: Optional[str] = None, since: Optional[str] = None,
+                    until: Optional[str] = None) -> List[tuple]:
+        """Each player's best matching entry, ranked, from a plain scan of every entry"""
+        best = {}
+        for row in self.conn.execute(f"SELECT {', '.join(database.LEADERBOARD_PAGE_COLUMNS)} FROM leaderboard"):
+            entry_id, player_name, score, xp, outcome, health, date = row
+            if (player_name is None or victory_type not in (None, outcome)
+                    or (since is not None and date < since) or (until is not None and date >= until)):
+                continue
+            key = (-xp, -score, entry_id)
+            if player_name not in best or key < best[player_name][0]:
+                best[player_name] = (key, row)
+        return [row for _, row in sorted(best.values())]
+
+    def all_pages(self, **filters) -> List[tuple]:
+        rows, after = [], None
+        while True:
+            page = database.get_leaderboard_page(2, after, **filters).fetchall()
+            rows.extend(page)
+            if len(page) < 2:
+                return rows
+            after = (page[-1][3], page[-1][2], page[-1][0])
+
+    def test_unfiltered_pages_rank_overall_bests(self) -> None:
+        self.assertEqual(self.all_pages(), self.brute_force())
+
+    def test_outcome_pages_rank_best_of_that_outcome(self) -> None:
+        for outcome in OUTCOMES:
+            self.assertEqual(self.all_pages(victory_type=outcome), self.brute_force(outcome))
+
+    def test_date_pages_rank_best_within_window(self) -> None:
+        window = {'since': '2025-01-08 00:00:00', 'until': '2025-01-15 00:00:00'}
+        self.assertEqual(self.all_pages(**window), self.brute_force(**window))
+        self.assertEqual(self.all_pages(since=window['since']), self.brute_force(since=window['since']))
+
+    def test_outcome_and_date_pages_combine(self) -> None:
+        filters = {'victory_type': 'DIED', 'since': '2025-01-10 00:00:00'}
+        self.assertEqual(self.all_pages(**filters), self.brute_force(**filters))
+
+    def test_single_inserts_keep_outcome_bests(self) -> None:
+        database._insert_leaderboard_entry(self.conn, 'alice', 99, 99, 'DIED', 1)
+        database._insert_leaderboard_entry(self.conn, None, 100, 100, 'DIED', 1)
+        self.assertEqual(self.all_pages(victory_type='DIED'), self.brute_force('DIED'))
+
+if __name__ == '__main__':
+    unittest.main()
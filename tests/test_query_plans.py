@@ -0,0 +1,80 @@
+"""EXPLAIN QUERY PLAN checks that leaderboard and magic link lookups are served by their indexes
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import sqlite3
+import unittest
+from typing import Iterable
+from unittest.mock import patch
+
+import database
+import leaderboard_boards
+from db_migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+def plan_text(rows: Iterable[tuple]) -> str:
+    """Join the detail column of EXPLAIN QUERY PLAN rows"""
+    return ' | '.join(row[3] for row in rows)
+
+class ExplainingConnection:
+    """Stands in for a connection, returning each query's plan instead of its rows"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        return self.conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)
+
+class TestQueryPlans(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Migrating an in-memory database")
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        migrate(self.conn)
+        self.explaining = ExplainingConnection(self.conn)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+
+    def page_plan(self, *args, **kwargs) -> str:
+        with patch.object(database, 'get_read_connection', return_value=self.explaining):
+            return plan_text(database.get_leaderboard_page(*args, **kwargs))
+
+    def test_top_leaderboard_reads_covering_rank_index(self) -> None:
+        plan = plan_text(self.explaining.execute(database.STATEMENTS['get_leaderboard'], (10,)))
+        self.assertIn('SCAN player_best USING COVERING INDEX idx_player_best_rank', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_magic_link_lookup_uses_partial_token_index(self) -> None:
+        plan = plan_text(self.explaining.execute(
+            'SELECT email, magic_link_expiry FROM users WHERE magic_link_token = ?', ('token',)))
+        self.assertIn('SEARCH users USING COVERING INDEX idx_users_magic_link_token', plan)
+
+    def test_first_page_walks_rank_index_in_order(self) -> None:
+        plan = self.page_plan(50)
+        self.assertIn('COVERING INDEX idx_player_best_rank', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_later_page_seeks_past_cursor(self) -> None:
+        plan = self.page_plan(50, (100, 50, 1000))
+        self.assertIn('SEARCH player_best USING COVERING INDEX idx_player_best_rank', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_outcome_page_seeks_outcome_best_index(self) -> None:
+        plan = self.page_plan(50, (100, 50, 1000), victory_type='DIED')
+        self.assertIn('SEARCH player_outcome_best USING COVERING INDEX idx_player_outcome_best_page', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_date_filtered_page_reads_only_its_window(self) -> None:
+        plan = self.page_plan(50, since='2025-01-01 00:00:00', until='2025-02-01 00:00:00')
+        self.assertIn('SEARCH leaderboard USING INDEX idx_leaderboard_date', plan)
+
+    def test_board_read_uses_primary_key(self) -> None:
+        plan = plan_text(leaderboard_boards.read_board(self.explaining, 'day', '2025-01-01',
+                                                       leaderboard_boards.ALL_OUTCOMES, 10))
+        self.assertIn('SEARCH leaderboard_boards USING PRIMARY KEY', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Regional stats summed per worker: one flush per interval, and failed flushes re-applied
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+import database
+import regional_metrics
+from db_migrations import migrate
+from regional_counters import RegionalCounters
+
+logger = logging.getLogger(__name__)
+
+class TestRegionalCounters(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Flushing regional counters inline to an in-memory database")
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        migrate(self.conn)
+        # Mutations run in `with conn:` transactions, as on the pooled connection
+        self.conn.isolation_level = ''
+        for target, value in (('DB_WRITE_QUEUE', False), ('get_connection', lambda: self.conn)):
+            patcher = patch.object(database, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        regional_metrics.invalidate()
+        self.addCleanup(regional_metrics.invalidate)
+        self.counters = RegionalCounters(database.flush_regional_counters, 60)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+
+    def add(self, player_name: str, action: str):
+        return self.counters.add('us-ca', 'US', 'CA', player_name,
+                                 database._regional_increments('brave', action))
+
+    def totals(self) -> dict:
+        return regional_metrics.read_totals(self.conn, 'us-ca')
+
+    def test_adds_are_summed_into_one_flush(self) -> None:
+        futures = [self.add('alice', 'fight'), self.add('bob', 'fight'), self.add('alice', 'run')]
+        self.assertEqual(len({id(future) for future in futures}), 1)
+        database.flush_regional_counters(self.counters)
+        self.assertIsNone(futures[0].result(0))
+        self.assertEqual(self.totals(), {'total_games': 3, 'combat_style_brave': 3, 'action_fight': 2,
+                                         'action_run': 1, 'total_players': 2})
+        self.assertEqual(self.counters.stats()['flushes'], 1)
+
+    def test_failed_flush_is_applied_with_the_next_one(self) -> None:
+        first = self.add('alice', 'fight')
+        with patch.object(regional_metrics, 'increment', side_effect=sqlite3.OperationalError('locked')):
+            database.flush_regional_counters(self.counters)
+        self.assertFalse(first.done())
+        self.assertEqual(self.totals(), {})
+        second = self.add('bob', 'run')
+        database.flush_regional_counters(self.counters)
+        self.assertIsNone(first.result(0))
+        self.assertIsNone(second.result(0))
+        self.assertEqual(self.totals(), {'total_games': 2, 'combat_style_brave': 2, 'action_fight': 1,
+                                         'action_run': 1, 'total_players': 2})
+
+    def test_empty_flush_writes_nothing(self) -> None:
+        database.flush_regional_counters(self.counters)
+        self.assertEqual(self.counters.stats()['flushes'], 0)
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM regional_counters').fetchone()[0], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Regional counter buckets: hourly increments, daily rollups and the series read from them
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import sqlite3
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import regional_metrics
+from db_migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+NOW = datetime(2025, 3, 10, 12, 30, tzinfo=timezone.utc)
+
+class TestRegionalMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Migrating an in-memory database")
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        migrate(self.conn)
+        regional_metrics.invalidate()
+        self.addCleanup(regional_metrics.invalidate)
+        # Three games an hour for the last three days
+        for hours_ago in range(72):
+            regional_metrics.increment(self.conn, [('us-ca', 'total_games', 3), ('us-ca', 'action_run', 0)],
+                                       NOW - timedelta(hours=hours_ago))
+
+    def tearDown(self) -> None:
+        self.conn.close()
+
+    def buckets(self, hourly: bool) -> dict:
+        return dict(self.conn.execute('''
+            SELECT bucket, count FROM regional_counters
+            WHERE region_key = 'us-ca' AND bucket != 'all' AND (length(bucket) = 13) = ?
+        ''', (hourly,)).fetchall())
+
+    def test_increment_fills_hour_and_running_total(self) -> None:
+        self.assertEqual(regional_metrics.read_totals(self.conn, 'us-ca'), {'total_games': 216})
+        self.assertEqual(len(self.buckets(hourly=True)), 72)
+
+    def test_compact_rolls_old_hours_into_days_keeping_totals(self) -> None:
+        rolled = regional_metrics.compact(self.conn, 48, NOW)
+        self.assertEqual(rolled, 23)
+        hours = self.buckets(hourly=True)
+        days = self.buckets(hourly=False)
+        self.assertEqual(min(hours), '2025-03-08T12')
+        self.assertEqual(days, {'2025-03-07': 3 * 11, '2025-03-08': 3 * 12})
+        self.assertEqual(sum(hours.values()) + sum(days.values()), 216)
+        self.assertEqual(regional_metrics.read_totals(self.conn, 'us-ca'), {'total_games': 216})
+
+    def test_compact_runs_once_per_hour(self) -> None:
+        regional_metrics.compact(self.conn, 48, NOW)
+        regional_metrics.increment(self.conn, [('us-ca', 'total_games', 1)], NOW - timedelta(hours=60))
+        self.assertEqual(regional_metrics.compact(self.conn, 48, NOW), 0)
+        regional_metrics.invalidate()
+        self.assertEqual(regional_metrics.compact(self.conn, 48, NOW), 1)
+        self.assertEqual(self.buckets(hourly=False)['2025-03-08'], 3 * 12 + 1)
+
+    def test_daily_series_adds_rollups_and_remaining_hours(self) -> None:
+        regional_metrics.compact(self.conn, 48, NOW)
+        series = regional_metrics.read_series(self.conn, 'us-ca', 'day', '2025-03-07')
+        self.assertEqual(series, [('2025-03-07', 'total_games', 33), ('2025-03-08', 'total_games', 72),
+                                  ('2025-03-09', 'total_games', 72), ('2025-03-10', 'total_games', 39)])
+
+if __name__ == '__main__':
+    unittest.main()
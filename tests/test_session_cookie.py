@@ -0,0 +1,95 @@
+"""Signed state cookies: round trip, tampering, expiry and replayed turns
+
+Run from the project root: python -m unittest discover tests
+"""
+import base64
+import logging
+import unittest
+from unittest.mock import patch
+
+import session_cookie
+from game_state import GameState
+from session_cookie import InvalidSessionCookie, TurnTracker, decode_state_cookie, encode_state_cookie
+
+logger = logging.getLogger(__name__)
+
+def played_state(name: str = 'hero') -> GameState:
+    state = GameState(name)
+    state.health, state.score, state.xp = 80, 120, 45
+    state.previous_health, state.previous_score, state.previous_xp = 100, 100, 40
+    return state
+
+def flip_byte(value: str, index: int) -> str:
+    raw = bytearray(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+    raw[index] ^= 1
+    return base64.urlsafe_b64encode(bytes(raw)).rstrip(b'=').decode()
+
+class TestStateCookie(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Signing cookies with a test secret")
+        patcher = patch.object(session_cookie, 'SESSION_COOKIE_SECRET', 'test-secret')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_trip_keeps_state_and_turn(self) -> None:
+        value = encode_state_cookie('session-a', played_state(), 7)
+        state, turn = decode_state_cookie('session-a', value, 60)
+        self.assertEqual(turn, 7)
+        self.assertEqual(state.to_dict(), played_state().to_dict())
+
+    def test_tampered_payload_is_rejected(self) -> None:
+        value = flip_byte(encode_state_cookie('session-a', played_state(), 1), 12)
+        self.assertRaises(InvalidSessionCookie, decode_state_cookie, 'session-a', value, 60)
+
+    def test_cookie_from_another_session_is_rejected(self) -> None:
+        value = encode_state_cookie('session-a', played_state(), 1)
+        self.assertRaises(InvalidSessionCookie, decode_state_cookie, 'session-b', value, 60)
+
+    def test_malformed_cookie_is_rejected(self) -> None:
+        self.assertRaises(InvalidSessionCookie, decode_state_cookie, 'session-a', '!!', 60)
+        self.assertRaises(InvalidSessionCookie, decode_state_cookie, 'session-a', 'abc', 60)
+
+    def test_expired_cookie_is_rejected(self) -> None:
+        with patch('session_cookie.time.time', return_value=1_000_000):
+            value = encode_state_cookie('session-a', played_state(), 1)
+        with patch('session_cookie.time.time', return_value=1_000_061):
+            self.assertRaises(InvalidSessionCookie, decode_state_cookie, 'session-a', value, 60)
+
+    def test_missing_secret_refuses_to_sign(self) -> None:
+        with patch.object(session_cookie, 'SESSION_COOKIE_SECRET', ''):
+            self.assertRaises(ValueError, encode_state_cookie, 'session-a', played_state(), 1)
+
+class TestTurnTracker(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tracker = TurnTracker(max_sessions=2)
+
+    def test_older_turn_is_a_replay(self) -> None:
+        self.tracker.check('session-a', 5)
+        self.assertRaises(InvalidSessionCookie, self.tracker.check, 'session-a', 4)
+
+    def test_same_turn_is_accepted(self) -> None:
+        self.tracker.check('session-a', 5)
+        self.tracker.check('session-a', 5)
+        self.assertEqual(self.tracker.last_turn('session-a'), 5)
+
+    def test_play_continues_after_rejected_replay(self) -> None:
+        for turn in range(1, 6):
+            self.tracker.check('session-a', turn)
+        self.assertRaises(InvalidSessionCookie, self.tracker.check, 'session-a', 2)
+        # The rejected cookie left no turn, so the new game starts from 0
+        turn = self.tracker.issue('session-a', 0)
+        self.assertEqual(turn, 6)
+        self.tracker.check('session-a', turn)
+        self.assertEqual(self.tracker.issue('session-a', turn), 7)
+
+    def test_issue_follows_the_cookie_turn(self) -> None:
+        self.assertEqual(self.tracker.issue('session-a', 3), 4)
+
+    def test_oldest_session_is_forgotten_past_the_limit(self) -> None:
+        for session_id in ('session-a', 'session-b', 'session-c'):
+            self.tracker.record(session_id, 1)
+        self.assertIsNone(self.tracker.last_turn('session-a'))
+        self.assertEqual(self.tracker.last_turn('session-c'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
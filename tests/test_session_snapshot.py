@@ -0,0 +1,90 @@
+"""Session snapshots: file round trip, oversized ids, merging copies and lazy restore
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+from game_state import GameState
+from session_snapshot import (KEY_SIZE, SessionSnapshot, SnapshotRestoringStore, merge_entries,
+                              open_snapshot, write_snapshot)
+from session_store import BoundedSessionMap
+
+logger = logging.getLogger(__name__)
+
+def played_state(session_id: str, score: int = 120) -> GameState:
+    state = GameState(f'player-{session_id}', session_id, 80, score, 45)
+    state.previous_health, state.previous_score, state.previous_xp = 100, 100, 40
+    return state
+
+class TestSessionSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Writing snapshots to a temporary directory")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'sessions.snapshot')
+        self.now = int(time.time())
+
+    def open(self) -> SessionSnapshot:
+        snapshot = SessionSnapshot(self.path)
+        self.addCleanup(snapshot.close)
+        return snapshot
+
+    def test_round_trip_keeps_states_and_save_times(self) -> None:
+        entries = [('b', played_state('b'), self.now - 5), ('a', GameState('hero', 'a'), self.now - 9)]
+        self.assertEqual(write_snapshot(self.path, entries), 2)
+        snapshot = self.open()
+        self.assertEqual(snapshot.get('b'), played_state('b'))
+        self.assertEqual(snapshot.get('a'), GameState('hero', 'a'))
+        self.assertIsNone(snapshot.get('c'))
+        self.assertEqual(sorted(snapshot.entries()), sorted(entries))
+
+    def test_ids_longer_than_key_are_dropped(self) -> None:
+        long_id = 'x' * (KEY_SIZE + 1)
+        full_id = 'y' * KEY_SIZE
+        count = write_snapshot(self.path, [(long_id, played_state(long_id), self.now),
+                                           (full_id, played_state(full_id), self.now)])
+        self.assertEqual(count, 1)
+        snapshot = self.open()
+        self.assertNotIn(long_id, snapshot)
+        self.assertIsNone(snapshot.get(long_id))
+        self.assertEqual(snapshot.get(full_id), played_state(full_id))
+
+    def test_expired_session_is_not_served(self) -> None:
+        write_snapshot(self.path, [('a', played_state('a'), self.now - 100)])
+        self.assertIsNone(self.open().get('a', max_age=60))
+
+    def test_unreadable_snapshot_is_ignored(self) -> None:
+        with open(self.path, 'wb') as snapshot_file:
+            snapshot_file.write(b'not a snapshot at all')
+        self.assertIsNone(open_snapshot(self.path))
+
+    def test_restore_copies_into_store_until_superseded(self) -> None:
+        write_snapshot(self.path, [('a', played_state('a'), self.now), ('b', played_state('b'), self.now)])
+        store = SnapshotRestoringStore(BoundedSessionMap(max_entries=10, max_bytes=1 << 20, ttl=60),
+                                       self.open())
+        self.assertEqual(store.get('a'), played_state('a'))
+        self.assertEqual(store.stats()['restored_sessions'], 1)
+        store.delete('b')
+        self.assertIsNone(store.get('b'))
+
+class TestMergeEntries(unittest.TestCase):
+    def test_newest_copy_wins_whatever_the_source_order(self) -> None:
+        now = int(time.time())
+        older = [('a', played_state('a', 10), now - 20), ('b', played_state('b', 10), now - 5)]
+        newer = [('a', played_state('a', 30), now - 10), ('b', played_state('b', 30), now - 15)]
+        for sources in ([older, newer], [newer, older]):
+            merged = {session_id: state.score for session_id, state, _ in merge_entries(sources)}
+            self.assertEqual(merged, {'a': 30, 'b': 10})
+
+    def test_expired_copies_are_left_out(self) -> None:
+        now = int(time.time())
+        merged = merge_entries([[('a', played_state('a'), now - 100), ('b', played_state('b'), now)]],
+                               max_age=60)
+        self.assertEqual([session_id for session_id, _, _ in merged], ['b'])
+
+if __name__ == '__main__':
+    unittest.main()
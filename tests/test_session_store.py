@@ -0,0 +1,94 @@
+"""In-memory session map: idle expiry, LRU order and the entry and byte budgets
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import sys
+import unittest
+from unittest.mock import patch
+
+from game_state import GameState
+from session_store import MAP_ENTRY_OVERHEAD, BoundedSessionMap, estimate_entry_size, estimate_state_size
+
+logger = logging.getLogger(__name__)
+
+def state_for(session_id: str) -> GameState:
+    return GameState(f'player-{session_id}', session_id, 100, 300, 40)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class TestBoundedSessionMap(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Driving the session map from a fake clock")
+        self.clock = FakeClock()
+        patcher = patch('session_store.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_idle_session_expires_after_ttl(self) -> None:
+        sessions = BoundedSessionMap(max_entries=10, max_bytes=1 << 20, ttl=60)
+        sessions.set('a', state_for('a'))
+        self.clock.now += 60
+        self.assertEqual(sessions.get('a'), state_for('a'))
+        self.clock.now += 61
+        self.assertIsNone(sessions.get('a'))
+        self.assertEqual(sessions.stats()['expirations'], 1)
+        self.assertEqual(sessions.total_bytes, 0)
+
+    def test_sweep_expires_only_idle_sessions(self) -> None:
+        sessions = BoundedSessionMap(max_entries=10, max_bytes=1 << 20, ttl=60)
+        sessions.set('a', state_for('a'))
+        self.clock.now += 30
+        sessions.set('b', state_for('b'))
+        self.clock.now += 31
+        self.assertEqual(sessions.sweep(), 1)
+        self.assertEqual([session_id for session_id, _ in sessions.items()], ['b'])
+
+    def test_least_recently_used_session_is_evicted_first(self) -> None:
+        sessions = BoundedSessionMap(max_entries=2, max_bytes=1 << 20, ttl=60)
+        sessions.set('a', state_for('a'))
+        sessions.set('b', state_for('b'))
+        sessions.get('a')
+        sessions.set('c', state_for('c'))
+        self.assertIsNone(sessions.get('b'))
+        self.assertEqual([session_id for session_id, _ in sessions.items()], ['a', 'c'])
+        self.assertEqual(sessions.stats()['evictions'], 1)
+
+    def test_byte_budget_evicts_oldest_sessions(self) -> None:
+        entry_size = estimate_entry_size('a', state_for('a'))
+        sessions = BoundedSessionMap(max_entries=10, max_bytes=entry_size * 2, ttl=60)
+        for session_id in ('a', 'b', 'c'):
+            sessions.set(session_id, state_for(session_id))
+        self.assertEqual(len(sessions), 2)
+        self.assertIsNone(sessions.get('a'))
+        self.assertLessEqual(sessions.total_bytes, entry_size * 2)
+
+    def test_replacing_a_session_keeps_byte_count(self) -> None:
+        sessions = BoundedSessionMap(max_entries=10, max_bytes=1 << 20, ttl=60)
+        sessions.set('a', state_for('a'))
+        sessions.set('a', state_for('a'))
+        self.assertEqual(sessions.total_bytes, estimate_entry_size('a', state_for('a')))
+
+class TestSizeEstimate(unittest.TestCase):
+    def test_entry_counts_state_key_and_overhead(self) -> None:
+        state = state_for('a')
+        separate_key = ''.join(['session-', 'a'])
+        self.assertEqual(estimate_entry_size(state.session_id, state),
+                         estimate_state_size(state) + MAP_ENTRY_OVERHEAD)
+        self.assertEqual(estimate_entry_size(separate_key, state),
+                         estimate_state_size(state) + MAP_ENTRY_OVERHEAD + sys.getsizeof(separate_key))
+
+    def test_state_counts_strings_and_large_ints(self) -> None:
+        state = GameState('hero', 'a', 100, 0, 0)
+        base = sys.getsizeof(state) + sys.getsizeof('hero') + sys.getsizeof('a')
+        self.assertEqual(estimate_state_size(state), base)
+        state.xp = 10 ** 6
+        self.assertEqual(estimate_state_size(state), base + sys.getsizeof(10 ** 6))
+
+if __name__ == '__main__':
+    unittest.main()
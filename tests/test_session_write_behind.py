@@ -0,0 +1,79 @@
+"""Write-behind sessions: batched copies to the durable file, newest copy wins, failed flushes retried
+
+Run from the project root: python -m unittest discover tests
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from game_state import GameState
+from session_store import MemorySessionBackend, SQLiteSessionBackend, WriteBehindSessionBackend
+
+logger = logging.getLogger(__name__)
+
+def state_with_score(session_id: str, score: int) -> GameState:
+    return GameState('hero', session_id, 100, score, 10)
+
+class TestWriteBehindSessionBackend(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.debug("Opening a durable session file in a temporary directory")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.durable = SQLiteSessionBackend(os.path.join(directory.name, 'sessions.db'))
+        self.addCleanup(lambda: self.durable._connection().close())
+
+    def worker(self) -> WriteBehindSessionBackend:
+        """A worker's store; the flusher thread is not started, so tests flush by hand"""
+        return WriteBehindSessionBackend(MemorySessionBackend(), self.durable, flush_batch_size=100)
+
+    def test_saves_reach_durable_file_on_flush(self) -> None:
+        store = self.worker()
+        store.set('a', state_with_score('a', 5))
+        self.assertIsNone(self.durable.get('a'))
+        self.assertEqual(store.stats()['pending_writes'], 1)
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(self.durable.get('a'), state_with_score('a', 5))
+        self.assertEqual(store.flush(), 0)
+
+    def test_session_missing_from_primary_is_reloaded(self) -> None:
+        self.durable.set('a', state_with_score('a', 5))
+        store = self.worker()
+        self.assertEqual(store.get('a'), state_with_score('a', 5))
+        self.assertEqual(store.primary.get('a'), state_with_score('a', 5))
+
+    def test_newest_copy_wins_whichever_worker_flushes_last(self) -> None:
+        first, second = self.worker(), self.worker()
+        with patch('session_store.time.time', return_value=1_700_000_000.25):
+            first.set('a', state_with_score('a', 1))
+        with patch('session_store.time.time', return_value=1_700_000_000.75):
+            second.set('a', state_with_score('a', 2))
+        second.flush()
+        first.flush()
+        self.assertEqual(self.durable.get('a').score, 2)
+
+    def test_failed_flush_is_retried_with_newer_saves_on_top(self) -> None:
+        store = self.worker()
+        store.set('a', state_with_score('a', 1))
+        store.set('b', state_with_score('b', 1))
+        with patch.object(self.durable, 'set_many', side_effect=sqlite3.OperationalError('locked')):
+            self.assertRaises(sqlite3.OperationalError, store.flush)
+        store.set('a', state_with_score('a', 2))
+        self.assertEqual(store.stats()['pending_writes'], 2)
+        self.assertEqual(store.flush(), 2)
+        self.assertEqual(self.durable.get('a').score, 2)
+        self.assertEqual(self.durable.get('b').score, 1)
+
+    def test_delete_removes_every_copy(self) -> None:
+        store = self.worker()
+        store.set('a', state_with_score('a', 1))
+        store.flush()
+        store.set('a', state_with_score('a', 2))
+        store.delete('a')
+        self.assertEqual(store.flush(), 0)
+        self.assertIsNone(store.get('a'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,28 @@
 from bottle import route, run, template, static_file, request, redirect, response, default_app
 import random
+import secrets
 from database import (init_db, add_to_leaderboard, get_leaderboard, 
-                     update_regional_stats, get_regional_stats,
+                     update_regional_stats, get_regional_stats, get_regional_series,
                      update_player_achievement, update_player_session_stats,
-                     get_player_session_stats)
+                     get_player_session_stats, close_writer, start_snapshot_refresher,
+                     get_leaderboard_version, leaderboard_cache, DB_READ_SNAPSHOT,
+                     LEADERBOARD_CACHE_SIZE, get_leaderboard_rank, rank_index,
+                     LEADERBOARD_RANK_INDEX, get_leaderboard_board)
+from game_state import GameState
+from request_context import RequestContextPlugin, current_context
+from session_store import (create_session_store, start_session_sweeper, close_session_store,
+                           SESSION_BACKEND, SESSION_LIFETIME)
+from session_snapshot import restore_session_snapshot, save_session_snapshot
+from page_cache import PageCache, page_response
+from leaderboard_api import leaderboard_page, parse_rank_query
+from leaderboard_boards import current_periods
+from session_cookie import (SESSION_COOKIE_NAME, SESSION_COOKIE_SECRET, InvalidSessionCookie, TurnTracker,
+                            encode_state_cookie, decode_state_cookie)
 import json
 import os
 from datetime import datetime
 import logging
+import signal
 import sys
 from typing import Dict, Any, Optional, Union, Tuple
 from config import DEVELOPMENT_CONFIG
@@ -50,10 +65,14 @@ EVENT_TYPES = {
     "LOCAL_UNAVAILABLE": "local_unavailable"
 }
 
+# Session IDs are 128-bit random values so concurrent players never collide
+SESSION_ID_BYTES = 16
+
 # Environment variables with defaults
 HOST = os.environ.get('HOST', '127.0.0.1')
 PORT = int(os.environ.get('PORT', 8000))
 DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
+LEADERBOARD_PAGE_MAX_AGE = int(os.environ.get('LEADERBOARD_PAGE_MAX_AGE', 10))
 
 # Enhanced debugging
 logging.basicConfig(
@@ -165,45 +184,84 @@ def safe_template(route_func):
             return template('game.html', **TEMPLATE_DEFAULTS)
     return wrapper
 
-def get_session_id() -> str:
-    """Get or create session ID"""
+def resolve_session_id() -> str:
+    """Read the session ID cookie, creating one for new visitors"""
     session_id = request.cookies.get('session_id')
     if not session_id:
-        session_id = str(random.randint(1000000, 9999999))
+        session_id = secrets.token_hex(SESSION_ID_BYTES)
         response.set_cookie('session_id', session_id, path='/')
     return session_id
 
+def get_session_id() -> str:
+    """Get the session ID resolved for the current request"""
+    return current_context().session_id
+
+def load_state_cookie(session_id: str) -> Optional[GameState]:
+    """Verify and decode the signed state cookie for this request"""
+    state = None
+    value = request.get_cookie(SESSION_COOKIE_NAME)
+    if value:
+        try:
+            state, turn = decode_state_cookie(session_id, value, SESSION_LIFETIME)
+            turn_tracker.check(session_id, turn)
+            request.environ['game.turn'] = turn
+        except InvalidSessionCookie as e:
+            logger.warning(f"Rejected state cookie for session {session_id}: {e}")
+            state = None
+    return state
+
+def save_state_cookie(session_id: str, state: GameState) -> None:
+    """Send the game state back as a signed cookie for the next turn"""
+    # A rejected cookie leaves no turn; numbering from 1 would look like a replay
+    turn = turn_tracker.issue(session_id, request.environ.get('game.turn', 0))
+    response.set_cookie(SESSION_COOKIE_NAME, encode_state_cookie(session_id, state, turn),
+                        path='/', httponly=True, max_age=SESSION_LIFETIME)
+    request.environ['game.turn'] = turn
+
+def load_stored_state(session_id: str) -> Optional[GameState]:
+    """Load state from the signed cookie or the session store"""
+    if COOKIE_SESSIONS:
+        return load_state_cookie(session_id)
+    return session_store.get(session_id)
+
+def store_state(session_id: str, state: GameState) -> None:
+    """Save state to the signed cookie or the session store"""
+    if COOKIE_SESSIONS:
+        save_state_cookie(session_id, state)
+    else:
+        session_store.set(session_id, state)
+
 def get_game_state() -> Dict[str, Any]:
     """Get current game state"""
-    session_id = get_session_id()
+    context = current_context()
+    session_id = context.session_id
     logger.debug(f"Getting game state for session {session_id}")
-    state = game_states.get(session_id, {})
-    
-    # Initialize previous_stats if not present
-    if 'stats' in state and 'previous_stats' not in state:
-        state['previous_stats'] = state['stats'].copy()
+    current_state = context.current_state()
+    state = current_state.to_dict() if current_state else {}
     
     game_state_logger.debug(f"Current game state for session {session_id}: {json.dumps(state, indent=2)}")
     return state
 
 def save_game_state(state: Dict[str, Any]) -> None:
     """Save current game state"""
-    session_id = get_session_id()
+    context = current_context()
+    session_id = context.session_id
     logger.debug(f"Saving game state for session {session_id}")
+    new_state = GameState.from_dict(state)
     
     # Store current stats as previous before updating
-    if 'stats' in state:
-        current_state = game_states.get(session_id, {})
-        if 'stats' in current_state:
-            state['previous_stats'] = current_state['stats'].copy()
+    if new_state.has_stats:
+        current_state = context.current_state()
+        if current_state and current_state.has_stats:
+            new_state.set_previous_stats(current_state.stats())
             game_state_logger.info(f"State transition for session {session_id}:")
-            game_state_logger.info(f"Previous stats: {json.dumps(current_state['stats'], indent=2)}")
+            game_state_logger.info(f"Previous stats: {json.dumps(current_state.stats(), indent=2)}")
             game_state_logger.info(f"New stats: {json.dumps(state['stats'], indent=2)}")
         else:
-            state['previous_stats'] = state['stats'].copy()
             game_state_logger.info(f"Initial state for session {session_id}: {json.dumps(state['stats'], indent=2)}")
+        state['previous_stats'] = new_state.previous_stats()
     
-    game_states[session_id] = state
+    context.save(new_state)
 
 def determine_victory_type(stats):
     """Determine the type of victory based on player stats."""
@@ -234,11 +292,27 @@ def get_victory_message(victory_type, player_name):
     }
     return messages.get(victory_type, messages["Standard Victory"])
 
-# Initialize database
+# Initialize database (read-only when gunicorn's master already migrated it)
 init_db()
 
-# Game state storage - separate for each session
-game_states = {}
+# Game state storage - shared by all workers, keyed by session, or carried
+# by the client in a signed cookie when SESSION_BACKEND=cookie
+COOKIE_SESSIONS = SESSION_BACKEND == 'cookie'
+if COOKIE_SESSIONS and not SESSION_COOKIE_SECRET:
+    raise ValueError("SESSION_COOKIE_SECRET must be set when SESSION_BACKEND=cookie")
+session_store = restore_session_snapshot(
+    create_session_store('memory' if COOKIE_SESSIONS else SESSION_BACKEND))
+start_session_sweeper(session_store)
+if DB_READ_SNAPSHOT:
+    start_snapshot_refresher()
+if LEADERBOARD_CACHE_SIZE:
+    leaderboard_cache.load()
+if LEADERBOARD_RANK_INDEX:
+    rank_index.load()
+
+# Rendered pages, re-rendered only when the data behind them changes
+page_cache = PageCache()
+turn_tracker = TurnTracker()
 
 # Add request logging middleware
 def log_to_logger(fn):
@@ -475,20 +549,28 @@ def make_choice():
                 victory_type=victory_type,
                 health=stats['health']
             )
+            # Ties share a rank, so it is the same whether or not the entry has landed yet;
+            # the rank is a nicety, so a failed lookup only leaves it off the message
+            try:
+                ranking = get_leaderboard_rank(stats['xp'], stats['score'])
+            except Exception as e:
+                logger.error(f"Error ranking victory: {str(e)}")
+                ranking = None
             template_vars.update({
                 'victory_type': victory_type,
                 'event_type': get_event_type(victory_type),
                 'message': f"\n{victory_type}!\n{get_victory_message(victory_type, player_name)}\n"
-                          f"Final Stats - Health: {stats['health']} | Score: {stats['score']} | XP: {stats['xp']}",
+                          f"Final Stats - Health: {stats['health']} | Score: {stats['score']} | XP: {stats['xp']}"
+                          + (f"\nLeaderboard Rank: #{ranking['rank']}" if ranking else ""),
                 'show_restart': True,
                 'player_name': player_name
             })
             # Preserve player name and session ID while clearing other state
             preserved_state = {
-                'player_name': game_states[get_session_id()]['player_name'],
+                'player_name': player_name,
                 'session_id': get_session_id()  # Preserve the session ID
             }
-            game_states[get_session_id()] = preserved_state
+            save_game_state(preserved_state)
             return template('game', **template_vars)
         
         # Check for game over
@@ -513,10 +595,10 @@ def make_choice():
             )
             # Preserve player name and session ID while clearing other state
             preserved_state = {
-                'player_name': game_states[get_session_id()]['player_name'],
+                'player_name': player_name,
                 'session_id': get_session_id()  # Preserve the session ID
             }
-            game_states[get_session_id()] = preserved_state
+            save_game_state(preserved_state)
         
         return template('game', **template_vars)
 
@@ -543,14 +625,66 @@ def serve_static(filename):
         response = static_file(filename, root='./views/static')
     return response
 
+LEADERBOARD_SPANS = {'all': 'All Time', 'week': 'This Week', 'day': 'Today'}
+LEADERBOARD_OUTCOMES = list(VICTORY_TYPES.values()) + ['DIED']
+
+def render_leaderboard(span: str, victory_type: Optional[str]) -> str:
+    if span == 'all' and victory_type is None:
+        entries = get_leaderboard(10)  # Get top 10
+    else:
+        entries = get_leaderboard_board(span, victory_type, 10)
+    return template('leaderboard', entries=entries, span=span, victory_type=victory_type,
+                    spans=LEADERBOARD_SPANS, outcomes=LEADERBOARD_OUTCOMES)
+
 @route('/leaderboard')
 def show_leaderboard():
-    leaderboard_entries = get_leaderboard(10)  # Get top 10
-    return template('leaderboard', entries=leaderboard_entries)
+    span = request.query.get('span') or 'all'
+    victory_type = request.query.get('victory_type') or None
+    if span not in LEADERBOARD_SPANS or (victory_type and victory_type not in LEADERBOARD_OUTCOMES):
+        return redirect('/leaderboard')
+    # Day and week boards start over each period, so a new period is a new
+    # version of the same page rather than another page kept forever
+    version = get_leaderboard_version()
+    if version is not None:
+        version = (current_periods()[span], version)
+    page = page_cache.get(f"leaderboard:{span}:{victory_type or ''}", version,
+                          lambda: render_leaderboard(span, victory_type))
+    return page_response(page, LEADERBOARD_PAGE_MAX_AGE)
+
+@route('/api/leaderboard', method='GET')
+def api_leaderboard():
+    """Leaderboard pages as compact JSON, paginated with ?after=<next cursor>"""
+    try:
+        body = leaderboard_page(request.query)
+    except ValueError as e:
+        response.status = 400
+        return {'error': str(e)}
+    except Exception as e:
+        logger.error(f"Error getting leaderboard page: {str(e)}")
+        response.status = 500
+        return {'error': 'Internal server error'}
+    response.content_type = 'application/json'
+    return body
+
+@route('/api/leaderboard/rank', method='GET')
+def api_leaderboard_rank():
+    """Rank a score would take: ?xp=<xp>&score=<score>"""
+    try:
+        xp, score = parse_rank_query(request.query)
+    except ValueError as e:
+        response.status = 400
+        return {'error': str(e)}
+    ranking = get_leaderboard_rank(xp, score)
+    if ranking is None:
+        response.status = 500
+        return {'error': 'Internal server error'}
+    return {'xp': xp, 'score': score, **ranking}
 
 @route('/health')
 def health_check():
-    return {'status': 'healthy', 'debug': DEBUG}
+    return {'status': 'healthy', 'debug': DEBUG, 'sessions': session_store.stats(),
+            'leaderboard_cache': leaderboard_cache.stats(), 'rank_index': rank_index.stats(),
+            'page_cache': page_cache.stats()}
 
 @route('/favicon.ico')
 def get_favicon():
@@ -599,10 +733,10 @@ def debug_die():
     )
     # Preserve player name and session ID while clearing other state
     preserved_state = {
-        'player_name': game_states[get_session_id()]['player_name'],
+        'player_name': game_state['player_name'],
         'session_id': get_session_id()  # Preserve the session ID
     }
-    game_states[get_session_id()] = preserved_state
+    save_game_state(preserved_state)
     
     return template('game', **template_vars)
 
@@ -629,6 +763,9 @@ def update_region():
             action=data.get('action')
         )
         return {'status': 'success'}
+    except ValueError as e:
+        response.status = 400
+        return {'error': str(e)}
     except Exception as e:
         logger.error(f"Error updating regional stats: {str(e)}")
         response.status = 500
@@ -648,6 +785,25 @@ def get_region(region_key):
         response.status = 500
         return {'error': 'Internal server error'}
 
+@route('/api/stats/regional/<region_key>/series', method='GET')
+def get_region_series(region_key):
+    """Regional statistics per bucket: ?granularity=hour|day&buckets=<count>"""
+    granularity = request.query.get('granularity') or 'day'
+    try:
+        buckets = int(request.query.get('buckets') or 30)
+    except ValueError:
+        response.status = 400
+        return {'error': 'buckets must be an integer'}
+    if not 1 <= buckets <= 366:
+        response.status = 400
+        return {'error': 'buckets must be between 1 and 366'}
+    try:
+        series = get_regional_series(region_key, granularity, buckets)
+    except ValueError as e:
+        response.status = 400
+        return {'error': str(e)}
+    return {'region_key': region_key, 'granularity': granularity, 'series': series}
+
 @route('/api/achievements', method='POST')
 def record_achievement():
     """Record a player achievement"""
@@ -712,6 +868,7 @@ def get_session(player_name, session_id):
 # Initialize app with middleware
 app = default_app()
 app.install(log_to_logger)
+app.install(RequestContextPlugin(resolve_session_id, load_stored_state, store_state))
 
 # Error handling
 @app.error(500)
@@ -730,9 +887,19 @@ def error404(error):
                    show_name_input=True,
                    **TEMPLATE_DEFAULTS)
 
+def handle_sigterm(signum, frame):
+    """Exit through the normal shutdown path so sessions get snapshotted"""
+    raise SystemExit(0)
+
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, handle_sigterm)
     try:
         logger.info("Starting server...")
         run(host=HOST, port=PORT, debug=DEBUG, reloader=DEBUG)
     except Exception as e:
-        logger.error(f"Error starting server: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error starting server: {str(e)}")
+    finally:
+        close_writer()
+        close_session_store(session_store)
+        if not COOKIE_SESSIONS:
+            logger.info(f"Saved {save_session_snapshot(session_store)} sessions to snapshot")
\ No newline at end of file